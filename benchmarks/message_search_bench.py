@@ -0,0 +1,220 @@
+"""
+Message search latency: the legacy ILIKE scan against the FTS5 index.
+
+Seeds a synthetic corpus (Zipf-distributed vocabulary, two-person chats)
+into a scratch SQLite database with the application schema, builds the
+FTS5 index, then times the same searches through both paths:
+
+* per-chat  - ``message.search_messages`` (ILIKE) vs ``message.search_messages_page``
+* all-chats - ILIKE over every chat of the user vs ``message.search_messages_page``
+
+Usage (from the repository root):
+
+    python benchmarks/message_search_bench.py --messages 5000000 --queries 50
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pz_be_services"))
+
+# Keep the application's module-level engines away from ./ProjectX.db
+_scratch_dir = tempfile.mkdtemp(prefix="pz_bench_")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{_scratch_dir}/app.db")
+
+from sqlalchemy import and_, create_engine, desc, select, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from db.database import Base, apply_sqlite_profile, get_engine_options  # noqa: E402
+from db.models import Message, chat_participants  # noqa: E402
+from db.search import create_search_indexes  # noqa: E402
+from db.crud import message  # noqa: E402
+
+BATCH = 50_000
+
+
+def build_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    words = sorted(words)
+    # Zipf weights: a few very common words and a long tail of rare ones
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(size)))
+    return words, cum_weights
+
+
+def seed(engine, args, rng: random.Random):
+    words, cum_weights = build_vocabulary(args.vocabulary, rng)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO users (id, username, is_active) VALUES (:id, :u, 1)"),
+            [{"id": i, "u": f"user{i}"} for i in range(1, args.users + 1)],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO chats (id, chat_type, is_active, created_at, updated_at) "
+                "VALUES (:id, 'private', 1, datetime('now'), datetime('now'))"
+            ),
+            [{"id": i} for i in range(1, args.chats + 1)],
+        )
+        members = {}
+        for chat_id in range(1, args.chats + 1):
+            members[chat_id] = rng.sample(range(1, args.users + 1), 2)
+        conn.execute(
+            chat_participants.insert(),
+            [
+                {"chat_id": chat_id, "user_id": user_id}
+                for chat_id, pair in members.items()
+                for user_id in pair
+            ],
+        )
+
+    insert = text(
+        "INSERT INTO messages (chat_id, sender_id, content, message_type, "
+        "timestamp, is_read, is_edited) VALUES "
+        "(:chat_id, :sender_id, :content, 'text', datetime('now'), 0, 0)"
+    )
+    started = time.perf_counter()
+    for offset in range(0, args.messages, BATCH):
+        rows = []
+        for _ in range(min(BATCH, args.messages - offset)):
+            chat_id = rng.randint(1, args.chats)
+            rows.append(
+                {
+                    "chat_id": chat_id,
+                    "sender_id": rng.choice(members[chat_id]),
+                    "content": " ".join(
+                        rng.choices(
+                            words, cum_weights=cum_weights, k=rng.randint(4, 16)
+                        )
+                    ),
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(insert, rows)
+    print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    create_search_indexes(engine)
+    print(f"built FTS5 index in {time.perf_counter() - started:.1f}s")
+    return words, members
+
+
+def ilike_all_chats(db, *, user_id: int, query: str, limit: int):
+    """The pre-FTS shape of an all-my-chats search"""
+    return (
+        db.execute(
+            select(Message)
+            .join(
+                chat_participants,
+                and_(
+                    chat_participants.c.chat_id == Message.chat_id,
+                    chat_participants.c.user_id == user_id,
+                ),
+            )
+            .where(Message.content.ilike(f"%{query}%"))
+            .order_by(desc(Message.timestamp))
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def timed(fn, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=5_000_000)
+    parser.add_argument("--chats", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    url = f"sqlite:///{_scratch_dir}/search.db"
+    engine = create_engine(url, **get_engine_options(url))
+    apply_sqlite_profile(engine)
+    Base.metadata.create_all(bind=engine)
+    words, members = seed(engine, args, rng)
+
+    # A mix of common and rare words, plus prefixes for the FTS path
+    terms = rng.sample(words[:200], args.queries // 2) + rng.sample(
+        words[200:], args.queries - args.queries // 2
+    )
+    chat_ids = [rng.randint(1, args.chats) for _ in terms]
+    user_ids = [members[chat_id][0] for chat_id in chat_ids]
+    cases = list(zip(terms, chat_ids, user_ids))
+
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        results = {
+            "per-chat ilike": timed(
+                lambda case: message.search_messages(
+                    db, chat_id=case[1], query=case[0], limit=args.limit
+                ),
+                cases,
+            ),
+            "per-chat fts5": timed(
+                lambda case: message.search_messages_page(
+                    db,
+                    user_id=case[2],
+                    chat_id=case[1],
+                    query=case[0],
+                    limit=args.limit,
+                ),
+                cases,
+            ),
+            "all-chats ilike": timed(
+                lambda case: ilike_all_chats(
+                    db, user_id=case[2], query=case[0], limit=args.limit
+                ),
+                cases,
+            ),
+            "all-chats fts5": timed(
+                lambda case: message.search_messages_page(
+                    db, user_id=case[2], query=case[0], limit=args.limit
+                ),
+                cases,
+            ),
+            "all-chats fts5 prefix": timed(
+                lambda case: message.search_messages_page(
+                    db, user_id=case[2], query=case[0][:3] + "*", limit=args.limit
+                ),
+                cases,
+            ),
+        }
+    engine.dispose()
+
+    print(f"{'path':<24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<24}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+            f"{result['max']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Read/write throughput of the legacy SQLite engine against the tuned profile.
+
+Runs the same concurrent workload (writer threads doing one insert per
+transaction, reader threads paging a chat) against:
+
+* ``legacy``  - pool_size=50, max_overflow=10, no PRAGMAs (the old engine)
+* ``profile`` - ``db.database.get_engine_options`` + ``apply_sqlite_profile``
+
+Usage (from the repository root):
+
+    python benchmarks/sqlite_engine_bench.py --writers 4 --readers 8 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pz_be_services"))
+
+# Keep the application's module-level engines away from ./ProjectX.db
+_scratch_dir = tempfile.mkdtemp(prefix="pz_bench_")
+os.environ.setdefault(
+    "SQLALCHEMY_DATABASE_URL", f"sqlite:///{_scratch_dir}/app.db"
+)
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from db.database import apply_sqlite_profile, get_engine_options  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE bench_messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    sender_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+)
+"""
+INDEX = "CREATE INDEX ix_bench_chat_ts ON bench_messages (chat_id, timestamp, id)"
+INSERT = text(
+    "INSERT INTO bench_messages (chat_id, sender_id, content, timestamp) "
+    "VALUES (:chat_id, :sender_id, :content, datetime('now'))"
+)
+READ = text(
+    "SELECT id, sender_id, content, timestamp FROM bench_messages "
+    "WHERE chat_id = :chat_id ORDER BY timestamp DESC, id DESC LIMIT 50"
+)
+
+
+def build_engine(profile: str, url: str):
+    if profile == "legacy":
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=50,
+            max_overflow=10,
+        )
+    engine = create_engine(url, **get_engine_options(url))
+    apply_sqlite_profile(engine)
+    return engine
+
+
+def seed(engine, rows: int, chats: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA))
+        conn.execute(text(INDEX))
+        conn.execute(
+            INSERT,
+            [
+                {"chat_id": i % chats, "sender_id": i % 7, "content": f"seed {i}"}
+                for i in range(rows)
+            ],
+        )
+
+
+def run(profile: str, args) -> dict:
+    path = os.path.join(_scratch_dir, f"{profile}.db")
+    engine = build_engine(profile, f"sqlite:///{path}")
+    seed(engine, args.seed_rows, args.chats)
+
+    stop = threading.Event()
+    counters = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def bump(key: str) -> None:
+        with lock:
+            counters[key] += 1
+
+    def writer(n: int) -> None:
+        i = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        INSERT,
+                        {
+                            "chat_id": (n + i) % args.chats,
+                            "sender_id": n,
+                            "content": f"writer {n} message {i}",
+                        },
+                    )
+                bump("writes")
+            except OperationalError:
+                bump("locked")
+            i += 1
+
+    def reader(n: int) -> None:
+        i = 0
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(READ, {"chat_id": (n + i) % args.chats}).fetchall()
+                bump("reads")
+            except OperationalError:
+                bump("locked")
+            i += 1
+
+    threads = [
+        threading.Thread(target=writer, args=(n,)) for n in range(args.writers)
+    ] + [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        "profile": profile,
+        "writes_per_s": counters["writes"] / args.seconds,
+        "reads_per_s": counters["reads"] / args.seconds,
+        "locked_errors": counters["locked"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed-rows", type=int, default=100_000)
+    parser.add_argument("--chats", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'writes/s':>12}{'reads/s':>12}{'locked':>10}")
+    for profile in ("legacy", "profile"):
+        result = run(profile, args)
+        print(
+            f"{result['profile']:<10}{result['writes_per_s']:>12.0f}"
+            f"{result['reads_per_s']:>12.0f}{result['locked_errors']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
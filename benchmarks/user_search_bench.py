@@ -0,0 +1,118 @@
+"""
+User autocomplete latency: the in-memory prefix index at scale.
+
+Builds ``UserSearchIndex`` from synthetic users (random usernames, two-word
+full names drawn from small name pools, so short prefixes match very large
+ranges), then times searches per prefix length, cold and memoized, and the
+cost of applying a single user update.
+
+Usage (from the repository root):
+
+    python benchmarks/user_search_bench.py --users 1000000 --queries 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pz_be_services"))
+
+# Keep the application's module-level engines away from ./ProjectX.db
+_scratch_dir = tempfile.mkdtemp(prefix="pz_bench_")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{_scratch_dir}/app.db")
+
+from db.user_changes import UserChange  # noqa: E402
+from services.user_auth_services.user_search import UserSearchIndex  # noqa: E402
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_users(count: int, rng: random.Random):
+    first_names = [
+        "".join(rng.choices(LETTERS, k=rng.randint(3, 8))) for _ in range(500)
+    ]
+    last_names = [
+        "".join(rng.choices(LETTERS, k=rng.randint(4, 10))) for _ in range(2000)
+    ]
+    users = []
+    for user_id in range(1, count + 1):
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        username = f"{first}{rng.choice(['', '_', '.'])}{last[:3]}{user_id}"
+        users.append(
+            (
+                user_id,
+                username,
+                f"{first.title()} {last.title()}",
+                f"{username}@example.com",
+            )
+        )
+    return users
+
+
+def timed(fn, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = make_users(args.users, rng)
+
+    index = UserSearchIndex()
+    started = time.perf_counter()
+    index.rebuild(users)
+    print(f"indexed {len(index)} users in {time.perf_counter() - started:.1f}s")
+
+    samples = rng.sample(users, args.queries)
+    results = {}
+    for length in (1, 2, 3, 5):
+        queries = [username[:length] for _, username, _, _ in samples]
+        results[f"username prefix {length} (cold)"] = timed(
+            lambda q: index.search(q, limit=args.limit), queries
+        )
+        results[f"username prefix {length} (warm)"] = timed(
+            lambda q: index.search(q, limit=args.limit), queries
+        )
+    queries = [
+        f"{full_name.split()[0][:3]} {full_name.split()[1][:2]}"
+        for _, _, full_name, _ in samples
+    ]
+    results["two words"] = timed(lambda q: index.search(q, limit=args.limit), queries)
+
+    updates = [
+        UserChange(user_id, f"{username}x", full_name, email, True)
+        for user_id, username, full_name, email in samples
+    ]
+    results["apply one update"] = timed(
+        lambda change: index.apply_changes([change]), updates
+    )
+
+    print(f"{'path':<32}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<32}{result['p50']:>10.3f}{result['p95']:>10.3f}{result['max']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
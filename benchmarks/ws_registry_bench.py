@@ -0,0 +1,152 @@
+"""
+WebSocket registry at scale: memory and churn of the connection manager.
+
+Registers simulated connections (no network: each socket is a stub that
+accepts and swallows frames) with ``ConnectionManager``, then reports the
+memory each connection record costs, connect and disconnect throughput,
+how long ``get_connection_stats`` takes with everything connected, and
+how fast events are fanned out to connected users.
+
+Usage (from the repository root):
+
+    python benchmarks/ws_registry_bench.py --connections 100000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pz_be_services"))
+
+# Keep the application's module-level engines away from ./ProjectX.db
+_scratch_dir = tempfile.mkdtemp(prefix="pz_bench_")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{_scratch_dir}/app.db")
+
+from services.chat_services.connection_manager import (  # noqa: E402
+    ClientConnection,
+    ConnectionManager,
+)
+from services.chat_services.pubsub import InProcessPubSub  # noqa: E402
+from services.chat_services.ws_protocol import SUBPROTOCOLS  # noqa: E402
+
+
+class StubWebSocket:
+    __slots__ = ("frames",)
+
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        self.frames += 1
+
+    async def send_bytes(self, data):
+        self.frames += 1
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:,.0f}/s ({seconds * 1e6 / count:.2f}us each)"
+
+
+def connect_all(manager, sockets, user_ids, protocol):
+    return [
+        manager.register(
+            ClientConnection(
+                websocket, user_id, f"user{user_id}", protocol, totals=manager.totals
+            )
+        )
+        for websocket, user_id in zip(sockets, user_ids)
+    ]
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    protocol = SUBPROTOCOLS["pz.v1.json"]
+    users = max(1, args.connections // args.per_user)
+    user_ids = [1 + i % users for i in range(args.connections)]
+
+    def new_manager():
+        return ConnectionManager(
+            InProcessPubSub(),
+            max_connections_per_user=args.per_user,
+            shards=args.shards,
+        )
+
+    # Memory, in its own pass since tracing slows everything down
+    manager = new_manager()
+    sockets = [StubWebSocket() for _ in range(args.connections)]
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    connect_all(manager, sockets, user_ids, protocol)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del manager, sockets
+
+    manager = new_manager()
+    await manager.start()
+    sockets = [StubWebSocket() for _ in range(args.connections)]
+    started = time.perf_counter()
+    connections = connect_all(manager, sockets, user_ids, protocol)
+    connect_seconds = time.perf_counter() - started
+
+    print(
+        f"{args.connections:,} connections over {users:,} users, {args.shards} shards"
+    )
+    print(f"memory per connection      {used / args.connections:,.0f} bytes")
+    print(f"connect                    {rate(args.connections, connect_seconds)}")
+
+    started = time.perf_counter()
+    for _ in range(args.stats_calls):
+        manager.get_connection_stats()
+    stats_seconds = time.perf_counter() - started
+    print(
+        f"get_connection_stats       {stats_seconds * 1e6 / args.stats_calls:.1f}us per call"
+    )
+
+    # Fan one event out to a random sample of users, then let writers drain
+    targets = rng.sample(range(1, users + 1), min(args.fanout_users, users))
+    message = '{"type":"notice","text":"benchmark"}'
+    started = time.perf_counter()
+    for user_id in targets:
+        await manager.deliver_local(user_id, message)
+    while manager.totals.queued:
+        await asyncio.sleep(0)
+    fanout_seconds = time.perf_counter() - started
+    delivered = sum(len(manager.connections_of(user_id)) for user_id in targets)
+    print(f"fan-out to {len(targets):,} users        {rate(delivered, fanout_seconds)}")
+
+    rng.shuffle(connections)
+    started = time.perf_counter()
+    for connection in connections:
+        manager.disconnect(connection.websocket, connection.user_id)
+    disconnect_seconds = time.perf_counter() - started
+    print(f"disconnect                 {rate(args.connections, disconnect_seconds)}")
+
+    stats = manager.get_connection_stats()
+    assert stats["total_connections"] == 0 and stats["total_users"] == 0, stats
+    await manager.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--connections", type=int, default=100_000)
+    parser.add_argument("--per-user", type=int, default=2)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--stats-calls", type=int, default=1000)
+    parser.add_argument("--fanout-users", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from typing import Dict, Any
 
 import jwt
 from jwt import ExpiredSignatureError, InvalidTokenError
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, WebSocket, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from core.config import EnvironmentVariables
@@ -16,6 +16,12 @@ ACCESS_EXPIRE_MINUTES: int = EnvironmentVariables.ACCESS_TOKEN_EXPIRE_MINUTES
 # Security scheme for FastAPI docs
 security = HTTPBearer()
 
+# Browsers can't set an Authorization header on a WebSocket handshake, so
+# sockets send the token as ?token= or as an offered "bearer.<token>"
+# subprotocol
+WS_TOKEN_QUERY_PARAM = "token"
+WS_TOKEN_SUBPROTOCOL_PREFIX = "bearer."
+
 
 def create_access_token(
     payload: Dict[str, Any], expires_in_minutes: int = ACCESS_EXPIRE_MINUTES
@@ -53,3 +59,20 @@ def get_current_user(
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def get_websocket_user(websocket: WebSocket) -> Dict[str, Any]:
+    """
+    Get the user of a WebSocket handshake from its JWT token, checked as
+    in ``get_current_user``. Raises ValueError if the token is missing or
+    invalid.
+    """
+    token = websocket.query_params.get(WS_TOKEN_QUERY_PARAM)
+    if not token:
+        for offered in websocket.scope.get("subprotocols", []):
+            if offered.startswith(WS_TOKEN_SUBPROTOCOL_PREFIX):
+                token = offered[len(WS_TOKEN_SUBPROTOCOL_PREFIX) :]
+                break
+    if not token:
+        raise ValueError("Missing token")
+    return verify_access_token(token)
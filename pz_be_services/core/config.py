@@ -8,6 +8,72 @@ class EnvironmentVariables:
     SQLALCHEMY_DATABASE_URL = os.getenv(
         "SQLALCHEMY_DATABASE_URL", "sqlite:///./ProjectX.db"
     )
+    # Optional override, derived from SQLALCHEMY_DATABASE_URL when unset
+    SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv("SQLALCHEMY_ASYNC_DATABASE_URL")
+
+    # Connection pool for server databases (PostgreSQL etc.)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 50))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+
+    # SQLite engine profile, applied on every new connection
+    SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 8))
+    SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", 4))
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    # Negative values are KiB, so -65536 is a 64 MiB page cache per connection
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -65536))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+    # Group commit for message inserts: flush when either limit is reached
+    MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", 256))
+    MESSAGE_BATCH_INTERVAL_MS = float(os.getenv("MESSAGE_BATCH_INTERVAL_MS", 5))
+
+    # In-process cache of chat membership checks; 0 disables it
+    CHAT_ACCESS_CACHE_TTL_SECONDS = float(
+        os.getenv("CHAT_ACCESS_CACHE_TTL_SECONDS", 30)
+    )
+    CHAT_ACCESS_CACHE_MAX_SIZE = int(os.getenv("CHAT_ACCESS_CACHE_MAX_SIZE", 100000))
+
+    # Changes served by /v1/sync are kept this long; clients whose cursor
+    # is older are told to reset (db.maintenance prune-change-log)
+    CHANGE_LOG_RETENTION_DAYS = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", 30))
+
+    # Websocket fan-out between workers: "memory" (one worker) or "sqlite"
+    PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+    PUBSUB_SQLITE_PATH = os.getenv("PUBSUB_SQLITE_PATH", "pubsub.db")
+    PUBSUB_POLL_INTERVAL_MS = float(os.getenv("PUBSUB_POLL_INTERVAL_MS", 20))
+    PUBSUB_RETENTION_SECONDS = float(os.getenv("PUBSUB_RETENTION_SECONDS", 60))
+
+    # Outbound queue per websocket. On overflow: "drop_oldest", "coalesce"
+    # (replace a queued message with the same coalesce key, else drop the
+    # oldest) or "disconnect" the slow consumer
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+    # A single send stalled for longer than this disconnects the socket
+    WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+    # Most queued events sent together in one batch frame
+    WS_MAX_BATCH_EVENTS = int(os.getenv("WS_MAX_BATCH_EVENTS", 64))
+    # Heartbeats: quiet sockets are pinged after the interval and dropped
+    # if still quiet after the timeout (0 disables the reaper)
+    WS_PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL_SECONDS", 25))
+    WS_PING_TIMEOUT_SECONDS = float(os.getenv("WS_PING_TIMEOUT_SECONDS", 20))
+    # Opening more closes the user's oldest connection
+    WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 10))
+    # Partitions of the connection registry, keyed by user id
+    WS_REGISTRY_SHARDS = int(os.getenv("WS_REGISTRY_SHARDS", 16))
+    # Catch-up for users offline when a message is pushed to them: cursors
+    # kept per user, and the most missed messages sent on reconnect
+    WS_PENDING_TTL_SECONDS = float(os.getenv("WS_PENDING_TTL_SECONDS", 3600))
+    WS_PENDING_MAX_CHATS_PER_USER = int(os.getenv("WS_PENDING_MAX_CHATS_PER_USER", 100))
+    WS_PENDING_MAX_USERS = int(os.getenv("WS_PENDING_MAX_USERS", 100000))
+    WS_PENDING_FLUSH_LIMIT = int(os.getenv("WS_PENDING_FLUSH_LIMIT", 200))
+
+    # Seconds of silence after which an SSE stream gets a keepalive comment
+    SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
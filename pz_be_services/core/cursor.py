@@ -0,0 +1,31 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Pack sort-key values into an opaque, URL-safe pagination cursor.
+    Datetimes are stored as ISO-8601 strings.
+    """
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> List[Any]:
+    """
+    Unpack a cursor made by ``encode_cursor``, converting each value with
+    the matching callable (e.g. ``datetime.fromisoformat``, ``int``).
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("wrong number of values")
+        return [convert(value) for convert, value in zip(types, values)]
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
@@ -0,0 +1,107 @@
+"""
+SQLite triggers that fill ``change_log``, the per-user feed behind
+``GET /v1/sync``.
+
+Every change is fanned out to the chat's participants in the same
+transaction as the write that caused it, so the feed can't miss or
+reorder a change, whichever code path made it. Like the FTS indexes this
+is SQLite-only; on other dialects the table stays empty.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Change kinds, as stored in change_log.kind
+MESSAGE = "message"
+MESSAGE_EDITED = "message_edited"
+MESSAGE_DELETED = "message_deleted"
+MEMBER_ADDED = "member_added"
+MEMBER_REMOVED = "member_removed"
+READ = "read"
+CHAT_UPDATED = "chat_updated"
+
+_PARTICIPANTS = "SELECT user_id FROM chat_participants WHERE chat_id = {chat_id}"
+
+_CREATE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_message_ai AFTER INSERT ON messages
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, new.chat_id, '{MESSAGE}', new.id
+        FROM ({_PARTICIPANTS.format(chat_id="new.chat_id")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_message_au
+    AFTER UPDATE OF content, message_type, is_edited, edited_at ON messages
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, new.chat_id, '{MESSAGE_EDITED}', new.id
+        FROM ({_PARTICIPANTS.format(chat_id="new.chat_id")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_message_ad AFTER DELETE ON messages
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, old.chat_id, '{MESSAGE_DELETED}', old.id
+        FROM ({_PARTICIPANTS.format(chat_id="old.chat_id")});
+    END
+    """,
+    # The new member is already a participant, so they get the change too
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_participant_ai
+    AFTER INSERT ON chat_participants
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, new.chat_id, '{MEMBER_ADDED}', new.user_id
+        FROM ({_PARTICIPANTS.format(chat_id="new.chat_id")});
+    END
+    """,
+    # ... while a removed member is not, and is told separately
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_participant_ad
+    AFTER DELETE ON chat_participants
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, old.chat_id, '{MEMBER_REMOVED}', old.user_id
+        FROM ({_PARTICIPANTS.format(chat_id="old.chat_id")} UNION SELECT old.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_read_ai AFTER INSERT ON chat_reads
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id, value)
+        SELECT user_id, new.chat_id, '{READ}', new.user_id, new.last_read_message_id
+        FROM ({_PARTICIPANTS.format(chat_id="new.chat_id")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_read_au
+    AFTER UPDATE OF last_read_message_id ON chat_reads
+    WHEN new.last_read_message_id IS NOT old.last_read_message_id
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id, value)
+        SELECT user_id, new.chat_id, '{READ}', new.user_id, new.last_read_message_id
+        FROM ({_PARTICIPANTS.format(chat_id="new.chat_id")});
+    END
+    """,
+    # last_message_at moves on every message; only title and state count
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_chat_au
+    AFTER UPDATE OF title, is_active ON chats
+    WHEN new.title IS NOT old.title OR new.is_active IS NOT old.is_active
+    BEGIN
+        INSERT INTO change_log(user_id, chat_id, kind, entity_id)
+        SELECT user_id, new.id, '{CHAT_UPDATED}', new.id
+        FROM ({_PARTICIPANTS.format(chat_id="new.id")});
+    END
+    """,
+)
+
+
+def create_change_log_triggers(engine: Engine) -> None:
+    """Create the change_log triggers if they are missing."""
+    with engine.begin() as conn:
+        for trigger in _CREATE_TRIGGERS:
+            conn.execute(text(trigger))
@@ -2,6 +2,17 @@ from .base import CRUDBase
 from .crud_user import user
 from .crud_chat import chat
 from .crud_message import message
+from .crud_chat_read import chat_read
+from .crud_unread_counter import unread_counter
+from .crud_change_log import change_log
 
 # Export all CRUD instances for easy import
-__all__ = ["user", "chat", "message", "CRUDBase"]
\ No newline at end of file
+__all__ = [
+    "user",
+    "chat",
+    "message",
+    "chat_read",
+    "unread_counter",
+    "change_log",
+    "CRUDBase",
+]
@@ -1,9 +1,23 @@
 from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 
+def get_dialect_insert(db: Union[Session, AsyncSession]):
+    """
+    Return the dialect's ``insert`` construct, which supports
+    ``on_conflict_do_update`` / ``on_conflict_do_nothing`` upserts.
+    """
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
 ModelType = TypeVar("ModelType", bound=declarative_base())
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
@@ -93,4 +107,12 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """Get multiple records by any field"""
         return db.query(self.model).filter(
             getattr(self.model, field_name) == field_value
-        ).offset(skip).limit(limit).all()
\ No newline at end of file
+        ).offset(skip).limit(limit).all()
+
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def get_async(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        """Get a single record by ID"""
+        result = await db.execute(select(self.model).where(self.model.id == id))
+        return result.scalars().first()
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session, joinedload
+
+from ..models import ChangeLog, Message
+
+
+class CRUDChangeLog:
+    """
+    The per-user change feed in change_log. Rows are only ever written by
+    the triggers in db/change_log.py; this class reads and prunes them.
+    """
+
+    def get_changes(
+        self, db: Session, *, user_id: int, after_id: int, limit: int
+    ) -> List[ChangeLog]:
+        """The user's changes past ``after_id``, oldest first"""
+        return list(
+            db.execute(
+                select(ChangeLog)
+                .where(ChangeLog.user_id == user_id, ChangeLog.id > after_id)
+                .order_by(ChangeLog.id)
+                .limit(limit)
+            ).scalars()
+        )
+
+    def get_head(self, db: Session) -> int:
+        """Id of the latest change, 0 if there is none"""
+        return db.execute(select(func.max(ChangeLog.id))).scalar() or 0
+
+    def get_oldest_id(self, db: Session) -> Optional[int]:
+        """Id of the oldest change still kept"""
+        return db.execute(select(func.min(ChangeLog.id))).scalar()
+
+    def get_messages(self, db: Session, *, message_ids: List[int]) -> List[Message]:
+        """The current rows of changed messages, with their senders"""
+        if not message_ids:
+            return []
+        return list(
+            db.execute(
+                select(Message)
+                .options(joinedload(Message.sender))
+                .where(Message.id.in_(message_ids))
+            ).scalars()
+        )
+
+    def prune(self, db: Session, *, before: datetime) -> int:
+        """
+        Delete changes recorded before ``before`` (naive UTC). The latest
+        change is always kept so its id still marks what was pruned.
+        """
+        result = db.execute(
+            delete(ChangeLog).where(
+                ChangeLog.created_at < before,
+                ChangeLog.id < select(func.max(ChangeLog.id)).scalar_subquery(),
+            )
+        )
+        db.commit()
+        return result.rowcount
+
+
+change_log = CRUDChangeLog()
@@ -1,14 +1,52 @@
-from typing import List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_, asc, desc, func, null, select, exists, tuple_
 from datetime import datetime, timezone
 
-from .base import CRUDBase
-from ..models import Chat, User, Message
+from .base import CRUDBase, get_dialect_insert
+from ..models import (
+    Chat,
+    ChatUnreadCounter,
+    User,
+    Message,
+    PrivateChatPair,
+    chat_participants,
+)
+from ..search import build_match_query, chat_search, is_search_available, match
 from schemas.chat import ChatCreate, ChatUpdate, ChatCreateModel
+from core.config import EnvironmentVariables
+from core.ttl_cache import TTLCache
+
+
+class ChatAccess(NamedTuple):
+    """What a chat endpoint needs to authorize a user against a chat"""
+
+    chat_type: str
+    is_active: bool
+    is_participant: bool
+
+
+# Characters of the last message shown in the inbox
+INBOX_PREVIEW_LENGTH = 100
+
+# Keyed by (chat_id, user_id); only chats that exist are cached
+chat_access_cache: TTLCache[ChatAccess] = TTLCache(
+    ttl_seconds=EnvironmentVariables.CHAT_ACCESS_CACHE_TTL_SECONDS,
+    max_size=EnvironmentVariables.CHAT_ACCESS_CACHE_MAX_SIZE,
+)
 
 
 class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
+    def _invalidate_access(self, chat_id: int, user_ids: List[int]) -> None:
+        for user_id in user_ids:
+            chat_access_cache.invalidate((chat_id, user_id))
+
+    def _invalidate_chat_access(self, chat_id: int) -> None:
+        chat_access_cache.invalidate_where(lambda key: key[0] == chat_id)
+
     def create_with_participants(
         self, db: Session, *, obj_in: ChatCreateModel, participant_ids: List[int]
     ) -> Chat:
@@ -21,6 +59,7 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
         chat.participants.extend(participants)
 
         db.commit()
+        self._invalidate_access(chat.id, participant_ids)
         db.refresh(chat)
         return chat
 
@@ -38,30 +77,113 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
             .all()
         )
 
-    def get_private_chat(
-        self, db: Session, *, user1_id: int, user2_id: int
-    ) -> Optional[Chat]:
-        """Get private chat between two users"""
-        # Find a chat that has exactly these two participants
-        chats = (
-            db.query(Chat)
-            .join(Chat.participants)
-            .filter(
+    def _private_chat_query(self, user1_id: int, user2_id: int):
+        # Point lookup on the canonical (low, high) primary key
+        user_low_id, user_high_id = sorted((user1_id, user2_id))
+        return (
+            select(Chat)
+            .join(PrivateChatPair, PrivateChatPair.chat_id == Chat.id)
+            .where(
                 and_(
-                    Chat.chat_type == "private",
-                    Chat.is_active == True,
-                    or_(User.id == user1_id, User.id == user2_id),
+                    PrivateChatPair.user_low_id == user_low_id,
+                    PrivateChatPair.user_high_id == user_high_id,
                 )
             )
-            .all()
         )
 
-        for chat in chats:
-            participant_ids = {p.id for p in chat.participants}
-            if participant_ids == {user1_id, user2_id}:
-                return chat
+    def get_or_create_private_chat(
+        self, db: Session, *, obj_in: ChatCreateModel, user1_id: int, user2_id: int
+    ) -> Tuple[Chat, bool]:
+        """
+        Get the private chat between two users, creating it if there is none.
+        The chat, its participants and its user pair are inserted in one
+        transaction; if a concurrent request creates the pair first, the
+        insert fails on its primary key and that chat is returned instead.
+        A pair has one chat for good, so a deactivated one is reactivated.
+        Returns the chat and whether it was created.
+        """
+        # Inactive chats too: the pair's primary key still holds them
+        existing_chat = db.execute(
+            self._private_chat_query(user1_id, user2_id)
+        ).scalar_one_or_none()
+        if existing_chat:
+            return self._reactivate(db, existing_chat), False
+
+        user_low_id, user_high_id = sorted((user1_id, user2_id))
+        new_chat = Chat(**jsonable_encoder(obj_in))
+        db.add(new_chat)
+        db.flush()
+        db.execute(
+            chat_participants.insert(),
+            [
+                {"chat_id": new_chat.id, "user_id": user_low_id},
+                {"chat_id": new_chat.id, "user_id": user_high_id},
+            ],
+        )
+        db.add(
+            PrivateChatPair(
+                user_low_id=user_low_id,
+                user_high_id=user_high_id,
+                chat_id=new_chat.id,
+            )
+        )
+
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            winner = db.execute(
+                self._private_chat_query(user1_id, user2_id)
+            ).scalar_one_or_none()
+            if winner is None:
+                raise
+            return self._reactivate(db, winner), False
+
+        self._invalidate_access(new_chat.id, [user_low_id, user_high_id])
+        db.refresh(new_chat)
+        return new_chat, True
+
+    def _reactivate(self, db: Session, chat: Chat) -> Chat:
+        if not chat.is_active:
+            chat.is_active = True
+            db.commit()
+            self._invalidate_chat_access(chat.id)
+            db.refresh(chat)
+        return chat
+
+    def backfill_private_pairs(self, db: Session) -> int:
+        """
+        Register the user pair of every active private chat that has exactly
+        two participants. Where legacy duplicates exist, the oldest chat of
+        a pair wins. Existing pairs are left alone.
+        """
+        chat_pairs = (
+            select(
+                chat_participants.c.chat_id,
+                func.min(chat_participants.c.user_id).label("user_low_id"),
+                func.max(chat_participants.c.user_id).label("user_high_id"),
+            )
+            .select_from(chat_participants)
+            .join(Chat, Chat.id == chat_participants.c.chat_id)
+            .where(and_(Chat.chat_type == "private", Chat.is_active == True))
+            .group_by(chat_participants.c.chat_id)
+            .having(func.count() == 2)
+            .subquery()
+        )
+        source = select(
+            chat_pairs.c.user_low_id,
+            chat_pairs.c.user_high_id,
+            func.min(chat_pairs.c.chat_id),
+        ).group_by(chat_pairs.c.user_low_id, chat_pairs.c.user_high_id)
 
-        return None
+        insert = get_dialect_insert(db)
+        result = db.execute(
+            insert(PrivateChatPair)
+            .from_select(["user_low_id", "user_high_id", "chat_id"], source)
+            .on_conflict_do_nothing()
+        )
+        db.commit()
+        return result.rowcount
 
     def add_participant(
         self, db: Session, *, chat_id: int, user_id: int
@@ -73,6 +195,7 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
         if chat and user and user not in chat.participants:
             chat.participants.append(user)
             db.commit()
+            self._invalidate_access(chat_id, [user_id])
             db.refresh(chat)
 
         return chat
@@ -87,6 +210,7 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
         if chat and user and user in chat.participants:
             chat.participants.remove(user)
             db.commit()
+            self._invalidate_access(chat_id, [user_id])
             db.refresh(chat)
 
         return chat
@@ -120,13 +244,123 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
 
         return chat
 
-    def is_participant(self, db: Session, *, chat_id: int, user_id: int) -> bool:
-        """Check if user is a participant in the chat"""
-        chat = self.get(db, id=chat_id)
-        if not chat:
-            return False
+    def _is_participant_clause(self, chat_id, user_id: int):
+        return exists().where(
+            and_(
+                chat_participants.c.chat_id == chat_id,
+                chat_participants.c.user_id == user_id,
+            )
+        )
+
+    def _access_query(self, chat_id: int, user_id: int):
+        # One primary-key lookup on chats plus an EXISTS on chat_participants
+        return select(
+            Chat.chat_type,
+            Chat.is_active,
+            self._is_participant_clause(Chat.id, user_id),
+        ).where(Chat.id == chat_id)
+
+    def _to_access(self, chat_id: int, user_id: int, row) -> Optional[ChatAccess]:
+        if row is None:
+            return None
+        access = ChatAccess(row[0], bool(row[1]), bool(row[2]))
+        chat_access_cache.set((chat_id, user_id), access)
+        return access
+
+    def get_access(
+        self, db: Session, *, chat_id: int, user_id: int
+    ) -> Optional[ChatAccess]:
+        """
+        Get the chat's type, active flag and whether the user participates
+        in it, or None if the chat does not exist. Served from the membership
+        cache when possible.
+        """
+        access = chat_access_cache.get((chat_id, user_id))
+        if access is not None:
+            return access
+        row = db.execute(self._access_query(chat_id, user_id)).first()
+        return self._to_access(chat_id, user_id, row)
+
+    def update(
+        self, db: Session, *, db_obj: Chat, obj_in: Union[ChatUpdate, Dict[str, Any]]
+    ) -> Chat:
+        chat = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        self._invalidate_chat_access(chat.id)
+        return chat
+
+    def delete(self, db: Session, *, id: int) -> Chat:
+        chat = super().delete(db, id=id)
+        self._invalidate_chat_access(id)
+        return chat
+
+    def get_inbox_page(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, int]] = None,
+    ) -> Tuple[List[Any], bool]:
+        """
+        Keyset-paginate the user's active chats, most recently active first.
+        Activity is last_message_at, or created_at for chats without
+        messages; ``before`` is the (activity, id) key of the last chat of
+        the previous page.
 
-        return any(participant.id == user_id for participant in chat.participants)
+        The page is picked first and correlated subqueries then fill in the
+        participant count and last message preview for just those rows, so
+        the whole page (including the user's unread counts) is one query.
+        Returns the rows and whether more chats follow.
+        """
+        activity = func.coalesce(Chat.last_message_at, Chat.created_at)
+        page = (
+            select(
+                Chat.id,
+                Chat.title,
+                Chat.chat_type,
+                Chat.last_message_at,
+                activity.label("activity"),
+                func.coalesce(ChatUnreadCounter.unread_count, 0).label("unread_count"),
+            )
+            .select_from(chat_participants)
+            .join(Chat, Chat.id == chat_participants.c.chat_id)
+            .outerjoin(
+                ChatUnreadCounter,
+                and_(
+                    ChatUnreadCounter.chat_id == chat_participants.c.chat_id,
+                    ChatUnreadCounter.user_id == chat_participants.c.user_id,
+                ),
+            )
+            .where(and_(chat_participants.c.user_id == user_id, Chat.is_active == True))
+        )
+        if before is not None:
+            page = page.where(tuple_(activity, Chat.id) < tuple_(*before))
+        page = page.order_by(desc(activity), desc(Chat.id)).limit(limit + 1).subquery()
+
+        participant_count = (
+            select(func.count())
+            .select_from(chat_participants)
+            .where(chat_participants.c.chat_id == page.c.id)
+            .scalar_subquery()
+        )
+        # Seeks ix_messages_chat_id_timestamp_id from the newest end
+        last_message_preview = (
+            select(func.substr(Message.content, 1, INBOX_PREVIEW_LENGTH))
+            .where(Message.chat_id == page.c.id)
+            .order_by(desc(Message.timestamp), desc(Message.id))
+            .limit(1)
+            .scalar_subquery()
+        )
+
+        rows = db.execute(
+            select(
+                page,
+                participant_count.label("participant_count"),
+                last_message_preview.label("last_message_preview"),
+            ).order_by(desc(page.c.activity), desc(page.c.id))
+        ).all()
+        has_more = len(rows) > limit
+        return rows[:limit], has_more
 
     def get_group_chats(
         self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
@@ -168,5 +402,83 @@ class CRUDChat(CRUDBase[Chat, ChatCreateModel, ChatUpdate]):
             .all()
         )
 
+    def search_chats_page(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> Tuple[List[Tuple[Chat, float]], bool]:
+        """
+        Full-text search over the titles of the user's active chats, best
+        BM25 match first. ``after`` is the (rank, id) key of the last hit of
+        the previous page. Returns (chat, rank) hits and whether more follow.
+        Without the FTS index this falls back to a LIKE scan.
+        """
+        stmt = (
+            select(Chat)
+            .join(chat_participants, chat_participants.c.chat_id == Chat.id)
+            .where(and_(chat_participants.c.user_id == user_id, Chat.is_active == True))
+        )
+
+        if is_search_available(db.connection()):
+            match_query = build_match_query(query)
+            if match_query is None:
+                return [], False
+            rank = chat_search.c.rank
+            stmt = (
+                stmt.add_columns(rank)
+                .join(chat_search, chat_search.c.rowid == Chat.id)
+                .where(match(chat_search, match_query))
+            )
+            if after is not None:
+                after_rank, after_id = after
+                stmt = stmt.where(
+                    or_(
+                        rank > after_rank,
+                        and_(rank == after_rank, Chat.id < after_id),
+                    )
+                )
+            stmt = stmt.order_by(asc(rank), desc(Chat.id))
+        else:
+            stmt = stmt.add_columns(null()).where(Chat.title.ilike(f"%{query}%"))
+            if after is not None:
+                stmt = stmt.where(Chat.id < after[1])
+            stmt = stmt.order_by(desc(Chat.id))
+
+        rows = db.execute(stmt.limit(limit + 1)).all()
+        hits = [(chat_obj, rank or 0.0) for chat_obj, rank in rows]
+        return hits[:limit], len(hits) > limit
+
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def get_access_async(
+        self, db: AsyncSession, *, chat_id: int, user_id: int
+    ) -> Optional[ChatAccess]:
+        """
+        Get the chat's type, active flag and whether the user participates
+        in it, or None if the chat does not exist. Served from the membership
+        cache when possible.
+        """
+        access = chat_access_cache.get((chat_id, user_id))
+        if access is not None:
+            return access
+        result = await db.execute(self._access_query(chat_id, user_id))
+        return self._to_access(chat_id, user_id, result.first())
+
+    async def get_participant_ids_async(
+        self, db: AsyncSession, *, chat_id: int
+    ) -> List[int]:
+        """Get the user IDs of every participant in a chat"""
+        result = await db.execute(
+            select(chat_participants.c.user_id).where(
+                chat_participants.c.chat_id == chat_id
+            )
+        )
+        return list(result.scalars().all())
+
 
 chat = CRUDChat(Chat)
@@ -0,0 +1,259 @@
+from typing import Dict, List, NamedTuple, Optional, Union
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, func, select
+
+from .base import get_dialect_insert
+from .crud_unread_counter import unread_counter
+from ..models import ChatRead, Message, chat_participants
+
+
+class ReadState(NamedTuple):
+    """Read watermarks of a chat as seen by one participant"""
+
+    user_id: int
+    own_watermark: int
+    # Highest watermark among the other participants
+    others_watermark: int
+
+    def is_read(self, *, sender_id: int, message_id: int) -> bool:
+        """
+        A message the viewer sent counts as read once another participant
+        has read it; anything else once the viewer has read it.
+        """
+        if sender_id == self.user_id:
+            return self.others_watermark >= message_id
+        return self.own_watermark >= message_id
+
+
+class CRUDChatRead:
+    """Read watermarks in chat_reads, one row per (chat, participant)"""
+
+    def _upsert_statement(
+        self,
+        db: Union[Session, AsyncSession],
+        *,
+        chat_id: int,
+        user_id: int,
+        watermark,
+    ):
+        insert = get_dialect_insert(db)
+        stmt = insert(ChatRead).values(
+            chat_id=chat_id,
+            user_id=user_id,
+            last_read_message_id=watermark,
+            read_at=datetime.now(timezone.utc),
+        )
+        # Watermarks only move forward, even if an older mark-read lands late
+        return stmt.on_conflict_do_update(
+            index_elements=[ChatRead.chat_id, ChatRead.user_id],
+            set_={
+                "last_read_message_id": case(
+                    (
+                        stmt.excluded.last_read_message_id
+                        > ChatRead.last_read_message_id,
+                        stmt.excluded.last_read_message_id,
+                    ),
+                    else_=ChatRead.last_read_message_id,
+                ),
+                "read_at": stmt.excluded.read_at,
+            },
+        )
+
+    def _mark_read_statements(
+        self,
+        db: Union[Session, AsyncSession],
+        *,
+        chat_id: int,
+        user_id: int,
+        watermark,
+    ) -> List:
+        # The counter is recomputed from the tail past the new watermark
+        # (normally empty) inside the same transaction, so it stays exact
+        return [
+            self._upsert_statement(
+                db, chat_id=chat_id, user_id=user_id, watermark=watermark
+            ),
+            unread_counter.reset_statement(
+                db,
+                chat_id=chat_id,
+                user_id=user_id,
+                unread_count=self._unread_count_query(
+                    chat_id, user_id
+                ).scalar_subquery(),
+            ),
+        ]
+
+    def _latest_message_id(self, chat_id: int):
+        return (
+            select(func.coalesce(func.max(Message.id), 0))
+            .where(Message.chat_id == chat_id)
+            .scalar_subquery()
+        )
+
+    def _watermark(self, chat_id: int, user_id: int):
+        return func.coalesce(
+            select(ChatRead.last_read_message_id)
+            .where(and_(ChatRead.chat_id == chat_id, ChatRead.user_id == user_id))
+            .scalar_subquery(),
+            0,
+        )
+
+    def _unread_count_query(self, chat_id: int, user_id: int):
+        return select(func.count(Message.id)).where(
+            and_(
+                Message.chat_id == chat_id,
+                Message.id > self._watermark(chat_id, user_id),
+                Message.sender_id != user_id,
+            )
+        )
+
+    def get_watermark(self, db: Session, *, chat_id: int, user_id: int) -> int:
+        """Get the id of the last message the user has read in a chat"""
+        return db.execute(select(self._watermark(chat_id, user_id))).scalar_one()
+
+    def get_read_state(self, db: Session, *, chat_id: int, user_id: int) -> ReadState:
+        """Get the viewer's and the other participants' watermarks in one query"""
+        rows = db.execute(
+            select(ChatRead.user_id, ChatRead.last_read_message_id).where(
+                ChatRead.chat_id == chat_id
+            )
+        ).all()
+        watermarks: Dict[int, int] = {
+            row.user_id: row.last_read_message_id for row in rows
+        }
+        own = watermarks.pop(user_id, 0)
+        return ReadState(user_id, own, max(watermarks.values(), default=0))
+
+    def get_read_states(
+        self, db: Session, *, chat_ids: List[int], user_id: int
+    ) -> Dict[int, ReadState]:
+        """Get the read state of several chats for one viewer in one query"""
+        per_chat: Dict[int, Dict[int, int]] = {chat_id: {} for chat_id in chat_ids}
+        if chat_ids:
+            rows = db.execute(
+                select(
+                    ChatRead.chat_id, ChatRead.user_id, ChatRead.last_read_message_id
+                ).where(ChatRead.chat_id.in_(chat_ids))
+            ).all()
+            for row in rows:
+                per_chat[row.chat_id][row.user_id] = row.last_read_message_id
+
+        states = {}
+        for chat_id, watermarks in per_chat.items():
+            own = watermarks.pop(user_id, 0)
+            states[chat_id] = ReadState(
+                user_id, own, max(watermarks.values(), default=0)
+            )
+        return states
+
+    def mark_read(
+        self,
+        db: Session,
+        *,
+        chat_id: int,
+        user_id: int,
+        message_id: Optional[int] = None,
+    ) -> int:
+        """
+        Move the user's watermark up to ``message_id`` (default: the latest
+        message in the chat) with a single upsert, and reset the user's
+        unread counter in the same transaction. Returns the number of
+        messages that became read.
+        """
+        if message_id is None:
+            watermark = self._latest_message_id(chat_id)
+            newly_read = unread_counter.get_count(db, chat_id=chat_id, user_id=user_id)
+        else:
+            watermark = message_id
+            newly_read = db.execute(
+                self._unread_count_query(chat_id, user_id).where(
+                    Message.id <= watermark
+                )
+            ).scalar_one()
+
+        for stmt in self._mark_read_statements(
+            db, chat_id=chat_id, user_id=user_id, watermark=watermark
+        ):
+            db.execute(stmt)
+        db.commit()
+        return newly_read
+
+    def get_unread_count(self, db: Session, *, chat_id: int, user_id: int) -> int:
+        """Count messages past the user's watermark that others sent"""
+        return db.execute(self._unread_count_query(chat_id, user_id)).scalar_one()
+
+    def backfill_from_is_read(self, db: Session) -> int:
+        """
+        Seed watermarks from the legacy Message.is_read flags: each
+        participant's watermark becomes the newest message sent to them
+        that was flagged read. Only runs while chat_reads is empty.
+        """
+        if db.execute(select(ChatRead.chat_id).limit(1)).first() is not None:
+            return 0
+
+        read_up_to = (
+            select(func.max(Message.id))
+            .where(
+                and_(
+                    Message.chat_id == chat_participants.c.chat_id,
+                    Message.sender_id != chat_participants.c.user_id,
+                    Message.is_read == True,
+                )
+            )
+            .scalar_subquery()
+        )
+        source = select(
+            chat_participants.c.chat_id,
+            chat_participants.c.user_id,
+            read_up_to.label("last_read_message_id"),
+        ).where(read_up_to.is_not(None))
+        result = db.execute(
+            ChatRead.__table__.insert().from_select(
+                ["chat_id", "user_id", "last_read_message_id"], source
+            )
+        )
+        db.commit()
+        return result.rowcount
+
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def mark_read_async(
+        self,
+        db: AsyncSession,
+        *,
+        chat_id: int,
+        user_id: int,
+        message_id: Optional[int] = None,
+    ) -> int:
+        """
+        Move the user's watermark up to ``message_id`` (default: the latest
+        message in the chat) with a single upsert, and reset the user's
+        unread counter in the same transaction. Returns the number of
+        messages that became read.
+        """
+        if message_id is None:
+            watermark = self._latest_message_id(chat_id)
+            newly_read = await unread_counter.get_count_async(
+                db, chat_id=chat_id, user_id=user_id
+            )
+        else:
+            watermark = message_id
+            result = await db.execute(
+                self._unread_count_query(chat_id, user_id).where(
+                    Message.id <= watermark
+                )
+            )
+            newly_read = result.scalar_one()
+
+        for stmt in self._mark_read_statements(
+            db, chat_id=chat_id, user_id=user_id, watermark=watermark
+        ):
+            await db.execute(stmt)
+        await db.commit()
+        return newly_read
+
+
+chat_read = CRUDChatRead()
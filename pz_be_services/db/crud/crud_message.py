@@ -1,28 +1,25 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, asc
+from typing import Dict, List, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, desc, asc, select, update, func, null, tuple_
 from datetime import datetime, timezone
 
 from .base import CRUDBase
-from ..models import Message, Chat
+from .crud_chat_read import chat_read
+from .crud_unread_counter import unread_counter
+from ..models import Message, Chat, chat_participants
+from ..search import (
+    build_match_query,
+    is_search_available,
+    match,
+    message_search,
+    snippet,
+)
 from schemas.message import MessageCreate, MessageUpdate
 
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
-    def create_with_chat_update(self, db: Session, *, obj_in: MessageCreate) -> Message:
-        """Create a message and update chat's last_message_at"""
-        # Create the message
-        message = super().create(db, obj_in=obj_in)
-
-        # Update the chat's last message timestamp
-        chat = db.query(Chat).filter(Chat.id == obj_in.chat_id).first()
-        if chat:
-            chat.last_message_at = message.timestamp
-            db.commit()
-
-        db.refresh(message)
-        return message
-
     def get_chat_messages(
         self,
         db: Session,
@@ -32,8 +29,12 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
         limit: int = 100,
         order: str = "asc",
     ) -> List[Message]:
-        """Get messages for a specific chat"""
-        query = db.query(Message).filter(Message.chat_id == chat_id)
+        """Get messages for a specific chat, with their senders eager-loaded"""
+        query = (
+            db.query(Message)
+            .options(joinedload(Message.sender))
+            .filter(Message.chat_id == chat_id)
+        )
 
         if order.lower() == "desc":
             query = query.order_by(desc(Message.timestamp))
@@ -42,49 +43,121 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
 
         return query.offset(skip).limit(limit).all()
 
+    def get_chat_messages_page(
+        self,
+        db: Session,
+        *,
+        chat_id: int,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, int]] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        order: str = "asc",
+        skip: int = 0,
+    ) -> Tuple[List[Message], bool]:
+        """
+        Keyset-paginate a chat's messages on (timestamp, id).
+
+        ``before``/``after`` are (timestamp, id) keys of the message to page
+        from; each page is a single seek on ix_messages_chat_id_timestamp_id
+        whatever its depth. Without a key, the page starts at the oldest
+        (asc) or newest (desc) message, offset by ``skip`` for legacy callers.
+        Returns the page in ``order`` and whether more messages lie further
+        in the direction of travel.
+        """
+        key = tuple_(Message.timestamp, Message.id)
+        # Senders come back in the same round trip, not one query per row
+        query = (
+            db.query(Message)
+            .options(joinedload(Message.sender))
+            .filter(Message.chat_id == chat_id)
+        )
+
+        if before is not None:
+            query = query.filter(key < tuple_(*before))
+            newest_first = True
+        elif after is not None:
+            query = query.filter(key > tuple_(*after))
+            newest_first = False
+        else:
+            newest_first = order.lower() == "desc"
+            if skip:
+                query = query.offset(skip)
+
+        if newest_first:
+            query = query.order_by(desc(Message.timestamp), desc(Message.id))
+        else:
+            query = query.order_by(asc(Message.timestamp), asc(Message.id))
+
+        messages = query.limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+
+        if newest_first != (order.lower() == "desc"):
+            messages.reverse()
+
+        return messages, has_more
+
+    def get_chat_messages_window(
+        self,
+        db: Session,
+        *,
+        chat_id: int,
+        anchor: Tuple[datetime, int],
+        limit: int = 25,
+    ) -> Tuple[List[Message], List[Message], bool, bool]:
+        """
+        The messages around the (timestamp, id) key ``anchor``, oldest first:
+        up to ``limit`` before it, and the first message at or after it plus
+        up to ``limit`` more. Each side is one seek from the anchor on
+        ix_messages_chat_id_timestamp_id. Returns both sides and whether
+        there are older and newer messages beyond them.
+
+        An anchor of (timestamp, 0) centres the window on a point in time.
+        """
+        timestamp, message_id = anchor
+        older, has_older = self.get_chat_messages_page(
+            db, chat_id=chat_id, limit=limit, before=anchor
+        )
+        # Ids are integers, so "after id - 1" includes the anchor itself
+        newer, has_newer = self.get_chat_messages_page(
+            db, chat_id=chat_id, limit=limit + 1, after=(timestamp, message_id - 1)
+        )
+        return older, newer, has_older, has_newer
+
     def get_unread_messages(
         self, db: Session, *, chat_id: int, user_id: int
     ) -> List[Message]:
-        """Get unread messages for a user in a specific chat"""
+        """Get messages past the user's read watermark in a specific chat"""
+        watermark = chat_read.get_watermark(db, chat_id=chat_id, user_id=user_id)
         return (
             db.query(Message)
             .filter(
                 and_(
                     Message.chat_id == chat_id,
+                    Message.id > watermark,
                     Message.sender_id != user_id,  # Not sent by the user
-                    Message.is_read == False,
                 )
             )
-            .order_by(asc(Message.timestamp))
+            .order_by(asc(Message.timestamp), asc(Message.id))
             .all()
         )
 
     def mark_as_read(
         self, db: Session, *, message_id: int, user_id: int
     ) -> Optional[Message]:
-        """Mark a message as read by a specific user"""
+        """Mark a message, and everything before it, as read by a user"""
         message = self.get(db, id=message_id)
         if message and message.sender_id != user_id:
-            message.is_read = True
-            db.commit()
-            db.refresh(message)
+            chat_read.mark_read(
+                db, chat_id=message.chat_id, user_id=user_id, message_id=message.id
+            )
         return message
 
     def mark_chat_messages_as_read(
         self, db: Session, *, chat_id: int, user_id: int
     ) -> int:
         """Mark all unread messages in a chat as read for a user"""
-        unread_messages = self.get_unread_messages(db, chat_id=chat_id, user_id=user_id)
-        count = 0
-
-        for message in unread_messages:
-            message.is_read = True
-            count += 1
-
-        if count > 0:
-            db.commit()
-
-        return count
+        return chat_read.mark_read(db, chat_id=chat_id, user_id=user_id)
 
     def get_user_messages(
         self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
@@ -115,6 +188,70 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
             .all()
         )
 
+    def search_messages_page(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        query: str,
+        chat_id: Optional[int] = None,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> Tuple[List[Tuple[Message, float, Optional[str]]], bool]:
+        """
+        Full-text search over the messages of every chat the user is in, or
+        of ``chat_id`` only, best BM25 match first. ``query`` is free text
+        (see ``build_match_query``); ``after`` is the (rank, id) key of the
+        last hit of the previous page.
+
+        Returns (message, rank, snippet) hits and whether more follow.
+        Without the FTS index this falls back to a LIKE scan, newest first.
+        """
+        stmt = (
+            select(Message)
+            .join(
+                chat_participants,
+                and_(
+                    chat_participants.c.chat_id == Message.chat_id,
+                    chat_participants.c.user_id == user_id,
+                ),
+            )
+            .options(joinedload(Message.sender))
+        )
+        if chat_id is not None:
+            stmt = stmt.where(Message.chat_id == chat_id)
+
+        if is_search_available(db.connection()):
+            match_query = build_match_query(query)
+            if match_query is None:
+                return [], False
+            rank = message_search.c.rank
+            stmt = (
+                stmt.add_columns(rank, snippet(message_search))
+                .join(message_search, message_search.c.rowid == Message.id)
+                .where(match(message_search, match_query))
+            )
+            if after is not None:
+                after_rank, after_id = after
+                stmt = stmt.where(
+                    or_(
+                        rank > after_rank,
+                        and_(rank == after_rank, Message.id < after_id),
+                    )
+                )
+            stmt = stmt.order_by(asc(rank), desc(Message.id))
+        else:
+            stmt = stmt.add_columns(null(), null()).where(
+                Message.content.ilike(f"%{query}%")
+            )
+            if after is not None:
+                stmt = stmt.where(Message.id < after[1])
+            stmt = stmt.order_by(desc(Message.id))
+
+        rows = db.execute(stmt.limit(limit + 1)).all()
+        hits = [(msg, rank or 0.0, excerpt) for msg, rank, excerpt in rows]
+        return hits[:limit], len(hits) > limit
+
     def get_recent_messages(
         self, db: Session, *, chat_id: int, limit: int = 50
     ) -> List[Message]:
@@ -146,22 +283,6 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
         """Get total message count for a chat"""
         return db.query(Message).filter(Message.chat_id == chat_id).count()
 
-    def get_unread_count_by_chat(
-        self, db: Session, *, chat_id: int, user_id: int
-    ) -> int:
-        """Get unread message count for a user in a specific chat"""
-        return (
-            db.query(Message)
-            .filter(
-                and_(
-                    Message.chat_id == chat_id,
-                    Message.sender_id != user_id,
-                    Message.is_read == False,
-                )
-            )
-            .count()
-        )
-
     def delete_message(
         self, db: Session, *, message_id: int, user_id: int
     ) -> Optional[Message]:
@@ -169,6 +290,7 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
         message = self.get(db, id=message_id)
 
         if message and message.sender_id == user_id:
+            db.execute(unread_counter.decrement_for_deleted_statement(message=message))
             db.delete(message)
             db.commit()
             return message
@@ -196,5 +318,108 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
             .all()
         )
 
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def create_many_with_chat_update_async(
+        self, db: AsyncSession, *, objs_in: List[MessageCreate]
+    ) -> List[Message]:
+        """
+        Create a batch of messages in a single transaction.
+        Each chat's last_message_at is updated once per batch, whatever the
+        number of messages it received, and the recipients' unread counters
+        are bumped in the same transaction.
+        """
+        messages = [self.model(**jsonable_encoder(obj_in)) for obj_in in objs_in]
+        db.add_all(messages)
+        # Flush assigns ids and the Python-side defaults (timestamp, flags)
+        await db.flush()
+
+        last_message_at = {}
+        for msg in messages:
+            current = last_message_at.get(msg.chat_id)
+            if current is None or msg.timestamp > current:
+                last_message_at[msg.chat_id] = msg.timestamp
+
+        for chat_id, timestamp in last_message_at.items():
+            await db.execute(
+                update(Chat)
+                .where(Chat.id == chat_id)
+                .values(last_message_at=timestamp)
+            )
+        for stmt in unread_counter.increment_statements(db, messages=messages):
+            await db.execute(stmt)
+
+        await db.commit()
+        return messages
+
+    async def get_messages_from_async(
+        self,
+        db: AsyncSession,
+        *,
+        first_ids: Dict[int, int],
+        limit: int,
+        up_to: Optional[int] = None,
+    ) -> List[Message]:
+        """
+        Messages with an id of at least ``first_ids[chat_id]`` (and at most
+        ``up_to``) in each of the given chats, oldest first, with their
+        senders eager-loaded
+        """
+        if not first_ids:
+            return []
+        query = (
+            select(Message)
+            .options(joinedload(Message.sender))
+            .where(
+                or_(
+                    *(
+                        and_(Message.chat_id == chat_id, Message.id >= first_id)
+                        for chat_id, first_id in first_ids.items()
+                    )
+                )
+            )
+            .order_by(asc(Message.id))
+            .limit(limit)
+        )
+        if up_to is not None:
+            query = query.where(Message.id <= up_to)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+    async def get_user_messages_after_async(
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        after_id: int,
+        limit: int,
+        up_to: Optional[int] = None,
+    ) -> List[Message]:
+        """
+        Messages with an id above ``after_id`` (and at most ``up_to``) in
+        any of the user's chats, oldest first, with their senders
+        eager-loaded
+        """
+        user_chats = select(chat_participants.c.chat_id).where(
+            chat_participants.c.user_id == user_id
+        )
+        query = (
+            select(Message)
+            .options(joinedload(Message.sender))
+            .where(Message.chat_id.in_(user_chats), Message.id > after_id)
+            .order_by(asc(Message.id))
+            .limit(limit)
+        )
+        if up_to is not None:
+            query = query.where(Message.id <= up_to)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+    async def get_last_id_async(self, db: AsyncSession) -> int:
+        """Id of the latest message in any chat, 0 if there is none"""
+        result = await db.execute(select(func.max(Message.id)))
+        return result.scalar() or 0
+
 
 message = CRUDMessage(Message)
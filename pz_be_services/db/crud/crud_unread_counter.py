@@ -0,0 +1,203 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Union
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, func, literal, select, update
+
+from .base import get_dialect_insert
+from ..models import ChatRead, ChatUnreadCounter, Message, chat_participants
+
+
+class CRUDUnreadCounter:
+    """
+    Unread counters in chat_unread_counters.
+
+    The ``*_statements`` builders return statements that callers execute
+    inside their own transaction, so counters commit atomically with the
+    message insert, delete or watermark move that changed them.
+    """
+
+    def increment_statements(
+        self, db: Union[Session, AsyncSession], *, messages: Iterable[Message]
+    ) -> List:
+        """
+        Bump every other participant's counter for a batch of new messages,
+        with one upsert per (chat, sender) in the batch.
+        """
+        insert = get_dialect_insert(db)
+        per_sender = Counter((msg.chat_id, msg.sender_id) for msg in messages)
+
+        statements = []
+        for (chat_id, sender_id), count in per_sender.items():
+            recipients = select(
+                chat_participants.c.chat_id,
+                chat_participants.c.user_id,
+                literal(count),
+            ).where(
+                and_(
+                    chat_participants.c.chat_id == chat_id,
+                    chat_participants.c.user_id != sender_id,
+                )
+            )
+            stmt = insert(ChatUnreadCounter).from_select(
+                ["chat_id", "user_id", "unread_count"], recipients
+            )
+            statements.append(
+                stmt.on_conflict_do_update(
+                    index_elements=[
+                        ChatUnreadCounter.chat_id,
+                        ChatUnreadCounter.user_id,
+                    ],
+                    set_={
+                        "unread_count": ChatUnreadCounter.unread_count
+                        + stmt.excluded.unread_count
+                    },
+                )
+            )
+        return statements
+
+    def reset_statement(
+        self,
+        db: Union[Session, AsyncSession],
+        *,
+        chat_id: int,
+        user_id: int,
+        unread_count,
+    ):
+        """
+        Set a counter after a watermark move. ``unread_count`` is normally the
+        (tiny) tail count past the new watermark, so the counter stays exact
+        even if messages land between the client's request and the commit.
+        """
+        insert = get_dialect_insert(db)
+        stmt = insert(ChatUnreadCounter).values(
+            chat_id=chat_id, user_id=user_id, unread_count=unread_count
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[ChatUnreadCounter.chat_id, ChatUnreadCounter.user_id],
+            set_={"unread_count": stmt.excluded.unread_count},
+        )
+
+    def decrement_for_deleted_statement(self, *, message: Message):
+        """
+        Take a deleted message off the counters of participants who had not
+        read it yet.
+        """
+        watermark = func.coalesce(
+            select(ChatRead.last_read_message_id)
+            .where(
+                and_(
+                    ChatRead.chat_id == ChatUnreadCounter.chat_id,
+                    ChatRead.user_id == ChatUnreadCounter.user_id,
+                )
+            )
+            .scalar_subquery(),
+            0,
+        )
+        return (
+            update(ChatUnreadCounter)
+            .where(
+                and_(
+                    ChatUnreadCounter.chat_id == message.chat_id,
+                    ChatUnreadCounter.user_id != message.sender_id,
+                    ChatUnreadCounter.unread_count > 0,
+                    watermark < message.id,
+                )
+            )
+            .values(unread_count=ChatUnreadCounter.unread_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _count_query(self, chat_id: int, user_id: int):
+        return select(ChatUnreadCounter.unread_count).where(
+            and_(
+                ChatUnreadCounter.chat_id == chat_id,
+                ChatUnreadCounter.user_id == user_id,
+            )
+        )
+
+    def _user_counts_query(self, user_id: int):
+        # Outer join so chats that never had a counter row report 0
+        return (
+            select(
+                chat_participants.c.chat_id,
+                func.coalesce(ChatUnreadCounter.unread_count, 0),
+            )
+            .select_from(chat_participants)
+            .outerjoin(
+                ChatUnreadCounter,
+                and_(
+                    ChatUnreadCounter.chat_id == chat_participants.c.chat_id,
+                    ChatUnreadCounter.user_id == chat_participants.c.user_id,
+                ),
+            )
+            .where(chat_participants.c.user_id == user_id)
+        )
+
+    def get_count(self, db: Session, *, chat_id: int, user_id: int) -> int:
+        """Get the unread count of a user in one chat"""
+        return db.execute(self._count_query(chat_id, user_id)).scalar() or 0
+
+    def get_counts_for_user(self, db: Session, *, user_id: int) -> Dict[int, int]:
+        """Get the unread count of every chat the user participates in"""
+        rows = db.execute(self._user_counts_query(user_id)).all()
+        return {chat_id: count for chat_id, count in rows}
+
+    def is_empty(self, db: Session) -> bool:
+        return db.execute(select(ChatUnreadCounter.chat_id).limit(1)).first() is None
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Recompute every counter from messages and read watermarks.
+        Returns the number of counter rows written.
+        """
+        watermark = func.coalesce(
+            select(ChatRead.last_read_message_id)
+            .where(
+                and_(
+                    ChatRead.chat_id == chat_participants.c.chat_id,
+                    ChatRead.user_id == chat_participants.c.user_id,
+                )
+            )
+            # Nested two levels down, so correlate explicitly
+            .correlate(chat_participants)
+            .scalar_subquery(),
+            0,
+        )
+        unread = (
+            select(func.count(Message.id))
+            .where(
+                and_(
+                    Message.chat_id == chat_participants.c.chat_id,
+                    Message.id > watermark,
+                    Message.sender_id != chat_participants.c.user_id,
+                )
+            )
+            .correlate(chat_participants)
+            .scalar_subquery()
+        )
+        source = select(
+            chat_participants.c.chat_id, chat_participants.c.user_id, unread
+        )
+
+        db.execute(delete(ChatUnreadCounter))
+        result = db.execute(
+            ChatUnreadCounter.__table__.insert().from_select(
+                ["chat_id", "user_id", "unread_count"], source
+            )
+        )
+        db.commit()
+        return result.rowcount
+
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def get_count_async(
+        self, db: AsyncSession, *, chat_id: int, user_id: int
+    ) -> int:
+        """Get the unread count of a user in one chat"""
+        result = await db.execute(self._count_query(chat_id, user_id))
+        return result.scalar() or 0
+
+
+unread_counter = CRUDUnreadCounter()
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select
 
 from .base import CRUDBase
 from ..models import User
@@ -92,12 +93,17 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         users = db.query(User.username).filter(User.is_active).all()
         return [user.username for user in users]
 
-    def get_username_by_id(self, db: Session, *, user_id: int) -> Optional[str]:
+    # Async variants, for the websocket and message-writer paths, which open
+    # their own ``AsyncSessionLocal`` session
+
+    async def get_username_by_id_async(
+        self, db: AsyncSession, *, user_id: int
+    ) -> Optional[str]:
         """Get username by user_id"""
-        user = (
-            db.query(User.username).filter(User.id == user_id, User.is_active).first()
+        result = await db.execute(
+            select(User.username).where(User.id == user_id, User.is_active)
         )
-        return user.username if user else None
+        return result.scalars().first()
 
 
 user = CRUDUser(User)
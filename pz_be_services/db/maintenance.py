@@ -0,0 +1,104 @@
+"""
+Database maintenance commands.
+
+Run from the pz_be_services directory, e.g.:
+
+    python -m db.maintenance rebuild-unread-counters
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from db.models import Chat, Message, PrivateChatPair
+from db.crud import change_log, chat, chat_read, unread_counter
+from db.search import is_search_available, rebuild_search_indexes
+from core.config import EnvironmentVariables
+from core.logger import get_logger
+
+logger = get_logger("maintenance")
+
+
+def backfill_read_watermarks(db: Session) -> int:
+    """Seed chat_reads from the legacy Message.is_read flags"""
+    return chat_read.backfill_from_is_read(db)
+
+
+def rebuild_unread_counters(db: Session) -> int:
+    """Recompute chat_unread_counters from messages and read watermarks"""
+    return unread_counter.rebuild(db)
+
+
+def backfill_private_chat_pairs(db: Session) -> int:
+    """Register the canonical user pair of existing private chats"""
+    return chat.backfill_private_pairs(db)
+
+
+def rebuild_search_index(db: Session) -> int:
+    """Rebuild the FTS5 message and chat search indexes"""
+    if not is_search_available(db.connection()):
+        logger.warning("No full-text search index on this database")
+        return 0
+    indexed = rebuild_search_indexes(db.connection())
+    db.commit()
+    return indexed
+
+
+def prune_change_log(db: Session) -> int:
+    """Delete sync changes older than CHANGE_LOG_RETENTION_DAYS"""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+        days=EnvironmentVariables.CHANGE_LOG_RETENTION_DAYS
+    )
+    return change_log.prune(db, before=cutoff)
+
+
+def run_startup_migrations(db: Session) -> None:
+    """
+    One-off data migrations for derived tables, run on app startup.
+    Each step is a no-op once its table has been populated.
+    """
+    seeded = backfill_read_watermarks(db)
+    if seeded:
+        logger.info(f"Seeded {seeded} read watermarks from Message.is_read")
+
+    has_messages = db.execute(select(Message.id).limit(1)).first() is not None
+    if has_messages and unread_counter.is_empty(db):
+        rebuilt = rebuild_unread_counters(db)
+        logger.info(f"Built {rebuilt} unread counters from messages")
+
+    has_private_chats = (
+        db.execute(select(Chat.id).where(Chat.chat_type == "private").limit(1)).first()
+        is not None
+    )
+    has_pairs = db.execute(select(PrivateChatPair.chat_id).limit(1)).first() is not None
+    if has_private_chats and not has_pairs:
+        registered = backfill_private_chat_pairs(db)
+        logger.info(f"Registered {registered} private chat pairs")
+
+
+COMMANDS: Dict[str, Callable[[Session], int]] = {
+    "backfill-private-chat-pairs": backfill_private_chat_pairs,
+    "backfill-read-watermarks": backfill_read_watermarks,
+    "prune-change-log": prune_change_log,
+    "rebuild-search-index": rebuild_search_index,
+    "rebuild-unread-counters": rebuild_unread_counters,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        rows = COMMANDS[args.command](db)
+    logger.info(f"{args.command}: {rows} rows written")
+    print(f"{args.command}: {rows} rows written")
+
+
+if __name__ == "__main__":
+    main()
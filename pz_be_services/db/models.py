@@ -7,10 +7,15 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     Table,
+    Index,
+    func,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
-from .database import engine, Base
+from .database import engine, Base, is_sqlite
+from .search import create_search_indexes
+from .change_log import create_change_log_triggers
+from .table_versions import create_table_version_triggers
 from core.logger import get_logger
 
 logger = get_logger()
@@ -92,6 +97,28 @@ class Chat(Base):
     )
 
 
+class PrivateChatPair(Base):
+    """
+    Canonical (lower id, higher id) user pair of a private chat. The primary
+    key makes lookup a point query and rules out duplicate private chats.
+    """
+
+    __tablename__ = "private_chat_pairs"
+
+    user_low_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_high_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    chat_id = Column(
+        Integer,
+        ForeignKey("chats.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -107,6 +134,7 @@ class Message(Base):
     timestamp = Column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True
     )
+    # Deprecated: read state is tracked per participant in chat_reads
     is_read = Column(Boolean, default=False)
     is_edited = Column(Boolean, default=False)
     edited_at = Column(DateTime(timezone=True), nullable=True)
@@ -115,6 +143,117 @@ class Message(Base):
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("User", back_populates="sent_messages")
 
+    __table_args__ = (
+        # Keyset pagination of a chat's history on (timestamp, id)
+        Index("ix_messages_chat_id_timestamp_id", "chat_id", "timestamp", "id"),
+        # Covers unread counts: id range past a watermark, excluding own messages
+        Index("ix_messages_chat_id_id_sender_id", "chat_id", "id", "sender_id"),
+    )
+
+
+class ChatRead(Base):
+    """Per-participant read watermark: everything up to the id has been read"""
+
+    __tablename__ = "chat_reads"
+
+    chat_id = Column(
+        Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_read_message_id = Column(Integer, nullable=False, default=0)
+    read_at = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class ChatUnreadCounter(Base):
+    """
+    Materialized unread count per (chat, participant), maintained in the
+    same transaction as message inserts and reset on mark-read
+    """
+
+    __tablename__ = "chat_unread_counters"
+
+    chat_id = Column(
+        Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    unread_count = Column(Integer, nullable=False, default=0)
+
+
+class ChangeLog(Base):
+    """
+    Per-user feed of changes in the user's chats, written by the triggers
+    in db/change_log.py. Ids only ever grow (AUTOINCREMENT never reuses
+    one), so a client syncs by asking for everything past the last id it saw.
+    """
+
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)
+    # Message id for message changes, chat id for chat_updated, user id for
+    # membership and read changes
+    entity_id = Column(Integer, nullable=False)
+    # The new watermark of a read change
+    value = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # One range scan per sync: a user's changes past a cursor
+        Index("ix_change_log_user_id_id", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TableVersion(Base):
+    """
+    Change counter of a table whose contents are cached in memory, bumped
+    by the triggers in db/table_versions.py
+    """
+
+    __tablename__ = "table_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class TableVersionRow(Base):
+    """
+    The row each recent version of a cached table changed, so a cache can
+    reload just those rows; see db/table_versions.py
+    """
+
+    __tablename__ = "table_version_rows"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    row_id = Column(Integer, nullable=False)
+
+
+def create_missing_indexes(bind) -> None:
+    """
+    create_all skips tables that already exist, so indexes added to an
+    existing table later on are created here.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
 
 logger.debug('Creating table structures in DB')
 Base.metadata.create_all(bind=engine)
+create_missing_indexes(engine)
+if is_sqlite(engine):
+    create_search_indexes(engine)
+    create_change_log_triggers(engine)
+    create_table_version_triggers(engine)
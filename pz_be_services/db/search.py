@@ -0,0 +1,147 @@
+"""
+SQLite FTS5 full-text indexes over message content and chat titles.
+
+Both are external-content tables: the text lives only in ``messages`` /
+``chats`` and the FTS tables hold just the inverted index, kept in sync by
+triggers on insert, update and delete. Databases without FTS5 (or other
+dialects) fall back to ``LIKE`` scans in the search CRUD methods.
+"""
+
+import re
+from typing import Dict, Optional
+
+from sqlalchemy import Float, Integer, column, func, literal_column, table, text
+from sqlalchemy.engine import Connection, Engine
+
+from core.logger import get_logger
+
+logger = get_logger("search")
+
+message_search = table(
+    "message_search", column("rowid", Integer), column("rank", Float)
+)
+chat_search = table("chat_search", column("rowid", Integer), column("rank", Float))
+
+# FTS table -> (source table, indexed column)
+SEARCH_INDEXES = {
+    "message_search": ("messages", "content"),
+    "chat_search": ("chats", "title"),
+}
+
+# prefix='2 3' keeps extra indexes so short prefix queries stay index lookups
+_CREATE_TABLE = """
+CREATE VIRTUAL TABLE {fts} USING fts5(
+    {col},
+    content='{src}',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+_CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {src} BEGIN
+        INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {src} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col} ON {src} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col});
+        INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col});
+    END
+    """,
+)
+
+# A word, optionally followed by * for a prefix match
+_TERM = re.compile(r"\w+\*?")
+
+
+def has_fts5(conn: Connection) -> bool:
+    return bool(
+        conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar()
+    )
+
+
+def create_search_indexes(engine: Engine) -> None:
+    """
+    Create the FTS tables and their sync triggers if they are missing.
+    A newly created table is filled from its source table straight away.
+    """
+    with engine.begin() as conn:
+        if not has_fts5(conn):
+            logger.warning("SQLite was built without FTS5, search will use LIKE")
+            return
+
+        for fts, (src, col) in SEARCH_INDEXES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+                {"n": fts},
+            ).first()
+            if not exists:
+                conn.execute(text(_CREATE_TABLE.format(fts=fts, src=src, col=col)))
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                logger.info(f"Created full-text index {fts} over {src}.{col}")
+            for trigger in _CREATE_TRIGGERS:
+                conn.execute(text(trigger.format(fts=fts, src=src, col=col)))
+
+
+def rebuild_search_indexes(conn: Connection) -> int:
+    """
+    Rebuild every FTS index from its source table.
+    Returns the number of source rows indexed.
+    """
+    indexed = 0
+    for fts, (src, _) in SEARCH_INDEXES.items():
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        indexed += conn.execute(text(f"SELECT count(*) FROM {src}")).scalar()
+    return indexed
+
+
+_available: Dict[str, bool] = {}
+
+
+def is_search_available(conn) -> bool:
+    """
+    Whether the FTS tables exist on this connection's database. Checked
+    once per database URL.
+    """
+    if conn.dialect.name != "sqlite":
+        return False
+    url = str(conn.engine.url)
+    if url not in _available:
+        _available[url] = (
+            conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'message_search'")
+            ).first()
+            is not None
+        )
+    return _available[url]
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query where every word must match and a
+    word ending in ``*`` matches as a prefix. Each word is quoted, so FTS5
+    operators in the input are searched for as plain text.
+    """
+    terms = []
+    for term in _TERM.findall(query):
+        word = term.rstrip("*")
+        terms.append(f'"{word}"*' if term.endswith("*") else f'"{word}"')
+    return " ".join(terms) or None
+
+
+def match(fts_table, query: str):
+    """``<fts table> MATCH :query``"""
+    return literal_column(fts_table.name).op("MATCH")(query)
+
+
+def snippet(fts_table, start: str = "[", end: str = "]", tokens: int = 12):
+    """Excerpt of the matched text around the hits, with hits delimited"""
+    return func.snippet(literal_column(fts_table.name), 0, start, end, "…", tokens)
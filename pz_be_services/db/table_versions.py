@@ -0,0 +1,115 @@
+"""
+Database-wide change counters for tables whose contents are cached in
+memory, kept in ``table_versions`` by SQLite triggers.
+
+A trigger bumps a table's version in the same transaction as any write
+that changes what the cache holds, whichever worker or tool made it, and
+records the row it changed in ``table_version_rows``. A process compares
+its cached version with the stored one to know whether to reload, and
+can reload only the rows changed since its version while those are still
+kept. Like the FTS indexes this is SQLite-only; elsewhere there is no row
+and callers fall back to their own change tracking.
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import Integer, String, column, func, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+table_versions = table(
+    "table_versions", column("name", String), column("version", Integer)
+)
+table_version_rows = table(
+    "table_version_rows",
+    column("name", String),
+    column("version", Integer),
+    column("row_id", Integer),
+)
+
+USERS = "users"
+
+# Versions whose changed row is kept, per table; a cache further behind
+# reloads everything
+ROW_HISTORY = 10000
+
+_BUMP = """
+    UPDATE table_versions SET version = version + 1 WHERE name = '{name}';
+    INSERT INTO table_version_rows(name, version, row_id)
+    SELECT name, version, {row}.id FROM table_versions WHERE name = '{name}';
+    DELETE FROM table_version_rows WHERE name = '{name}' AND version <=
+        (SELECT version FROM table_versions WHERE name = '{name}') - {history};
+"""
+
+# The usernames list and the user search index hold usernames, names,
+# emails and the active flag
+_TRIGGERS = {
+    "table_versions_users_ai": f"""
+        AFTER INSERT ON users
+        BEGIN {_BUMP.format(name=USERS, row="new", history=ROW_HISTORY)} END
+    """,
+    "table_versions_users_ad": f"""
+        AFTER DELETE ON users
+        BEGIN {_BUMP.format(name=USERS, row="old", history=ROW_HISTORY)} END
+    """,
+    "table_versions_users_au": f"""
+        AFTER UPDATE OF username, full_name, email, is_active ON users
+        WHEN new.username IS NOT old.username
+            OR new.full_name IS NOT old.full_name
+            OR new.email IS NOT old.email
+            OR new.is_active IS NOT old.is_active
+        BEGIN {_BUMP.format(name=USERS, row="new", history=ROW_HISTORY)} END
+    """,
+}
+
+
+def create_table_version_triggers(engine: Engine) -> None:
+    """Seed the version rows and (re)create their triggers."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO table_versions(name, version) VALUES (:name, 0)"
+            ),
+            {"name": USERS},
+        )
+        # Replaced rather than kept, so a database made by an older version
+        # gets the current trigger bodies
+        for name, body in _TRIGGERS.items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+
+
+def get_table_version(db: Session, name: str) -> Optional[int]:
+    """The stored version of a table, or None where versions aren't kept."""
+    return db.execute(
+        select(table_versions.c.version).where(table_versions.c.name == name)
+    ).scalar_one_or_none()
+
+
+def get_changed_rows(
+    db: Session, name: str, after: int, up_to: int
+) -> Optional[List[int]]:
+    """
+    Ids of the rows of a table changed by versions after ``after`` up to
+    ``up_to``, or None if those versions are no longer all kept.
+    """
+    if up_to <= after:
+        return []
+    oldest = db.execute(
+        select(func.min(table_version_rows.c.version)).where(
+            table_version_rows.c.name == name
+        )
+    ).scalar()
+    if oldest is None or oldest > after + 1:
+        return None
+    return list(
+        db.execute(
+            select(table_version_rows.c.row_id)
+            .where(
+                table_version_rows.c.name == name,
+                table_version_rows.c.version > after,
+                table_version_rows.c.version <= up_to,
+            )
+            .distinct()
+        ).scalars()
+    )
@@ -0,0 +1,95 @@
+"""
+In-process notifications of committed changes to ``users`` rows.
+
+ORM flushes record a snapshot of every inserted, updated or deleted User on
+the session; once the transaction commits, each subscriber is called with
+the list of changes, and ``users_version()`` moves forward. Rolled-back
+changes are discarded. Writes that bypass the ORM (bulk UPDATE statements,
+other processes) are not seen; caches shared between workers check the
+stored version in ``db.table_versions`` instead.
+"""
+
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.logger import get_logger
+from .models import User
+
+logger = get_logger("user_changes")
+
+_PENDING_KEY = "pending_user_changes"
+
+
+class UserChange(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    full_name: Optional[str]
+    email: Optional[str]
+    is_active: bool
+    # True when the row was deleted
+    deleted: bool = False
+
+
+UserChangeListener = Callable[[List[UserChange]], None]
+
+_listeners: List[UserChangeListener] = []
+_version = 0
+
+
+def on_users_changed(listener: UserChangeListener) -> UserChangeListener:
+    """Register ``listener`` to be called after each commit that changed users"""
+    _listeners.append(listener)
+    return listener
+
+
+def users_version() -> int:
+    """Number of commits in this process that changed users"""
+    return _version
+
+
+def _snapshot(user: User, deleted: bool = False) -> UserChange:
+    return UserChange(
+        user_id=user.id,
+        username=user.username,
+        full_name=user.full_name,
+        email=user.email,
+        is_active=bool(user.is_active),
+        deleted=deleted,
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _record_user_changes(session: Session, flush_context) -> None:
+    # session.new / dirty / deleted still hold the pre-flush state here
+    changes = [_snapshot(obj) for obj in session.new if isinstance(obj, User)]
+    changes += [
+        _snapshot(obj)
+        for obj in session.dirty
+        if isinstance(obj, User) and session.is_modified(obj)
+    ]
+    changes += [
+        _snapshot(obj, deleted=True) for obj in session.deleted if isinstance(obj, User)
+    ]
+    if changes:
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_user_changes(session: Session) -> None:
+    global _version
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    _version += 1
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"User change listener {listener!r} failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
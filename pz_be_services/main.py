@@ -1,19 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routers.v1 import health_router
 from routers.v1 import user_router
 from routers.v1 import chat_router
 from routers.v1 import ai_router
+from routers.v1 import sync_router
 from core.logger import get_logger
 from core.config import EnvironmentVariables
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from db.database import async_engine, SessionLocal
+from db.maintenance import run_startup_migrations
+from services.user_auth_services.user_search import user_search_index
+from services.chat_services.message_writer import message_writer
+from services.chat_services.connection_manager import connection_manager
 
 
 logger = get_logger(__name__)
 logger.info("app starting")
 
 
-app = FastAPI(title="ProjectX")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with SessionLocal() as db:
+        run_startup_migrations(db)
+        user_search_index.rebuild_from_db(db)
+    await message_writer.start()
+    await connection_manager.start()
+    yield
+    logger.info("app shutting down")
+    await connection_manager.stop()
+    await message_writer.stop()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="ProjectX", lifespan=lifespan)
 
 app.add_middleware(
     SessionMiddleware, secret_key=EnvironmentVariables.MIDDLEWARE_SECRET_KEY
@@ -31,3 +52,4 @@ app.include_router(health_router, prefix="/v1")
 app.include_router(user_router, prefix="/v1/user")
 app.include_router(chat_router, prefix="/v1/chat")
 app.include_router(ai_router, prefix="/v1/ai")
+app.include_router(sync_router, prefix="/v1/sync")
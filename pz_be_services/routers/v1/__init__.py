@@ -2,3 +2,4 @@ from .health_router import router as health_router
 from .user_router import router as user_router
 from .chat_router import router as chat_router
 from .ai_router import router as ai_router
+from .sync_router import router as sync_router
@@ -4,28 +4,43 @@ from fastapi import (
     status,
     Depends,
     Query,
+    Header,
     WebSocket,
     WebSocketDisconnect,
 )
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from services.chat_services.private_chat import PrivateChatService
 from services.chat_services.message_service import MessageService
-from services.chat_services.connection_manager import ConnectionManager
-from db.database import get_db
+from services.chat_services.inbox_service import InboxService
+from services.chat_services.search_service import SearchService
+from services.chat_services.connection_manager import connection_manager
+from services.chat_services.event_stream import EventStream
+from services.chat_services.ws_protocol import FrameError, negotiate_protocol
+from db.database import get_db, AsyncSessionLocal
 from schemas.chat import (
     PrivateChatRequest,
     ChatWithParticipants,
     PrivateChatListResponse,
+    UnreadCountsResponse,
+    InboxResponse,
+    ChatSearchResponse,
 )
-from schemas.message import MessageListResponse, MessageSendRequest, MessageWithSender
-from core.auth import get_current_user
+from schemas.message import (
+    MessageListResponse,
+    MessageSendRequest,
+    MessageWithSender,
+    MessageSearchResponse,
+)
+from core.auth import get_current_user, get_websocket_user
 from core.logger import get_logger
 from db.crud.crud_user import user as crud_user
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from datetime import datetime
 
 router = APIRouter()
 logger = get_logger("chat")
-connection_manager = ConnectionManager()
 
 
 @router.post(
@@ -155,15 +170,32 @@ def get_private_chat_by_id(
 )
 def get_chat_messages(
     chat_id: int,
-    skip: int = Query(0, ge=0, description="Number of messages to skip"),
+    skip: int = Query(
+        0,
+        ge=0,
+        description="Number of messages to skip (deprecated, ignored with a cursor)",
+    ),
     limit: int = Query(
         50, ge=1, le=100, description="Maximum number of messages to return"
     ),
     order: str = Query(
         "asc",
-        regex="^(asc|desc)$",
+        pattern="^(asc|desc)$",
         description="Order of messages: 'asc' (oldest first) or 'desc' (newest first)",
     ),
+    before: Optional[str] = Query(
+        None, description="Cursor: return messages older than this one"
+    ),
+    after: Optional[str] = Query(
+        None, description="Cursor: return messages newer than this one"
+    ),
+    around: Optional[int] = Query(
+        None, description="Message id: return `limit` messages on each side of it"
+    ),
+    at: Optional[datetime] = Query(
+        None,
+        description="Time (ISO 8601, UTC if no offset): return `limit` messages on each side of it",
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -171,6 +203,16 @@ def get_chat_messages(
     Get messages from a chat.
     User must be a participant in the chat.
     Requires authentication.
+
+    Paginate with the returned cursors: pass `next_cursor` back as the same
+    parameter you paged with (`before` when moving to older messages,
+    `after` when moving to newer ones; without a cursor, `order=desc` moves
+    to older and `order=asc` to newer), and `prev_cursor` as the other one.
+
+    To jump into history, pass `around` (a message id) or `at` (a time)
+    instead of a cursor. The window holds `limit` messages before and after
+    the target (the message itself, or the first one at or after the time,
+    returned as `anchor_id`), with cursors to page on in both directions.
     """
     try:
         current_user_id = int(current_user.get("sub"))
@@ -185,6 +227,10 @@ def get_chat_messages(
             skip=skip,
             limit=limit,
             order=order,
+            before=before,
+            after=after,
+            around=around,
+            at=at,
         )
 
         logger.info(
@@ -282,6 +328,176 @@ def get_unread_message_count(
         )
 
 
+@router.get(
+    "/unread-counts",
+    response_model=UnreadCountsResponse,
+    status_code=status.HTTP_200_OK,
+)
+def get_unread_message_counts(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the unread message counts of all chats of the authenticated user
+    in one call.
+    Requires authentication.
+    """
+    try:
+        current_user_id = int(current_user.get("sub"))
+        logger.info(
+            f"User {current_user.get('username')} requesting unread counts for all chats"
+        )
+
+        message_service = MessageService(db)
+        counts_response = message_service.get_unread_counts(user_id=current_user_id)
+
+        logger.info(
+            f"User {current_user.get('username')} has {counts_response.total_unread} unread messages"
+        )
+        return counts_response
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error getting unread counts: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while getting unread message counts",
+        )
+
+
+@router.get("/inbox", response_model=InboxResponse, status_code=status.HTTP_200_OK)
+def get_inbox(
+    limit: int = Query(
+        50, ge=1, le=100, description="Maximum number of chats to return"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from a previous page's next_cursor"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the authenticated user's chats of every type, most recently active
+    first, with participant count, unread count and last message preview,
+    in a single call. Page with ``next_cursor``.
+    Requires authentication.
+    """
+    try:
+        current_user_id = int(current_user.get("sub"))
+        logger.info(f"User {current_user.get('username')} requesting inbox")
+
+        inbox_service = InboxService(db)
+        inbox_response = inbox_service.get_inbox(
+            user_id=current_user_id, limit=limit, before=before
+        )
+
+        logger.info(
+            f"Successfully returned {len(inbox_response.chats)} inbox chats for user {current_user.get('username')}"
+        )
+        return inbox_response
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error retrieving inbox: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while retrieving inbox",
+        )
+
+
+@router.get(
+    "/messages/search",
+    response_model=MessageSearchResponse,
+    status_code=status.HTTP_200_OK,
+)
+def search_messages(
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=200,
+        description="Words to search for; end a word with * to match it as a prefix",
+    ),
+    chat_id: Optional[int] = Query(
+        None, description="Only search this chat (default: all of the user's chats)"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    cursor: Optional[str] = Query(
+        None, description="Cursor from a previous page's next_cursor"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Full-text search over the messages of the authenticated user's chats,
+    best match first.
+    Requires authentication.
+    """
+    try:
+        current_user_id = int(current_user.get("sub"))
+        logger.info(f"User {current_user.get('username')} searching messages")
+
+        search_service = SearchService(db)
+        return search_service.search_messages(
+            user_id=current_user_id,
+            query=q,
+            chat_id=chat_id,
+            limit=limit,
+            cursor=cursor,
+        )
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error searching messages: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while searching messages",
+        )
+
+
+@router.get(
+    "/search", response_model=ChatSearchResponse, status_code=status.HTTP_200_OK
+)
+def search_chats(
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=200,
+        description="Words to search for; end a word with * to match it as a prefix",
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    cursor: Optional[str] = Query(
+        None, description="Cursor from a previous page's next_cursor"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Full-text search over the titles of the authenticated user's chats,
+    best match first.
+    Requires authentication.
+    """
+    try:
+        current_user_id = int(current_user.get("sub"))
+        logger.info(f"User {current_user.get('username')} searching chats")
+
+        search_service = SearchService(db)
+        return search_service.search_chats(
+            user_id=current_user_id, query=q, limit=limit, cursor=cursor
+        )
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error searching chats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while searching chats",
+        )
+
+
 @router.post(
     "/{chat_id}/messages",
     response_model=MessageWithSender,
@@ -291,7 +507,6 @@ async def send_message_to_chat(
     chat_id: int,
     message_request: MessageSendRequest,
     current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db),
 ):
     """
     Send a message to a chat.
@@ -304,7 +519,7 @@ async def send_message_to_chat(
             f"User {current_user.get('username')} sending message to chat {chat_id}"
         )
 
-        message_service = MessageService(db, connection_manager)
+        message_service = MessageService(connection_manager=connection_manager)
         message_response = await message_service.send_message(
             chat_id=chat_id, user_id=current_user_id, message_request=message_request
         )
@@ -324,66 +539,232 @@ async def send_message_to_chat(
         )
 
 
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_events(
+    last_event_id: Optional[str] = Header(
+        None, description="id of the last event received, to resume after it"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Stream the events the WebSocket pushes (messages, typing, read,
+    notices, catch-up) as Server-Sent Events, for clients that can't keep
+    a WebSocket open. Reconnecting with ``Last-Event-ID`` first delivers
+    the messages sent since that event as one ``catchup`` event.
+    Requires authentication.
+    """
+    current_user_id = int(current_user.get("sub"))
+    username = current_user.get("username")
+
+    resume_after = None
+    if last_event_id:
+        try:
+            resume_after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Last-Event-ID must be a message id",
+            )
+
+    stream = EventStream()
+    connection = await connection_manager.connect_stream(
+        stream, current_user_id, username, last_event_id=resume_after
+    )
+    logger.info(f"User {username} (ID: {current_user_id}) opened an event stream")
+
+    async def body():
+        try:
+            async for chunk in stream.chunks():
+                yield chunk
+        finally:
+            # Client gone (or evicted): drop it from the registry
+            connection_manager.unregister(connection)
+            logger.info(
+                f"User {username} (ID: {current_user_id}) closed an event stream"
+            )
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx-style proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.get("/ws/stats", status_code=status.HTTP_200_OK)
-def get_websocket_stats():
+async def get_websocket_stats(
+    detail: bool = Query(
+        False, description="Include every connected user's connections and queues"
+    ),
+):
     """
     Get current WebSocket connection statistics for debugging.
     """
-    return connection_manager.get_connection_stats()
+    return connection_manager.get_connection_stats(detail=detail)
 
 
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(
-    websocket: WebSocket, user_id: int, db: Session = Depends(get_db)
+    websocket: WebSocket,
+    user_id: int,
+    last_event_id: Optional[int] = Query(
+        None, description="id of the last message event received, to resume after it"
+    ),
 ):
-    # Get username from user_id using existing design
-    username = crud_user.get_username_by_id(db, user_id=user_id)
+    # Same bearer check as the HTTP endpoints; the token must be user_id's
+    try:
+        current_user = get_websocket_user(websocket)
+    except ValueError as e:
+        logger.warning(f"Rejected WebSocket for user {user_id}: {e}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+    if current_user.get("sub") != str(user_id):
+        logger.warning(
+            f"Rejected WebSocket for user {user_id}: token is for user {current_user.get('sub')}"
+        )
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason="Token does not match user_id",
+        )
+        return
+
+    # Get username from user_id using existing design. A short-lived async
+    # session keeps the lookup off the event loop without pinning a pooled
+    # connection for the lifetime of the socket.
+    async with AsyncSessionLocal() as db:
+        username = await crud_user.get_username_by_id_async(db, user_id=user_id)
     if not username:
         await websocket.close(
             code=status.WS_1008_POLICY_VIOLATION, reason="Invalid user_id"
         )
         return
 
-    await connection_manager.connect(websocket, user_id)
-    logger.info(f"User {username} (ID: {user_id}) connected to WebSocket")
+    protocol = negotiate_protocol(websocket.scope.get("subprotocols", []))
+    connection = await connection_manager.connect(
+        websocket, user_id, username, protocol, last_event_id=last_event_id
+    )
+    logger.info(
+        f"User {username} (ID: {user_id}) connected to WebSocket ({protocol.name or 'legacy'} protocol)"
+    )
 
     chat_id = None
     other_user_id = None
 
     try:
         while True:
-            data = await websocket.receive_text()
-            message = data.split("_")
-            received_user_id = int(message[0])
-            chat_id = int(message[1])
-            other_user_id = int(message[2])
-            message_content = message[3]
-
-            # Validate that the received user_id matches the path parameter
-            if received_user_id != user_id:
-                logger.warning(
-                    f"User ID mismatch: path={user_id}, message={received_user_id}"
-                )
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            connection.touch()
+            try:
+                events = protocol.decode(frame)
+            except FrameError as e:
+                logger.warning(f"Invalid frame from user {username} ({user_id}): {e}")
+                connection.enqueue({"type": "error", "detail": str(e)})
                 continue
 
-            print(
-                f"User {username} ({user_id}), Chat {chat_id}, Message: {message_content}"
-            )
-            logger.info(f"User {username} connected to chat {chat_id}")
-            logger.info(
-                f"Received message in chat {chat_id} from user {username} ({user_id}): {message_content}"
-            )
-
-            # Broadcast message with username instead of user_id
-            message_to_broadcast = f"{username}: {message_content}"
-            await connection_manager.broadcast(
-                message_to_broadcast, chat_id, user_id, other_user_id
-            )   
+            for event in events:
+                if event["type"] == "ping":
+                    connection.enqueue({"type": "pong"})
+                    continue
+                if event["type"] == "pong":
+                    continue
+
+                # Validate that the sender in the frame (legacy protocol
+                # only) matches the path parameter
+                received_user_id = event.get("from", user_id)
+                if received_user_id != user_id:
+                    logger.warning(
+                        f"User ID mismatch: path={user_id}, message={received_user_id}"
+                    )
+                    continue
+
+                chat_id = event["chat_id"]
+                other_user_id = event.get("to", other_user_id)
+
+                if event["type"] == "message":
+                    logger.info(
+                        f"Received message in chat {chat_id} from user {username} ({user_id}): {event['content']}"
+                    )
+                    # Same checks and write path as POST /{chat_id}/messages
+                    try:
+                        message_request = MessageSendRequest(
+                            content=event["content"],
+                            message_type=event.get("message_type", "text"),
+                        )
+                        message_service = MessageService(
+                            connection_manager=connection_manager
+                        )
+                        sent = await message_service.send_message(
+                            chat_id=chat_id,
+                            user_id=user_id,
+                            message_request=message_request,
+                            origin_connection=connection.id,
+                        )
+                    except (HTTPException, ValidationError) as e:
+                        detail = (
+                            e.detail
+                            if isinstance(e, HTTPException)
+                            else e.errors()[0]["msg"]
+                        )
+                        logger.warning(
+                            f"Rejected websocket message in chat {chat_id} from user {username} ({user_id}): {detail}"
+                        )
+                        connection.enqueue(
+                            {
+                                "type": "error",
+                                "id": event.get("id"),
+                                "chat_id": chat_id,
+                                "detail": detail,
+                            }
+                        )
+                        continue
+
+                    # send_message has pushed it to the chat's participants;
+                    # the sender is acked only once the message is committed
+                    connection.enqueue(
+                        {
+                            "type": "ack",
+                            "id": event.get("id"),
+                            "chat_id": chat_id,
+                            "message_id": sent.id,
+                            "timestamp": sent.timestamp.isoformat(),
+                        }
+                    )
+                else:
+                    # typing / read: checked like a message, then relayed to
+                    # the participant in "to"
+                    try:
+                        message_service = MessageService(
+                            connection_manager=connection_manager
+                        )
+                        await message_service.send_chat_event(
+                            chat_id=chat_id,
+                            user_id=user_id,
+                            event_type=event["type"],
+                            to=event["to"],
+                            message_id=event.get("message_id"),
+                        )
+                    except HTTPException as e:
+                        logger.warning(
+                            f"Rejected websocket {event['type']} event in chat {chat_id} from user {username} ({user_id}): {e.detail}"
+                        )
+                        connection.enqueue(
+                            {
+                                "type": "error",
+                                "id": event.get("id"),
+                                "chat_id": chat_id,
+                                "detail": e.detail,
+                            }
+                        )
 
     except WebSocketDisconnect:
+        connection_manager.disconnect(websocket, user_id)
         if user_id and chat_id:
             logger.info(f"User {username} ({user_id}) disconnected from chat {chat_id}")
-            connection_manager.disconnect(websocket, user_id)
             # Notify other participants with username
             if other_user_id:
                 await connection_manager.broadcast(
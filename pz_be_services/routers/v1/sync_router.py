@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from sqlalchemy.orm import Session
+from services.chat_services.sync_service import SyncService
+from db.database import get_db
+from schemas.sync import SyncResponse
+from core.auth import get_current_user
+from core.logger import get_logger
+from typing import Dict, Any, Optional
+
+router = APIRouter()
+logger = get_logger("sync")
+
+
+@router.get("", response_model=SyncResponse, status_code=status.HTTP_200_OK)
+def sync_changes(
+    since: Optional[str] = Query(
+        None,
+        description="next_cursor of the previous sync; omit to get the current cursor",
+    ),
+    limit: int = Query(
+        500, ge=1, le=1000, description="Maximum number of changes to read"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get every change in the authenticated user's chats since a cursor:
+    new and edited messages, deleted message ids, members added or
+    removed, read watermarks and chat updates, oldest first.
+    If ``has_more`` is true, sync again with ``next_cursor`` straight away;
+    if ``reset`` is true, refetch chats and messages before syncing on.
+    Requires authentication.
+    """
+    try:
+        current_user_id = int(current_user.get("sub"))
+
+        sync_service = SyncService(db)
+        return sync_service.get_changes(
+            user_id=current_user_id, since=since, limit=limit
+        )
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error syncing changes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while syncing changes",
+        )
@@ -1,20 +1,26 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header, Response
 from sqlalchemy.orm import Session
 from services.user_auth_services.user_register import UserRegisterService
 from services.user_auth_services.user_list import UserListService
 from db.database import get_db
 from core.password import verify_password
-from schemas.user import UserLogin, UserPassword, UserCreate, UsernamesListResponse
+from schemas.user import (
+    UserLogin,
+    UserPassword,
+    UserCreate,
+    UsernamesListResponse,
+    UserSearchResponse,
+)
 from core.auth import create_access_token, get_current_user
 from db.crud.crud_password import get_password_by_user_id
 from core.logger import get_logger
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from core.config import EnvironmentVariables
 import httpx
 from urllib.parse import urljoin
 import os
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 load_dotenv()
 
@@ -302,20 +308,46 @@ async def google_callback(code: str = None, db: Session = Depends(get_db)):
     "/usernames", response_model=UsernamesListResponse, status_code=status.HTTP_200_OK
 )
 def get_all_usernames(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
-    Get a list of all usernames from active users.
+    Get a list of all usernames from active users, in alphabetical order.
+    Pass ``limit`` (and the returned ``next_cursor``) to page through them;
+    without it the whole list is streamed. Responses carry an ``ETag``, and
+    a matching ``If-None-Match`` gets a 304.
     Requires authentication.
     """
     try:
         logger.info(f"User {current_user.get('username')} requested usernames list")
 
         user_list_service = UserListService(db)
-        usernames_response = user_list_service.get_all_usernames()
+        snapshot = user_list_service.get_usernames_snapshot()
+        cache_headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+
+        if user_list_service.etag_matches(if_none_match, snapshot.etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers
+            )
+
+        if limit is None and cursor is None:
+            logger.info(f"Streaming {len(snapshot.usernames)} usernames")
+            return StreamingResponse(
+                user_list_service.stream_usernames(snapshot),
+                media_type="application/json",
+                headers=cache_headers,
+            )
+
+        usernames_response = user_list_service.get_usernames_page(
+            snapshot, limit=limit or 100, cursor=cursor
+        )
+        response.headers.update(cache_headers)
 
-        logger.info(f"Successfully returned {usernames_response.total_count} usernames")
+        logger.info(f"Successfully returned {len(usernames_response.usernames)} usernames")
         return usernames_response
 
     except HTTPException as e:
@@ -326,3 +358,31 @@ def get_all_usernames(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error while retrieving usernames",
         )
+
+
+@router.get(
+    "/search", response_model=UserSearchResponse, status_code=status.HTTP_200_OK
+)
+def search_users(
+    q: str = Query(..., max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Autocomplete active users whose username, full name or email starts
+    with each word of ``q``, best match first.
+    Requires authentication.
+    """
+    try:
+        user_list_service = UserListService(db)
+        return user_list_service.search_users(q, limit=limit)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error searching users: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while searching users",
+        )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from .user import UserInChat
 from .message import MessageResponse
@@ -83,3 +83,23 @@ class PrivateChatRequest(BaseModel):
 class PrivateChatListResponse(BaseModel):
     chats: List[ChatWithParticipants]
     total_count: int
+
+
+# Schema for the unread counts of all of a user's chats
+class UnreadCountsResponse(BaseModel):
+    unread_counts: Dict[int, int]
+    total_unread: int
+
+
+# Schema for the inbox: one cursor page of chat list items
+class InboxResponse(BaseModel):
+    chats: List[ChatListItem]
+    has_more: bool = False
+    next_cursor: Optional[str] = None
+
+
+# Schema for chat search results, best match first
+class ChatSearchResponse(BaseModel):
+    chats: List[ChatResponse]
+    has_more: bool = False
+    next_cursor: Optional[str] = None
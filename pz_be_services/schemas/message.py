@@ -94,5 +94,28 @@ class MessageSearchParams(BaseModel):
 # Schema for message list response
 class MessageListResponse(BaseModel):
     messages: List[MessageWithSender]
-    total_count: int
+    # Only counted for the first page; None when paging with a cursor
+    total_count: Optional[int] = None
     has_more: bool
+    # Keep paging in the same direction (pass back as the same before/after)
+    next_cursor: Optional[str] = None
+    # Page back the opposite way
+    prev_cursor: Optional[str] = None
+    # The message an around/at window is on
+    anchor_id: Optional[int] = None
+
+
+# Schema for one full-text search hit
+class MessageSearchHit(BaseModel):
+    message: MessageWithSender
+    # Excerpt around the matched words, which are wrapped in [ ]
+    snippet: Optional[str] = None
+    # BM25 score, lower is a better match
+    rank: float = 0.0
+
+
+# Schema for message search results, best match first
+class MessageSearchResponse(BaseModel):
+    results: List[MessageSearchHit]
+    has_more: bool = False
+    next_cursor: Optional[str] = None
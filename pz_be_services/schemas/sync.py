@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from .message import MessageWithSender
+
+
+# Schema for one change in a sync response
+class SyncChange(BaseModel):
+    # message, message_edited, message_deleted, member_added,
+    # member_removed, read or chat_updated
+    kind: str
+    chat_id: int
+    # Current state of a new or edited message
+    message: Optional[MessageWithSender] = None
+    # Id of a deleted message
+    message_id: Optional[int] = None
+    # Member added or removed, or the reader of a read change
+    user_id: Optional[int] = None
+    last_read_message_id: Optional[int] = None
+
+
+# Schema for a sync response: the changes after a cursor, oldest first
+class SyncResponse(BaseModel):
+    changes: List[SyncChange]
+    # Pass as ``since`` on the next sync
+    next_cursor: str
+    # More changes are waiting; sync again straight away
+    has_more: bool = False
+    # The cursor predates the retained changes: refetch chats and
+    # messages, then sync from next_cursor
+    reset: bool = False
@@ -72,3 +72,10 @@ class UserLogin(BaseModel):
 class UsernamesListResponse(BaseModel):
     usernames: List[str]
     total_count: int
+    has_more: bool = False
+    next_cursor: Optional[str] = None
+
+
+# Schema for user autocomplete response
+class UserSearchResponse(BaseModel):
+    users: List[UserInChat]
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from db.crud.crud_chat import ChatAccess
+
+
+def require_participant(access: Optional[ChatAccess]) -> ChatAccess:
+    """
+    Authorization prelude of the chat endpoints: the chat must exist and the
+    user must be one of its participants. Takes the result of
+    ``chat.get_access`` / ``chat.get_access_async``.
+    """
+    if access is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+        )
+
+    if not access.is_participant:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not a participant in this chat",
+        )
+
+    return access
@@ -1,158 +1,705 @@
-from fastapi import WebSocket
-from typing import Dict, List, Optional
-from db.database import get_db
-from db.models import Chat
-from db.crud.crud_user import user as crud_user
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from fastapi import WebSocket, status
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import AsyncSessionLocal
+from db.crud.crud_message import message as crud_message
+from db.models import Message
+from core.config import EnvironmentVariables
 from core.logger import get_logger
+from services.chat_services.event_stream import EventStream
+from services.chat_services.offline_queue import OfflineQueue, PendingCatchup
+from services.chat_services.pubsub import PubSub, create_pubsub
+from services.chat_services.ws_protocol import (
+    Event,
+    LEGACY_PROTOCOL,
+    SSE_PROTOCOL,
+    WireProtocol,
+    message_event,
+)
 
 logger = get_logger("websocket")
 
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Published alongside an event: the id of a connection not to deliver it to
+_EXCLUDE_KEY = "_exclude_connection"
+
+# Connection ids are this worker's random prefix plus a counter, which is
+# unique across workers and much cheaper than a uuid per connection
+_WORKER_PREFIX = uuid.uuid4().hex[:16]
+_connection_ids = itertools.count(1)
+
+
+class ConnectionTotals:
+    """
+    Counters over all of a manager's connections, updated as they change
+    so that reading them is O(1).
+    """
+
+    __slots__ = (
+        "connections",
+        "users",
+        "queued",
+        "sent",
+        "frames",
+        "dropped",
+        "coalesced",
+        "evicted",
+        "reaped",
+        "over_limit",
+    )
 
-class ConnectionManager:
     def __init__(self):
-        # Store connections by user_id for direct messaging
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+
+class ClientConnection:
+    """
+    One open websocket and the identity of the user behind it, resolved
+    once at connect so that sending never needs the database.
+
+    Outgoing events wait in a bounded queue drained by the connection's
+    own writer task, so a slow client only ever delays itself. The writer
+    takes up to ``max_batch`` queued events at a time and sends them in as
+    few frames as the connection's wire ``protocol`` allows. When the queue
+    is full, ``overflow_policy`` decides what gives: the oldest queued event
+    ("drop_oldest"), a queued event with the same coalesce key ("coalesce",
+    falling back to the oldest), or the connection itself ("disconnect").
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    The queue and the writer task only exist while there is something to
+    send, so an idle connection costs little more than this record.
+    """
+
+    __slots__ = (
+        "id",
+        "websocket",
+        "user_id",
+        "username",
+        "protocol",
+        "connected_at",
+        "max_queue_size",
+        "overflow_policy",
+        "send_timeout",
+        "max_batch",
+        "sent",
+        "frames",
+        "dropped",
+        "coalesced",
+        "max_depth",
+        "closed",
+        "last_seen",
+        "last_ping",
+        "totals",
+        "_queue",
+        "_writer",
+        "_on_evict",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        username: str,
+        protocol: WireProtocol = LEGACY_PROTOCOL,
+        max_queue_size: int = EnvironmentVariables.WS_SEND_QUEUE_SIZE,
+        overflow_policy: str = EnvironmentVariables.WS_OVERFLOW_POLICY,
+        send_timeout: float = EnvironmentVariables.WS_SEND_TIMEOUT_SECONDS,
+        max_batch: int = EnvironmentVariables.WS_MAX_BATCH_EVENTS,
+        totals: Optional[ConnectionTotals] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown websocket overflow policy: {overflow_policy}")
+        # Unique across workers, so a published event can skip one socket
+        self.id = f"{_WORKER_PREFIX}-{next(_connection_ids):x}"
+        self.websocket = websocket
+        self.user_id = user_id
+        self.username = username
+        self.protocol = protocol
+        # Unix time
+        self.connected_at = time.time()
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_batch = max(1, max_batch)
+        # Events sent, and the frames they were sent in
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.closed = False
+        # time.monotonic() of the last frame from the client and of the last
+        # heartbeat ping sent to it
+        self.last_seen = time.monotonic()
+        self.last_ping = 0.0
+        # The manager's counters, kept in step with this connection's
+        self.totals = totals or ConnectionTotals()
+        # (coalesce_key, event) pairs, oldest first; None while empty
+        self._queue: Optional[Deque[Tuple[Optional[str], Event]]] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._on_evict: Optional[Callable[["ClientConnection"], None]] = None
+
+    def start(self, on_evict: Callable[["ClientConnection"], None]):
         """
-        Connect a websocket for a specific user.
+        Register ``on_evict``, called if the connection is dropped from the
+        server side. The writer task starts with the first queued event.
         """
-        await websocket.accept()
+        self._on_evict = on_evict
 
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-
-        print(
-            f"User {user_id} connected. Total connections for this user: {len(self.active_connections[user_id])}"
-        )
+    def stop(self):
+        """
+        Stop the writer task; anything still queued is discarded.
+        """
+        self.closed = True
+        if self._queue:
+            self.totals.queued -= len(self._queue)
+            self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
+    def enqueue(self, event: Event, coalesce_key: Optional[str] = None) -> bool:
         """
-        Disconnect a websocket for a specific user.
+        Queue an event for sending without waiting on the socket. Returns
+        False if the event (or the connection) was dropped.
         """
-        if (
-            user_id in self.active_connections
-            and websocket in self.active_connections[user_id]
-        ):
-            self.active_connections[user_id].remove(websocket)
-            print(
-                f"User {user_id} disconnected. Remaining connections: {len(self.active_connections[user_id])}"
-            )
+        if self.closed:
+            return False
+        queue = self._queue
+        if queue is None:
+            queue = self._queue = deque()
 
-            # Clean up empty connection lists
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+        if coalesce_key is not None and self.overflow_policy == "coalesce":
+            # A newer event with the same key supersedes the queued one
+            for i, (key, _) in enumerate(queue):
+                if key == coalesce_key:
+                    del queue[i]
+                    self.coalesced += 1
+                    self.totals.coalesced += 1
+                    self.totals.queued -= 1
+                    break
 
-    async def broadcast(
-        self, message: str, chat_id: int, sender_user_id: int, other_user_id: int = None
-    ):
+        if len(queue) >= self.max_queue_size:
+            if self.overflow_policy == "disconnect":
+                self.evict("send queue full")
+                return False
+            queue.popleft()
+            self.dropped += 1
+            self.totals.dropped += 1
+            self.totals.queued -= 1
+
+        queue.append((coalesce_key, event))
+        self.totals.queued += 1
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        return True
+
+    def touch(self):
         """
-        Broadcast message to other participants in a chat.
-        For private chats, finds the other user and sends directly to them.
+        Record that the client is alive (it just sent a frame).
         """
-        # Get usernames for logging
-        sender_username = self.get_username_by_id(sender_user_id)
+        self.last_seen = time.monotonic()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue) if self._queue else 0
 
-        if other_user_id and other_user_id in self.active_connections:
-            other_username = self.get_username_by_id(other_user_id)
-            # Send message to all connections of the other user
-            for connection in self.active_connections[other_user_id]:
+    async def _write_loop(self):
+        try:
+            while self._queue and not self.closed:
+                # Everything queued while the last frame was going out (up
+                # to max_batch events) is sent together
+                count = min(len(self._queue), self.max_batch)
+                events = [self._queue.popleft()[1] for _ in range(count)]
+                self.totals.queued -= count
                 try:
-                    await connection.send_text(message)
-                    logger.info(
-                        f"Message sent from {sender_username} ({sender_user_id}) to {other_username} ({other_user_id}): {message}"
-                    )
+                    for frame in self.protocol.encode(events):
+                        async with asyncio.timeout(self.send_timeout):
+                            await self._send(frame)
+                        self.frames += 1
+                        self.totals.frames += 1
+                    self.sent += count
+                    self.totals.sent += count
+                except asyncio.TimeoutError:
+                    self.evict(f"send stalled for {self.send_timeout:g}s")
                 except Exception as e:
                     logger.error(
-                        f"Error sending message to user {other_username} ({other_user_id}): {e}"
+                        f"Error sending message to user {self.username} ({self.user_id}): {e}"
                     )
-        else:
-            logger.warning(
-                f"Other user {other_user_id} not found in active connections for chat {chat_id}"
-            )
+                    self.evict("send failed")
+        finally:
+            # Drained: release the queue until there is something to send
+            self._writer = None
+            if not self._queue:
+                self._queue = None
+
+    def _send(self, frame):
+        if isinstance(frame, bytes):
+            return self.websocket.send_bytes(frame)
+        return self.websocket.send_text(frame)
 
-    async def send_to_user(self, message: str, user_id: int):
+    def evict(self, reason: str, code: int = status.WS_1013_TRY_AGAIN_LATER):
         """
-        Send a message directly to a specific user (all their connections).
+        Drop the connection from the server side: stop the writer, tell the
+        manager and close the socket with ``code``.
         """
-        username = self.get_username_by_id(user_id)
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message)
-                    logger.info(
-                        f"Direct message sent to {username} ({user_id}): {message}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error sending message to user {username} ({user_id}): {e}"
-                    )
-        else:
-            logger.warning(
-                f"User {username} ({user_id}) not found in active connections"
+        if self.closed:
+            return
+        logger.warning(f"Disconnecting {self.username} ({self.user_id}): {reason}")
+        self.dropped += self.queue_depth
+        self.totals.dropped += self.queue_depth
+        self.stop()
+        if self._on_evict is not None:
+            self._on_evict(self)
+        asyncio.create_task(self._close(reason, code))
+
+    async def _close(self, reason: str, code: int):
+        try:
+            # A half-open socket may never complete the closing handshake
+            await asyncio.wait_for(
+                self.websocket.close(code=code, reason=reason), self.send_timeout
             )
+        except Exception:
+            # Already closed by the client or the transport
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "protocol": self.protocol.name or "legacy",
+            "connected_at": datetime.fromtimestamp(
+                self.connected_at, timezone.utc
+            ).isoformat(),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class _Shard:
+    """
+    The connections of the users that hash to one shard: by user id, then
+    by connection id in the order they connected.
+    """
+
+    __slots__ = ("users", "connections")
+
+    def __init__(self):
+        self.users: Dict[int, Dict[str, ClientConnection]] = {}
+        self.connections = 0
+
+
+class ConnectionManager:
+    """
+    The websockets connected to this worker. Outgoing events go through
+    ``pubsub`` (as JSON), so users connected to other workers receive them
+    too, each encoded in whichever wire protocol their connection speaks.
 
-    def get_other_user_in_chat(self, chat_id: int, user_id: int) -> Optional[int]:
+    Connections are partitioned into ``shards`` by user id. Adding or
+    removing one is a couple of dict operations, and the counters behind
+    ``get_connection_stats`` are kept up to date as that happens.
+
+    A connection is caught up on the messages it missed with one
+    ``catchup`` event: those after the client's last event id, or, for a
+    single-process transport (where a user with no connection here is
+    offline), those remembered in ``offline``. Catch-ups stop at
+    ``last_message_id`` as of registration; later messages arrive live.
+    """
+
+    def __init__(
+        self,
+        pubsub: Optional[PubSub] = None,
+        ping_interval: float = EnvironmentVariables.WS_PING_INTERVAL_SECONDS,
+        ping_timeout: float = EnvironmentVariables.WS_PING_TIMEOUT_SECONDS,
+        max_connections_per_user: int = EnvironmentVariables.WS_MAX_CONNECTIONS_PER_USER,
+        shards: int = EnvironmentVariables.WS_REGISTRY_SHARDS,
+        offline: Optional[OfflineQueue] = None,
+        catchup_limit: int = EnvironmentVariables.WS_PENDING_FLUSH_LIMIT,
+    ):
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.totals = ConnectionTotals()
+        self.pubsub = pubsub or create_pubsub()
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_connections_per_user = max_connections_per_user
+        self.offline = offline or OfflineQueue()
+        self.catchup_limit = catchup_limit
+        # Highest message id published to anyone, as seen by this worker
+        self.last_message_id = 0
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def start(self):
         """
-        Get the other user's ID in a private chat.
-        For private chats, there should be exactly 2 participants.
-        Returns the ID of the other user, or None if not found.
+        Subscribe this worker to the pub/sub transport and start the
+        heartbeat reaper.
         """
-        try:
-            with next(get_db()) as db:
-                # Query the chat and its participants
-                chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        await self.pubsub.start(self.deliver_local)
+        # Subscribed first, so no message falls between the two
+        async with AsyncSessionLocal() as db:
+            last_id = await crud_message.get_last_id_async(db)
+        self.last_message_id = max(self.last_message_id, last_id)
+        if self.ping_interval > 0:
+            self._reaper = asyncio.create_task(self._reap_loop(), name="ws-reaper")
 
-                if not chat:
-                    return None
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        await self.pubsub.stop()
 
-                # For private chats, there should be exactly 2 participants
-                if chat.chat_type == "private" and len(chat.participants) == 2:
-                    for participant in chat.participants:
-                        if participant.id != user_id:
-                            return participant.id
+    def _shard(self, user_id: int) -> _Shard:
+        return self.shards[user_id % len(self.shards)]
 
-                # For group chats, we might want different logic
-                # For now, returning None for group chats
-                return None
-        except Exception as e:
-            logger.error(f"Error getting other user in chat {chat_id}: {e}")
-            return None
-        
+    def connections_of(self, user_id: int) -> List[ClientConnection]:
+        """
+        The user's connections on this worker, oldest first.
+        """
+        connections = self._shard(user_id).users.get(user_id)
+        return list(connections.values()) if connections else []
 
-    def get_username_by_id(self, user_id: int) -> Optional[str]:
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        username: str,
+        protocol: WireProtocol = LEGACY_PROTOCOL,
+        last_event_id: Optional[int] = None,
+    ) -> ClientConnection:
         """
-        Get username by user_id using existing design.
+        Connect a websocket for a specific user, whose username the caller
+        has already looked up, accepting the negotiated wire protocol.
         """
-        try:
-            with next(get_db()) as db:
-                return crud_user.get_username_by_id(db, user_id=user_id)
-        except Exception as e:
-            logger.error(f"Error getting username for user {user_id}: {e}")
-            return None
-
-    def get_connection_stats(self) -> dict:
-        """
-        Get statistics about current connections for debugging.
-        """
-        # Get usernames for connected users
-        user_details = {}
-        for user_id in self.active_connections.keys():
-            username = self.get_username_by_id(user_id)
-            user_details[user_id] = {
-                "username": username or f"Unknown({user_id})",
-                "connections": len(self.active_connections[user_id]),
+        await websocket.accept(subprotocol=protocol.name)
+        connection = self.register(
+            ClientConnection(
+                websocket, user_id, username, protocol, totals=self.totals
+            )
+        )
+        await self._catch_up(connection, last_event_id)
+        return connection
+
+    async def connect_stream(
+        self,
+        stream: EventStream,
+        user_id: int,
+        username: str,
+        last_event_id: Optional[int] = None,
+    ) -> ClientConnection:
+        """
+        Connect a Server-Sent Events stream for a user, caught up as a
+        websocket is.
+        """
+        connection = self.register(
+            ClientConnection(
+                stream, user_id, username, SSE_PROTOCOL, totals=self.totals
+            )
+        )
+        await self._catch_up(connection, last_event_id)
+        return connection
+
+    async def _catch_up(
+        self, connection: ClientConnection, last_event_id: Optional[int]
+    ):
+        """
+        Queue the catch-up of a just registered connection. A client
+        resuming with ``last_event_id`` gets every message after it, read
+        from the database; otherwise it gets what ``offline`` recorded.
+        """
+        # Read before any await: messages published from here on reach the
+        # connection live, so the catch-up stops short of them
+        up_to = self.last_message_id
+        user_id = connection.user_id
+        pending = self.offline.pop(user_id)
+        if last_event_id is not None:
+            await self._queue_catchup(
+                connection,
+                lambda db, limit: crud_message.get_user_messages_after_async(
+                    db,
+                    user_id=user_id,
+                    after_id=last_event_id,
+                    limit=limit,
+                    up_to=up_to,
+                ),
+            )
+        elif pending is not None:
+            await self._send_catchup(connection, pending, up_to)
+
+    async def _send_catchup(
+        self, connection: ClientConnection, pending: PendingCatchup, up_to: int
+    ):
+        """
+        Queue one ``catchup`` event with the messages the user missed while
+        offline, read back from the cursors in ``pending``.
+        """
+        load = None
+        if pending.chats:
+            load = lambda db, limit: crud_message.get_messages_from_async(
+                db, first_ids=pending.chats, limit=limit, up_to=up_to
+            )
+        await self._queue_catchup(connection, load, complete=not pending.truncated)
+
+    async def _queue_catchup(
+        self,
+        connection: ClientConnection,
+        load: Optional[Callable[[AsyncSession, int], Awaitable[List[Message]]]],
+        complete: bool = True,
+    ):
+        """
+        Queue one ``catchup`` event with the messages ``load`` reads (given
+        a session and a row limit). ``complete`` is false when the client
+        still has to fetch some history itself.
+        """
+        messages = []
+        if load is not None:
+            try:
+                async with AsyncSessionLocal() as db:
+                    messages = await load(db, self.catchup_limit + 1)
+            except Exception as e:
+                logger.error(
+                    f"Error loading catch-up for user {connection.user_id}: {e}"
+                )
+                complete = False
+            if len(messages) > self.catchup_limit:
+                messages = messages[: self.catchup_limit]
+                complete = False
+        connection.enqueue(
+            {
+                "type": "catchup",
+                "messages": [message_event(message) for message in messages],
+                "complete": complete,
             }
+        )
 
-        return {
-            "user_connections": {
-                user_id: len(connections)
-                for user_id, connections in self.active_connections.items()
-            },
-            "user_details": user_details,
-            "total_connections": sum(
-                len(connections) for connections in self.active_connections.values()
-            ),
-            "connected_users": list(self.active_connections.keys()),
+    def register(self, connection: ClientConnection) -> ClientConnection:
+        """
+        Add an accepted connection to the registry.
+        """
+        connection.start(on_evict=self._evicted)
+        shard = self._shard(connection.user_id)
+        connections = shard.users.get(connection.user_id)
+        if connections is None:
+            connections = shard.users[connection.user_id] = {}
+            self.totals.users += 1
+        connections[connection.id] = connection
+        shard.connections += 1
+        self.totals.connections += 1
+
+        # Make room by closing the user's oldest connections, which are the
+        # likeliest to be stale
+        while len(connections) > self.max_connections_per_user:
+            self.totals.over_limit += 1
+            next(iter(connections.values())).evict(
+                f"more than {self.max_connections_per_user} connections",
+                code=status.WS_1008_POLICY_VIOLATION,
+            )
+
+        return connection
+
+    def disconnect(self, websocket: WebSocket, user_id: int):
+        """
+        Disconnect a websocket for a specific user.
+        """
+        for connection in self.connections_of(user_id):
+            if connection.websocket is websocket:
+                self.unregister(connection)
+                break
+
+    def unregister(self, connection: ClientConnection) -> bool:
+        """
+        Remove a connection from the registry and stop its writer. Returns
+        False if it was not registered.
+        """
+        shard = self._shard(connection.user_id)
+        connections = shard.users.get(connection.user_id)
+        if connections is None or connections.pop(connection.id, None) is None:
+            return False
+        connection.stop()
+        shard.connections -= 1
+        self.totals.connections -= 1
+        # Clean up empty connection maps
+        if not connections:
+            del shard.users[connection.user_id]
+            self.totals.users -= 1
+        return True
+
+    def _evicted(self, connection: ClientConnection):
+        self.totals.evicted += 1
+        self.unregister(connection)
+
+    async def _reap_loop(self):
+        # Visit one shard per tick, so every connection is checked twice per
+        # ping interval without stalling the loop on a big sweep
+        index = 0
+        while True:
+            await asyncio.sleep(self.ping_interval / 2 / len(self.shards))
+            try:
+                self.reap(shard=self.shards[index])
+            except Exception as e:
+                logger.error(f"Error reaping websocket connections: {e}")
+            index = (index + 1) % len(self.shards)
+            if index == 0:
+                self.offline.prune()
+
+    def reap(self, now: Optional[float] = None, shard: Optional[_Shard] = None) -> int:
+        """
+        Ping connections that have been quiet for ``ping_interval`` and evict
+        those quiet for ``ping_interval + ping_timeout``, in one shard or in
+        all of them. Only applies to protocols whose clients answer pings;
+        legacy sockets rely on the server's transport-level pings. Returns
+        the number evicted.
+        """
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for current in [shard] if shard is not None else self.shards:
+            for connections in list(current.users.values()):
+                for connection in list(connections.values()):
+                    if not connection.protocol.heartbeats:
+                        continue
+                    idle = now - connection.last_seen
+                    if idle > self.ping_interval + self.ping_timeout:
+                        reaped += 1
+                        connection.evict(
+                            f"no frames for {idle:.1f}s",
+                            code=status.WS_1001_GOING_AWAY,
+                        )
+                    elif (
+                        idle >= self.ping_interval
+                        and now - connection.last_ping >= self.ping_interval
+                    ):
+                        connection.last_ping = now
+                        connection.enqueue({"type": "ping"}, coalesce_key="ping")
+        self.totals.reaped += reaped
+        return reaped
+
+    async def broadcast(
+        self, message: str, chat_id: int, sender_user_id: int, other_user_id: int = None
+    ):
+        """
+        Broadcast a notice to other participants in a chat.
+        For private chats, finds the other user and sends directly to them.
+        """
+        if not other_user_id:
+            logger.warning(f"No recipient for message in chat {chat_id}")
+            return
+        await self.send_event(
+            other_user_id, {"type": "notice", "chat_id": chat_id, "text": message}
+        )
+        logger.debug(
+            f"Published message in chat {chat_id} from user {sender_user_id} to user {other_user_id}"
+        )
+
+    async def send_to_user(
+        self, message: str, user_id: int, coalesce_key: Optional[str] = None
+    ):
+        """
+        Send a text notice directly to a specific user.
+        """
+        await self.send_event(
+            user_id, {"type": "notice", "text": message}, coalesce_key
+        )
+
+    async def send_event(
+        self,
+        user_id: int,
+        event: Event,
+        coalesce_key: Optional[str] = None,
+        exclude_connection: Optional[str] = None,
+    ):
+        """
+        Send an event directly to a specific user (all their connections,
+        on every worker, except the one whose id is ``exclude_connection``).
+        Under the "coalesce" overflow policy, a queued event with the same
+        ``coalesce_key`` is replaced by this one.
+        """
+        if exclude_connection is not None:
+            event = {**event, _EXCLUDE_KEY: exclude_connection}
+        await self.pubsub.publish(
+            user_id, json.dumps(event, separators=(",", ":")), coalesce_key
+        )
+
+    async def deliver_local(
+        self, user_id: int, message: str, coalesce_key: Optional[str] = None
+    ):
+        """
+        Queue a published event on the user's connections on this worker.
+        Called by the pub/sub transport; never waits on a socket.
+        """
+        connections = self._shard(user_id).users.get(user_id)
+        event = None
+        # Only messages are tracked; skip parsing anything else for users
+        # not connected here (send_event publishes compact JSON)
+        if '"type":"message"' in message:
+            event = json.loads(message)
+            if event.get("type") == "message":
+                if event["id"] > self.last_message_id:
+                    self.last_message_id = event["id"]
+                # With other workers, the user may be connected to one of
+                # them; they catch up from their last event id instead
+                if not connections and self.pubsub.single_process:
+                    self.offline.add(user_id, event["chat_id"], event["id"])
+        if not connections:
+            return
+        if event is None:
+            event = json.loads(message)
+        exclude_connection = event.pop(_EXCLUDE_KEY, None)
+        for connection in list(connections.values()):
+            if connection.id != exclude_connection:
+                connection.enqueue(event, coalesce_key)
+
+    def get_connection_stats(self, detail: bool = False) -> dict:
+        """
+        Get statistics about current connections for debugging. O(1) unless
+        ``detail`` asks for every connected user's connections and queues.
+        """
+        totals = self.totals
+        stats = {
+            "total_connections": totals.connections,
+            "total_users": totals.users,
+            "shard_connections": [shard.connections for shard in self.shards],
+            "sent_messages": totals.sent,
+            "sent_frames": totals.frames,
+            "queued_messages": totals.queued,
+            "dropped_messages": totals.dropped,
+            "coalesced_messages": totals.coalesced,
+            "evicted_connections": totals.evicted,
+            "reaped_connections": totals.reaped,
+            "over_limit_connections": totals.over_limit,
+            "pending_catchup_users": len(self.offline),
         }
+        if detail:
+            users = {
+                user_id: list(connections.values())
+                for shard in self.shards
+                for user_id, connections in shard.users.items()
+            }
+            stats["connected_users"] = list(users)
+            stats["user_connections"] = {
+                user_id: len(connections) for user_id, connections in users.items()
+            }
+            stats["user_details"] = {
+                user_id: {
+                    "username": connections[0].username,
+                    "connections": len(connections),
+                    "queues": [connection.stats() for connection in connections],
+                }
+                for user_id, connections in users.items()
+            }
+        return stats
+
+
+connection_manager = ConnectionManager()
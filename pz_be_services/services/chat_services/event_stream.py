@@ -0,0 +1,59 @@
+"""
+Server-Sent Events streams as connections of the websocket registry.
+
+An ``EventStream`` stands in for the websocket of a ``ClientConnection``:
+the connection's writer hands it encoded chunks and the streaming response
+takes them out. SSE clients therefore get the same fan-out, queueing,
+batching and per-user limits as websocket clients.
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+
+from core.config import EnvironmentVariables
+
+KEEPALIVE = ": keepalive\n\n"
+
+
+class EventStream:
+    """The send side of a websocket, feeding one SSE response."""
+
+    def __init__(
+        self, keepalive_seconds: float = EnvironmentVariables.SSE_KEEPALIVE_SECONDS
+    ):
+        self.keepalive_seconds = keepalive_seconds
+        self.closed = False
+        # One chunk at a time: the writer waits for the response to take
+        # it, so a slow client backs up into its own queue and send timeout
+        self._chunks: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=1)
+
+    async def send_text(self, data: str):
+        await self._chunks.put(data)
+
+    async def send_bytes(self, data: bytes):
+        raise TypeError("Event streams only carry text")
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        """End the response; anything not yet taken is dropped."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+        self._chunks.put_nowait(None)
+
+    async def chunks(self) -> AsyncIterator[str]:
+        """
+        The response body. A comment goes out whenever nothing has been
+        sent for ``keepalive_seconds``, so proxies keep the stream open.
+        """
+        while True:
+            try:
+                async with asyncio.timeout(self.keepalive_seconds or None):
+                    chunk = await self._chunks.get()
+            except TimeoutError:
+                yield KEEPALIVE
+                continue
+            if chunk is None:
+                return
+            yield chunk
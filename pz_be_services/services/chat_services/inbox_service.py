@@ -0,0 +1,75 @@
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+from datetime import datetime
+from db.crud import chat
+from schemas.chat import ChatListItem, InboxResponse
+from core.logger import get_logger
+from core.cursor import encode_cursor, decode_cursor
+from fastapi import HTTPException, status
+
+logger = get_logger("inbox_service")
+
+
+class InboxService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_inbox(
+        self, user_id: int, limit: int = 50, before: Optional[str] = None
+    ) -> InboxResponse:
+        """
+        Get one page of the user's chats (all types), most recently active
+        first, with participant counts, unread counts and last message
+        previews. ``before`` is the ``next_cursor`` of the previous page.
+        """
+        try:
+            before_key = self._decode_inbox_cursor(before)
+
+            rows, has_more = chat.get_inbox_page(
+                self.db, user_id=user_id, limit=limit, before=before_key
+            )
+
+            items = [
+                ChatListItem(
+                    id=row.id,
+                    title=row.title,
+                    chat_type=row.chat_type,
+                    last_message_at=row.last_message_at,
+                    participant_count=row.participant_count,
+                    unread_count=row.unread_count,
+                    last_message_preview=row.last_message_preview,
+                )
+                for row in rows
+            ]
+
+            next_cursor = None
+            if has_more and rows:
+                next_cursor = encode_cursor(rows[-1].activity, rows[-1].id)
+
+            logger.info(f"Retrieved {len(items)} inbox chats for user {user_id}")
+
+            return InboxResponse(
+                chats=items, has_more=has_more, next_cursor=next_cursor
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error retrieving inbox for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error retrieving inbox",
+            )
+
+    @staticmethod
+    def _decode_inbox_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+        """
+        Decode an inbox cursor into its (activity, chat id) key.
+        """
+        if not cursor:
+            return None
+        try:
+            activity, chat_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return activity, chat_id
@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from datetime import datetime, timezone
 import json
-from db.crud import chat, user, message
+from db.database import AsyncSessionLocal
+from db.crud import chat, user, message, chat_read, unread_counter
 from schemas.message import (
     MessageWithSender,
     MessageListResponse,
@@ -8,15 +12,27 @@ from schemas.message import (
     MessageSendRequest,
 )
 from schemas.user import UserInChat
+from schemas.chat import UnreadCountsResponse
 from core.logger import get_logger
+from core.cursor import encode_cursor, decode_cursor
+from db.models import Message
 from fastapi import HTTPException, status
+from services.chat_services.chat_access import require_participant
 from services.chat_services.connection_manager import ConnectionManager
+from services.chat_services.message_writer import message_writer
+from services.chat_services.ws_protocol import message_event
 
 logger = get_logger("message_service")
 
 
 class MessageService:
-    def __init__(self, db: Session, connection_manager: ConnectionManager):
+    def __init__(
+        self,
+        db: Optional[Session] = None,
+        connection_manager: Optional[ConnectionManager] = None,
+    ):
+        # Used by the sync methods; send_message reads through its own
+        # short-lived AsyncSession
         self.db = db
         self.connection_manager = connection_manager
 
@@ -27,62 +43,80 @@ class MessageService:
         skip: int = 0,
         limit: int = 100,
         order: str = "asc",
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        around: Optional[int] = None,
+        at: Optional[datetime] = None,
     ) -> MessageListResponse:
         """
         Get messages from a chat for an authenticated user.
         User must be a participant in the chat.
+
+        Pages with opaque ``before``/``after`` cursors on (timestamp, id);
+        ``skip`` is only honoured for the first, cursor-less page.
+
+        ``around`` (a message id) or ``at`` (a time) instead returns a window
+        of ``limit`` messages on each side of that message, or of the first
+        message at or after that time, with cursors for both directions.
         """
         try:
-            # Verify chat exists
-            chat_obj = chat.get(self.db, id=chat_id)
-            if not chat_obj:
+            given = [
+                name
+                for name, value in (
+                    ("before", before),
+                    ("after", after),
+                    ("around", around),
+                    ("at", at),
+                )
+                if value is not None
+            ]
+            if len(given) > 1:
                 raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Use only one of 'before', 'after', 'around' and 'at', not {' and '.join(repr(name) for name in given)}",
                 )
+            before_key = self._decode_message_cursor(before)
+            after_key = self._decode_message_cursor(after)
 
-            # Check if user is a participant in this chat
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
+            # Verify chat exists
+            require_participant(
+                chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+            )
+
+            if around is not None or at is not None:
+                return self._get_message_window(
+                    chat_id, user_id, limit=limit, order=order, around=around, at=at
                 )
 
-            # Get messages using CRUD function
-            messages = message.get_chat_messages(
-                self.db, chat_id=chat_id, skip=skip, limit=limit, order=order
-            )
-
-            # Format messages with sender information
-            messages_with_sender = []
-            for msg in messages:
-                sender = user.get(self.db, id=msg.sender_id)
-                if sender:
-                    sender_info = UserInChat(
-                        id=sender.id,
-                        username=sender.username,
-                        full_name=sender.full_name or "",
-                        is_active=sender.is_active,
-                    )
+            # Get one keyset page of messages using CRUD function
+            messages, has_more = message.get_chat_messages_page(
+                self.db,
+                chat_id=chat_id,
+                limit=limit,
+                before=before_key,
+                after=after_key,
+                order=order,
+                skip=skip,
+            )
 
-                    message_with_sender = MessageWithSender(
-                        id=msg.id,
-                        content=msg.content,
-                        message_type=msg.message_type,
-                        chat_id=msg.chat_id,
-                        sender_id=msg.sender_id,
-                        timestamp=msg.timestamp,
-                        is_read=msg.is_read,
-                        is_edited=msg.is_edited,
-                        edited_at=msg.edited_at,
-                        sender=sender_info,
-                    )
-                    messages_with_sender.append(message_with_sender)
+            messages_with_sender = self._with_senders(messages, chat_id, user_id)
 
-            # Get total message count for pagination
-            total_count = message.get_message_count_by_chat(self.db, chat_id=chat_id)
+            # Counting is O(chat size), so only the first page pays for it
+            is_first_page = before_key is None and after_key is None
+            total_count = (
+                message.get_message_count_by_chat(self.db, chat_id=chat_id)
+                if is_first_page
+                else None
+            )
 
-            # Check if there are more messages
-            has_more = (skip + len(messages_with_sender)) < total_count
+            next_cursor, prev_cursor = self._page_cursors(
+                messages,
+                has_more=has_more,
+                order=order,
+                towards_older=before_key is not None
+                or (is_first_page and order.lower() == "desc"),
+                has_previous=not is_first_page or skip > 0,
+            )
 
             logger.info(
                 f"Retrieved {len(messages_with_sender)} messages from chat {chat_id} for user {user_id}"
@@ -92,6 +126,8 @@ class MessageService:
                 messages=messages_with_sender,
                 total_count=total_count,
                 has_more=has_more,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor,
             )
 
         except HTTPException:
@@ -105,23 +141,160 @@ class MessageService:
                 detail="Error retrieving chat messages",
             )
 
-    def mark_messages_as_read(self, chat_id: int, user_id: int) -> int:
+    def _get_message_window(
+        self,
+        chat_id: int,
+        user_id: int,
+        *,
+        limit: int,
+        order: str,
+        around: Optional[int],
+        at: Optional[datetime],
+    ) -> MessageListResponse:
         """
-        Mark all unread messages in a chat as read for the authenticated user.
+        The ``around``/``at`` window of ``get_chat_messages``. The caller has
+        checked that the user is a participant.
         """
-        try:
-            # Verify chat exists and user is participant
-            chat_obj = chat.get(self.db, id=chat_id)
-            if not chat_obj:
+        if around is not None:
+            target = message.get(self.db, id=around)
+            if target is None or target.chat_id != chat_id:
                 raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Message not found in this chat",
+                )
+            anchor = (target.timestamp, target.id)
+        else:
+            # Timestamps are stored in UTC; a naive time is taken as UTC
+            if at.tzinfo is not None:
+                at = at.astimezone(timezone.utc)
+            anchor = (at, 0)
+
+        older, newer, has_older, has_newer = message.get_chat_messages_window(
+            self.db, chat_id=chat_id, anchor=anchor, limit=limit
+        )
+        messages = older + newer
+        # The first message on the newer side is the one the window is on
+        anchor_id = newer[0].id if newer else None
+
+        older_cursor = newer_cursor = None
+        if messages and has_older:
+            older_cursor = encode_cursor(messages[0].timestamp, messages[0].id)
+        if messages and has_newer:
+            newer_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+
+        # next_cursor keeps going the way ``order`` reads, as on other pages
+        if order.lower() == "desc":
+            messages.reverse()
+            has_more, next_cursor, prev_cursor = has_older, older_cursor, newer_cursor
+        else:
+            has_more, next_cursor, prev_cursor = has_newer, newer_cursor, older_cursor
+
+        messages_with_sender = self._with_senders(messages, chat_id, user_id)
+
+        logger.info(
+            f"Retrieved a window of {len(messages_with_sender)} messages from chat {chat_id} for user {user_id}"
+        )
+
+        return MessageListResponse(
+            messages=messages_with_sender,
+            has_more=has_more,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            anchor_id=anchor_id,
+        )
+
+    def _with_senders(
+        self, messages: List[Message], chat_id: int, user_id: int
+    ) -> List[MessageWithSender]:
+        """
+        Format messages with sender information, as seen by ``user_id``.
+        """
+        # Read flags are derived from the participants' watermarks
+        read_state = chat_read.get_read_state(
+            self.db, chat_id=chat_id, user_id=user_id
+        )
+
+        messages_with_sender = []
+        for msg in messages:
+            sender = msg.sender
+            if sender:
+                sender_info = UserInChat(
+                    id=sender.id,
+                    username=sender.username,
+                    full_name=sender.full_name or "",
+                    is_active=sender.is_active,
                 )
 
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
+                message_with_sender = MessageWithSender(
+                    id=msg.id,
+                    content=msg.content,
+                    message_type=msg.message_type,
+                    chat_id=msg.chat_id,
+                    sender_id=msg.sender_id,
+                    timestamp=msg.timestamp,
+                    is_read=read_state.is_read(
+                        sender_id=msg.sender_id, message_id=msg.id
+                    ),
+                    is_edited=msg.is_edited,
+                    edited_at=msg.edited_at,
+                    sender=sender_info,
                 )
+                messages_with_sender.append(message_with_sender)
+        return messages_with_sender
+
+    @staticmethod
+    def _decode_message_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+        """
+        Decode a message cursor into its (timestamp, id) key.
+        """
+        if not cursor:
+            return None
+        try:
+            timestamp, message_id = decode_cursor(
+                cursor, datetime.fromisoformat, int
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return timestamp, message_id
+
+    @staticmethod
+    def _page_cursors(
+        messages: List[Message],
+        *,
+        has_more: bool,
+        order: str,
+        towards_older: bool,
+        has_previous: bool,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Build (next_cursor, prev_cursor) for a page returned in ``order``.
+        next_cursor continues in the direction of travel, prev_cursor turns
+        back from the start of the page.
+        """
+        if not messages:
+            return None, None
+
+        if order.lower() == "desc":
+            newest, oldest = messages[0], messages[-1]
+        else:
+            oldest, newest = messages[0], messages[-1]
+        last, first = (oldest, newest) if towards_older else (newest, oldest)
+
+        next_cursor = encode_cursor(last.timestamp, last.id) if has_more else None
+        prev_cursor = (
+            encode_cursor(first.timestamp, first.id) if has_previous else None
+        )
+        return next_cursor, prev_cursor
+
+    def mark_messages_as_read(self, chat_id: int, user_id: int) -> int:
+        """
+        Mark all unread messages in a chat as read for the authenticated user.
+        """
+        try:
+            # Verify chat exists and user is participant
+            require_participant(
+                chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+            )
 
             # Mark messages as read
             marked_count = message.mark_chat_messages_as_read(
@@ -151,20 +324,12 @@ class MessageService:
         """
         try:
             # Verify chat exists and user is participant
-            chat_obj = chat.get(self.db, id=chat_id)
-            if not chat_obj:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
-                )
-
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
-                )
+            require_participant(
+                chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+            )
 
-            # Get unread count
-            unread_count = message.get_unread_count_by_chat(
+            # Read the materialized counter instead of counting messages
+            unread_count = unread_counter.get_count(
                 self.db, chat_id=chat_id, user_id=user_id
             )
 
@@ -185,33 +350,51 @@ class MessageService:
                 detail="Error getting unread message count",
             )
 
+    def get_unread_counts(self, user_id: int) -> UnreadCountsResponse:
+        """
+        Get the unread counts of every chat the user participates in,
+        from the materialized counters in a single query.
+        """
+        try:
+            counts = unread_counter.get_counts_for_user(self.db, user_id=user_id)
+
+            logger.info(
+                f"User {user_id} has {sum(counts.values())} unread messages across {len(counts)} chats"
+            )
+
+            return UnreadCountsResponse(
+                unread_counts=counts, total_unread=sum(counts.values())
+            )
+
+        except Exception as e:
+            logger.error(f"Error getting unread counts for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error getting unread message counts",
+            )
+
     async def send_message(
-        self, chat_id: int, user_id: int, message_request: MessageSendRequest
+        self,
+        chat_id: int,
+        user_id: int,
+        message_request: MessageSendRequest,
+        origin_connection: Optional[str] = None,
     ) -> MessageWithSender:
         """
         Send a message to a chat.
         User must be a participant in the chat.
+
+        With a connection manager, the committed message is pushed to every
+        online participant, sender included, except the websocket with id
+        ``origin_connection`` that sent it.
         """
         try:
-            # Verify chat exists
-            chat_obj = chat.get(self.db, id=chat_id)
-            if not chat_obj:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
-                )
-
-            # Check if user is a participant in this chat
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
-                )
-
-            # Check if chat is active
-            if not chat_obj.is_active:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Cannot send message to inactive chat",
+            # The checks run in a session of their own that gives its pooled
+            # connection back before waiting on the writer, which needs one
+            # to commit the batch
+            async with AsyncSessionLocal() as db:
+                sender_info, participant_ids = await self._check_sender(
+                    db, chat_id, user_id
                 )
 
             # Create message
@@ -222,24 +405,9 @@ class MessageService:
                 message_type=message_request.message_type,
             )
 
-            # Create message and update chat timestamp
-            new_message = message.create_with_chat_update(
-                self.db, obj_in=message_create
-            )
-
-            # Get sender information for response
-            sender = user.get(self.db, id=user_id)
-            if not sender:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Sender not found"
-                )
-
-            sender_info = UserInChat(
-                id=sender.id,
-                username=sender.username,
-                full_name=sender.full_name or "",
-                is_active=sender.is_active,
-            )
+            # Queue the message for the next group commit; this resolves
+            # once the batch holding it (and the chat timestamp) is persisted
+            new_message = await message_writer.submit(message_create)
 
             # Format response
             message_response = MessageWithSender(
@@ -259,6 +427,11 @@ class MessageService:
                 f"Successfully sent message {new_message.id} to chat {chat_id} from user {user_id}"
             )
 
+            if participant_ids:
+                await self._push_message(
+                    message_response, participant_ids, origin_connection
+                )
+
             return message_response
 
         except HTTPException:
@@ -271,3 +444,127 @@ class MessageService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error sending message",
             )
+
+    async def send_chat_event(
+        self,
+        chat_id: int,
+        user_id: int,
+        event_type: str,
+        to: int,
+        message_id: Optional[int] = None,
+    ) -> None:
+        """
+        Relay a ``typing`` or ``read`` event from a participant of a chat to
+        another participant. A ``read`` event first moves the user's read
+        watermark up to ``message_id`` (default: the latest message).
+        """
+        try:
+            async with AsyncSessionLocal() as db:
+                require_participant(
+                    await chat.get_access_async(db, chat_id=chat_id, user_id=user_id)
+                )
+                recipient = await chat.get_access_async(
+                    db, chat_id=chat_id, user_id=to
+                )
+                if not recipient.is_participant:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Recipient is not a participant in this chat",
+                    )
+
+                if event_type == "read":
+                    if message_id is not None:
+                        read_message = await message.get_async(db, id=message_id)
+                        if read_message is None or read_message.chat_id != chat_id:
+                            raise HTTPException(
+                                status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Message not found",
+                            )
+                    marked_count = await chat_read.mark_read_async(
+                        db, chat_id=chat_id, user_id=user_id, message_id=message_id
+                    )
+                    logger.info(
+                        f"Marked {marked_count} messages as read in chat {chat_id} for user {user_id}"
+                    )
+
+            if self.connection_manager is None:
+                return
+            relayed = {"type": event_type, "chat_id": chat_id, "from": user_id}
+            if message_id is not None:
+                relayed["message_id"] = message_id
+            # Only the latest one per chat matters
+            await self.connection_manager.send_event(
+                to, relayed, coalesce_key=f"{event_type}:{chat_id}:{user_id}"
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error sending {event_type} event in chat {chat_id} from user {user_id}: {str(e)}"
+            )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error sending {event_type} event",
+            )
+
+    async def _check_sender(
+        self, db: AsyncSession, chat_id: int, user_id: int
+    ) -> Tuple[UserInChat, List[int]]:
+        """
+        Check that the user may send to the chat. Returns the sender's info
+        and, when messages are pushed, the ids of the chat's participants.
+        """
+        # Verify chat exists and user is a participant
+        access = require_participant(
+            await chat.get_access_async(db, chat_id=chat_id, user_id=user_id)
+        )
+
+        # Check if chat is active
+        if not access.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot send message to inactive chat",
+            )
+
+        # Get sender information for response
+        sender = await user.get_async(db, id=user_id)
+        if not sender:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Sender not found"
+            )
+
+        sender_info = UserInChat(
+            id=sender.id,
+            username=sender.username,
+            full_name=sender.full_name or "",
+            is_active=sender.is_active,
+        )
+
+        participant_ids = []
+        if self.connection_manager is not None:
+            participant_ids = await chat.get_participant_ids_async(
+                db, chat_id=chat_id
+            )
+        return sender_info, participant_ids
+
+    async def _push_message(
+        self,
+        message_response: MessageWithSender,
+        participant_ids: List[int],
+        origin_connection: Optional[str],
+    ):
+        """
+        Push a committed message to the participants' websockets. The
+        message is already stored, so a failed push is only logged.
+        """
+        event = message_event(message_response)
+        for participant_id in participant_ids:
+            try:
+                await self.connection_manager.send_event(
+                    participant_id, event, exclude_connection=origin_connection
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error pushing message {message_response.id} to user {participant_id}: {str(e)}"
+                )
@@ -0,0 +1,132 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from db.database import AsyncSessionLocal
+from db.crud import message
+from db.models import Message
+from schemas.message import MessageCreate
+from core.config import EnvironmentVariables
+from core.logger import get_logger
+
+logger = get_logger("message_writer")
+
+PendingMessage = Tuple[MessageCreate, asyncio.Future]
+
+
+class MessageWriter:
+    """
+    Single-writer group-commit pipeline for message inserts.
+
+    Callers ``submit`` a MessageCreate and await the persisted Message. One
+    background task drains the queue and writes everything that arrived
+    within ``flush_interval_ms`` (or up to ``max_batch_size`` messages) in a
+    single transaction, so inserts per second scale with the batch size
+    instead of with fsync latency.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        max_batch_size: int = EnvironmentVariables.MESSAGE_BATCH_MAX_SIZE,
+        flush_interval_ms: float = EnvironmentVariables.MESSAGE_BATCH_INTERVAL_MS,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """
+        Start the writer task on the running event loop.
+        """
+        if self.is_running and self._loop is asyncio.get_running_loop():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="message-writer")
+        logger.info(
+            f"Message writer started (batch size {self.max_batch_size}, interval {self.flush_interval * 1000:g}ms)"
+        )
+
+    async def stop(self):
+        """
+        Flush everything already queued, then stop the writer task.
+        """
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Message writer stopped")
+
+    async def submit(self, obj_in: MessageCreate) -> Message:
+        """
+        Queue a message for the next batch and wait until it is committed.
+        """
+        await self.start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((obj_in, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch: List[PendingMessage] = [item]
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                try:
+                    # Take whatever is already queued without waiting
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingMessage]):
+        try:
+            async with self.session_factory() as db:
+                messages = await message.create_many_with_chat_update_async(
+                    db, objs_in=[obj_in for obj_in, _ in batch]
+                )
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+
+            # Retry one by one so a single bad row does not fail its batch
+            logger.error(
+                f"Batch of {len(batch)} messages failed, retrying individually: {e}"
+            )
+            for pending in batch:
+                await self._flush([pending])
+            return
+
+        for (_, future), msg in zip(batch, messages):
+            if not future.done():
+                future.set_result(msg)
+        logger.debug(f"Committed batch of {len(messages)} messages")
+
+
+message_writer = MessageWriter()
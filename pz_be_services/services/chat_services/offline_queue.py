@@ -0,0 +1,100 @@
+"""
+Catch-up state for users who are offline when a message is pushed to them.
+
+Only a cursor is kept per (user, chat): the id of the first message the
+user missed there. When the user reconnects, the missed messages are read
+back from the database in one query and sent as a single ``catchup``
+event, instead of the client re-fetching every chat's history.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from core.config import EnvironmentVariables
+
+
+class PendingCatchup:
+    """What one offline user has missed."""
+
+    __slots__ = ("chats", "since", "truncated")
+
+    def __init__(self, since: float):
+        # chat_id -> id of the first missed message, oldest chat first
+        self.chats: Dict[int, int] = {}
+        # time.monotonic() of the first missed message
+        self.since = since
+        # Some missed messages are no longer tracked (limits or TTL), so
+        # the client has to fall back to a full fetch
+        self.truncated = False
+
+
+class OfflineQueue:
+    """
+    Bounded per-user catch-up cursors. A user keeps at most
+    ``max_chats_per_user`` chats (the oldest is dropped, marking the
+    catch-up incomplete) for at most ``ttl_seconds``; at most ``max_users``
+    users are tracked, dropping the least recently updated.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = EnvironmentVariables.WS_PENDING_TTL_SECONDS,
+        max_chats_per_user: int = EnvironmentVariables.WS_PENDING_MAX_CHATS_PER_USER,
+        max_users: int = EnvironmentVariables.WS_PENDING_MAX_USERS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_chats_per_user = max_chats_per_user
+        self.max_users = max_users
+        self._users: "OrderedDict[int, PendingCatchup]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def add(self, user_id: int, chat_id: int, message_id: int):
+        """
+        Record that ``user_id`` missed message ``message_id`` in ``chat_id``.
+        """
+        pending = self._users.get(user_id)
+        if pending is None:
+            pending = self._users[user_id] = PendingCatchup(time.monotonic())
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+
+        if chat_id in pending.chats:
+            # Keep the earliest missed message; later ones follow it
+            return
+        pending.chats[chat_id] = message_id
+        if len(pending.chats) > self.max_chats_per_user:
+            del pending.chats[next(iter(pending.chats))]
+            pending.truncated = True
+
+    def pop(self, user_id: int) -> Optional[PendingCatchup]:
+        """
+        Take the user's catch-up cursors, if any. Past the TTL only the
+        fact that something was missed is returned.
+        """
+        pending = self._users.pop(user_id, None)
+        if pending is not None and self._expired(pending, time.monotonic()):
+            pending.chats.clear()
+            pending.truncated = True
+        return pending
+
+    def prune(self) -> int:
+        """
+        Forget users whose catch-up has outlived the TTL. Returns how many.
+        """
+        now = time.monotonic()
+        expired = [
+            user_id
+            for user_id, pending in self._users.items()
+            if self._expired(pending, now)
+        ]
+        for user_id in expired:
+            del self._users[user_id]
+        return len(expired)
+
+    def _expired(self, pending: PendingCatchup, now: float) -> bool:
+        return now - pending.since > self.ttl_seconds
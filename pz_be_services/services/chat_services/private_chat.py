@@ -1,11 +1,12 @@
 from sqlalchemy.orm import Session
-from db.crud import chat, user, message
+from db.crud import chat, user, message, chat_read
 from schemas.chat import ChatWithParticipants, ChatCreateModel
 from schemas.user import UserInChat
 from schemas.message import MessageWithSender, MessageListResponse
 from core.logger import get_logger
 from typing import List
 from fastapi import HTTPException, status
+from services.chat_services.chat_access import require_participant
 
 logger = get_logger("chat_service")
 
@@ -37,33 +38,29 @@ class PrivateChatService:
                     detail="Cannot create chat with yourself",
                 )
 
-            # Check if a private chat already exists between these two users
-            existing_chat = chat.get_private_chat(
-                self.db, user1_id=current_user_id, user2_id=other_user.id
-            )
-
-            if existing_chat:
-                logger.info(
-                    f"Found existing private chat {existing_chat.id} between users {current_user_id} and {other_user.id} ({other_username})"
-                )
-                return self._format_chat_response(existing_chat)
-
-            # Create new private chat
+            # Get the existing private chat or create it; concurrent requests
+            # for the same pair resolve to a single chat
             chat_data = ChatCreateModel(
                 chat_type="private",
                 title=None,  # Private chats typically don't have titles
             )
 
-            new_chat = chat.create_with_participants(
+            chat_obj, created = chat.get_or_create_private_chat(
                 self.db,
                 obj_in=chat_data,
-                participant_ids=[current_user_id, other_user.id],
+                user1_id=current_user_id,
+                user2_id=other_user.id,
             )
 
-            logger.info(
-                f"Created new private chat {new_chat.id} between users {current_user_id} and {other_user.id} ({other_username})"
-            )
-            return self._format_chat_response(new_chat)
+            if created:
+                logger.info(
+                    f"Created new private chat {chat_obj.id} between users {current_user_id} and {other_user.id} ({other_username})"
+                )
+            else:
+                logger.info(
+                    f"Found existing private chat {chat_obj.id} between users {current_user_id} and {other_user.id} ({other_username})"
+                )
+            return self._format_chat_response(chat_obj)
 
         except HTTPException:
             raise
@@ -108,27 +105,18 @@ class PrivateChatService:
         Get a specific private chat by ID, ensuring the user is a participant.
         """
         try:
-            chat_obj = chat.get(self.db, id=chat_id)
-
-            if not chat_obj:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
-                )
-
-            # Check if user is a participant in this chat
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
-                )
+            access = require_participant(
+                chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+            )
 
             # Ensure it's a private chat
-            if chat_obj.chat_type != "private":
+            if access.chat_type != "private":
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="This is not a private chat",
                 )
 
+            chat_obj = chat.get(self.db, id=chat_id)
             logger.info(f"Retrieved private chat {chat_id} for user {user_id}")
             return self._format_chat_response(chat_obj)
 
@@ -182,17 +170,9 @@ class PrivateChatService:
         """
         try:
             # Verify chat exists and user is a participant
-            chat_obj = chat.get(self.db, id=chat_id)
-            if not chat_obj:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
-                )
-
-            if not chat.is_participant(self.db, chat_id=chat_id, user_id=user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a participant in this chat",
-                )
+            require_participant(
+                chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+            )
 
             # Get messages using CRUD
             messages = message.get_chat_messages(
@@ -204,6 +184,11 @@ class PrivateChatService:
             if has_more:
                 messages = messages[:limit]  # Remove the extra message
 
+            # Read flags are derived from the participants' watermarks
+            read_state = chat_read.get_read_state(
+                self.db, chat_id=chat_id, user_id=user_id
+            )
+
             # Format messages with sender info
             formatted_messages = []
             for msg in messages:
@@ -221,7 +206,9 @@ class PrivateChatService:
                     content=msg.content,
                     message_type=msg.message_type,
                     timestamp=msg.timestamp,
-                    is_read=msg.is_read,
+                    is_read=read_state.is_read(
+                        sender_id=msg.sender_id, message_id=msg.id
+                    ),
                     is_edited=msg.is_edited,
                     edited_at=msg.edited_at,
                     sender=sender_info,
@@ -0,0 +1,199 @@
+"""
+Pub/sub transports for websocket fan-out.
+
+``ConnectionManager`` publishes every outgoing message addressed to a user,
+and each worker's subscriber delivers it to that user's sockets on that
+worker. ``InProcessPubSub`` is for a single worker. ``SQLitePubSub``
+relays messages between workers on one machine through a shared SQLite
+file.
+"""
+
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+import aiosqlite
+
+from core.config import EnvironmentVariables
+from core.logger import get_logger
+
+logger = get_logger("pubsub")
+
+# Called with (user_id, message, coalesce_key) for every published message
+MessageHandler = Callable[[int, str, Optional[str]], Awaitable[None]]
+
+
+class PubSub(ABC):
+    """
+    Delivers each published (user_id, message, coalesce_key) to the
+    handler of every subscribed worker, including the publisher's own.
+    """
+
+    # Whether every subscriber is in this process, so a user with no
+    # connection here has none anywhere
+    single_process = False
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    @abstractmethod
+    async def publish(
+        self, user_id: int, message: str, coalesce_key: Optional[str] = None
+    ):
+        """Deliver to every subscribed worker's handler."""
+
+    async def _deliver(
+        self, user_id: int, message: str, coalesce_key: Optional[str] = None
+    ):
+        if self._handler is None:
+            logger.warning(f"Dropping message for user {user_id}: pub/sub not started")
+            return
+        try:
+            await self._handler(user_id, message, coalesce_key)
+        except Exception as e:
+            logger.error(f"Error delivering message to user {user_id}: {e}")
+
+
+class InProcessPubSub(PubSub):
+    """Delivers straight to this worker's handler."""
+
+    single_process = True
+
+    async def publish(
+        self, user_id: int, message: str, coalesce_key: Optional[str] = None
+    ):
+        await self._deliver(user_id, message, coalesce_key)
+
+
+class SQLitePubSub(PubSub):
+    """
+    Relays messages between worker processes through a table in a shared
+    SQLite file.
+
+    A publisher delivers to its own worker immediately, then appends the
+    message to the table. Every worker polls for rows newer than the last
+    one it has seen and delivers those from other workers. Rows older than
+    ``retention_seconds`` are pruned.
+    """
+
+    def __init__(
+        self,
+        path: str = EnvironmentVariables.PUBSUB_SQLITE_PATH,
+        poll_interval_ms: float = EnvironmentVariables.PUBSUB_POLL_INTERVAL_MS,
+        retention_seconds: float = EnvironmentVariables.PUBSUB_RETENTION_SECONDS,
+    ):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval_ms / 1000
+        self.retention_seconds = retention_seconds
+        # Identifies this worker's own rows
+        self.origin = uuid.uuid4().hex
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    async def start(self, handler: MessageHandler):
+        await super().start(handler)
+        self._conn = await aiosqlite.connect(self.path, isolation_level=None)
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+        await self._conn.execute(
+            f"PRAGMA busy_timeout={EnvironmentVariables.SQLITE_BUSY_TIMEOUT_MS}"
+        )
+        # AUTOINCREMENT keeps ids increasing after pruning, so "newer than
+        # the last seen id" stays correct
+        await self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pubsub_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "origin TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "coalesce_key TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        await self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_pubsub_messages_created_at "
+            "ON pubsub_messages (created_at)"
+        )
+        # Only messages published from now on are delivered
+        async with self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM pubsub_messages"
+        ) as cursor:
+            (self._last_id,) = await cursor.fetchone()
+
+        self._task = asyncio.create_task(self._poll(), name="pubsub-poller")
+        logger.info(
+            f"SQLite pub/sub started on {self.path} (poll interval {self.poll_interval * 1000:g}ms)"
+        )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        await super().stop()
+
+    async def publish(
+        self, user_id: int, message: str, coalesce_key: Optional[str] = None
+    ):
+        await self._deliver(user_id, message, coalesce_key)
+        if self._conn is None:
+            return
+        await self._conn.execute(
+            "INSERT INTO pubsub_messages "
+            "(origin, user_id, payload, coalesce_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.origin, user_id, message, coalesce_key, time.time()),
+        )
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async with self._conn.execute(
+                    "SELECT id, origin, user_id, payload, coalesce_key "
+                    "FROM pubsub_messages "
+                    "WHERE id > ? ORDER BY id LIMIT 1000",
+                    (self._last_id,),
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                for row_id, origin, user_id, payload, coalesce_key in rows:
+                    self._last_id = row_id
+                    if origin != self.origin:
+                        await self._deliver(user_id, payload, coalesce_key)
+
+                now = time.time()
+                if now - self._last_prune >= self.retention_seconds:
+                    self._last_prune = now
+                    await self._conn.execute(
+                        "DELETE FROM pubsub_messages WHERE created_at < ?",
+                        (now - self.retention_seconds,),
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling pub/sub messages: {e}")
+
+
+def create_pubsub(backend: str = EnvironmentVariables.PUBSUB_BACKEND) -> PubSub:
+    """The pub/sub transport named by ``backend`` ("memory" or "sqlite")."""
+    if backend == "sqlite":
+        return SQLitePubSub()
+    if backend == "memory":
+        return InProcessPubSub()
+    raise ValueError(f"Unknown pub/sub backend: {backend}")
@@ -0,0 +1,167 @@
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+from db.crud import chat, message, chat_read
+from db.search import build_match_query
+from schemas.chat import ChatResponse, ChatSearchResponse
+from schemas.message import MessageSearchHit, MessageSearchResponse, MessageWithSender
+from schemas.user import UserInChat
+from core.logger import get_logger
+from core.cursor import encode_cursor, decode_cursor
+from fastapi import HTTPException, status
+from services.chat_services.chat_access import require_participant
+
+logger = get_logger("search_service")
+
+
+class SearchService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        chat_id: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> MessageSearchResponse:
+        """
+        Search the messages of all of the user's chats, or of one chat,
+        best match first. Words ending in ``*`` match as prefixes.
+        """
+        try:
+            self._validate_query(query)
+            after_key = self._decode_search_cursor(cursor)
+
+            if chat_id is not None:
+                require_participant(
+                    chat.get_access(self.db, chat_id=chat_id, user_id=user_id)
+                )
+
+            hits, has_more = message.search_messages_page(
+                self.db,
+                user_id=user_id,
+                query=query,
+                chat_id=chat_id,
+                limit=limit,
+                after=after_key,
+            )
+
+            # Read flags for every chat on the page in one query
+            read_states = chat_read.get_read_states(
+                self.db,
+                chat_ids=list({msg.chat_id for msg, _, _ in hits}),
+                user_id=user_id,
+            )
+
+            results = []
+            for msg, rank, excerpt in hits:
+                sender = msg.sender
+                sender_info = UserInChat(
+                    id=sender.id,
+                    username=sender.username,
+                    full_name=sender.full_name or "",
+                    is_active=sender.is_active,
+                )
+                message_with_sender = MessageWithSender(
+                    id=msg.id,
+                    content=msg.content,
+                    message_type=msg.message_type,
+                    chat_id=msg.chat_id,
+                    sender_id=msg.sender_id,
+                    timestamp=msg.timestamp,
+                    is_read=read_states[msg.chat_id].is_read(
+                        sender_id=msg.sender_id, message_id=msg.id
+                    ),
+                    is_edited=msg.is_edited,
+                    edited_at=msg.edited_at,
+                    sender=sender_info,
+                )
+                results.append(
+                    MessageSearchHit(
+                        message=message_with_sender, snippet=excerpt, rank=rank
+                    )
+                )
+
+            next_cursor = None
+            if has_more and hits:
+                last_msg, last_rank, _ = hits[-1]
+                next_cursor = encode_cursor(last_rank, last_msg.id)
+
+            logger.info(
+                f"Message search by user {user_id} returned {len(results)} results"
+            )
+
+            return MessageSearchResponse(
+                results=results, has_more=has_more, next_cursor=next_cursor
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error searching messages for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error searching messages",
+            )
+
+    def search_chats(
+        self,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> ChatSearchResponse:
+        """
+        Search the titles of the user's chats, best match first.
+        """
+        try:
+            self._validate_query(query)
+            after_key = self._decode_search_cursor(cursor)
+
+            hits, has_more = chat.search_chats_page(
+                self.db, user_id=user_id, query=query, limit=limit, after=after_key
+            )
+
+            next_cursor = None
+            if has_more and hits:
+                last_chat, last_rank = hits[-1]
+                next_cursor = encode_cursor(last_rank, last_chat.id)
+
+            logger.info(f"Chat search by user {user_id} returned {len(hits)} results")
+
+            return ChatSearchResponse(
+                chats=[ChatResponse.model_validate(chat_obj) for chat_obj, _ in hits],
+                has_more=has_more,
+                next_cursor=next_cursor,
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error searching chats for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error searching chats",
+            )
+
+    @staticmethod
+    def _validate_query(query: str) -> None:
+        if build_match_query(query) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search query must contain at least one word",
+            )
+
+    @staticmethod
+    def _decode_search_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+        """
+        Decode a search cursor into its (rank, id) key.
+        """
+        if not cursor:
+            return None
+        try:
+            rank, item_id = decode_cursor(cursor, float, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return rank, item_id
@@ -0,0 +1,189 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from db import change_log as kinds
+from db.crud import change_log, chat_read
+from db.models import ChangeLog
+from schemas.message import MessageWithSender
+from schemas.sync import SyncChange, SyncResponse
+from schemas.user import UserInChat
+from core.logger import get_logger
+from core.cursor import encode_cursor, decode_cursor
+from fastapi import HTTPException, status
+
+logger = get_logger("sync_service")
+
+_MESSAGE_KINDS = (kinds.MESSAGE, kinds.MESSAGE_EDITED, kinds.MESSAGE_DELETED)
+
+
+class SyncService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_changes(
+        self, user_id: int, since: Optional[str] = None, limit: int = 500
+    ) -> SyncResponse:
+        """
+        Get the changes in the user's chats after the ``since`` cursor, one
+        page of at most ``limit`` change-log entries at a time.
+
+        Without ``since`` no changes are returned, only the cursor of the
+        present: clients fetch their chats first, then sync from there.
+        """
+        try:
+            if not since:
+                return SyncResponse(
+                    changes=[], next_cursor=encode_cursor(change_log.get_head(self.db))
+                )
+            since_id = self._decode_sync_cursor(since)
+
+            # Changes the client hasn't seen have been pruned
+            oldest_id = change_log.get_oldest_id(self.db)
+            if oldest_id is not None and since_id < oldest_id - 1:
+                return self._reset(user_id)
+
+            # Read before the page: every change up to the head has been
+            # committed, so one the page doesn't return isn't the user's
+            head = change_log.get_head(self.db)
+            # A cursor from the future belongs to another database
+            if since_id > head:
+                return self._reset(user_id)
+
+            entries = change_log.get_changes(
+                self.db, user_id=user_id, after_id=since_id, limit=limit + 1
+            )
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+
+            if not entries:
+                # Move the cursor past other users' changes, so the next
+                # sync doesn't scan them again
+                return SyncResponse(changes=[], next_cursor=encode_cursor(head))
+
+            changes = self._build_changes(user_id, self._collapse(entries))
+
+            logger.info(
+                f"Synced {len(changes)} changes ({len(entries)} entries) for user {user_id}"
+            )
+
+            next_id = entries[-1].id if has_more else max(entries[-1].id, head)
+            return SyncResponse(
+                changes=changes,
+                next_cursor=encode_cursor(next_id),
+                has_more=has_more,
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error syncing changes for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error syncing changes",
+            )
+
+    def _reset(self, user_id: int) -> SyncResponse:
+        logger.info(f"Sync cursor of user {user_id} is too old, asking for a reset")
+        return SyncResponse(
+            changes=[],
+            next_cursor=encode_cursor(change_log.get_head(self.db)),
+            reset=True,
+        )
+
+    @staticmethod
+    def _collapse(entries: List[ChangeLog]) -> List[Tuple[str, ChangeLog]]:
+        """
+        Fold repeated changes to the same thing within a page into its last
+        one, as (kind, entry) in the order of those last changes. A message
+        both sent and edited in the page is reported as new.
+        """
+        latest: Dict[Tuple, Tuple[str, ChangeLog]] = {}
+        for entry in entries:
+            kind = entry.kind
+            if kind in _MESSAGE_KINDS:
+                key = (kinds.MESSAGE, entry.entity_id)
+                previous = latest.pop(key, None)
+                if (
+                    kind == kinds.MESSAGE_EDITED
+                    and previous is not None
+                    and previous[0] == kinds.MESSAGE
+                ):
+                    kind = kinds.MESSAGE
+            elif kind == kinds.READ:
+                key = (kind, entry.chat_id, entry.entity_id)
+                latest.pop(key, None)
+            elif kind == kinds.CHAT_UPDATED:
+                key = (kind, entry.chat_id)
+                latest.pop(key, None)
+            else:
+                # Membership changes are all kept, in order
+                key = (kind, entry.id)
+            latest[key] = (kind, entry)
+        return list(latest.values())
+
+    def _build_changes(
+        self, user_id: int, collapsed: List[Tuple[str, ChangeLog]]
+    ) -> List[SyncChange]:
+        # New and edited messages are sent as they are now, in one query
+        message_ids = [
+            entry.entity_id
+            for kind, entry in collapsed
+            if kind in (kinds.MESSAGE, kinds.MESSAGE_EDITED)
+        ]
+        messages = {
+            msg.id: msg
+            for msg in change_log.get_messages(self.db, message_ids=message_ids)
+        }
+        read_states = chat_read.get_read_states(
+            self.db,
+            chat_ids=list({msg.chat_id for msg in messages.values()}),
+            user_id=user_id,
+        )
+
+        changes = []
+        for kind, entry in collapsed:
+            change = SyncChange(kind=kind, chat_id=entry.chat_id)
+            if kind in (kinds.MESSAGE, kinds.MESSAGE_EDITED):
+                msg = messages.get(entry.entity_id)
+                if msg is None or msg.sender is None:
+                    # Deleted since; its tombstone comes in a later page
+                    continue
+                change.message_id = msg.id
+                change.message = MessageWithSender(
+                    id=msg.id,
+                    content=msg.content,
+                    message_type=msg.message_type,
+                    chat_id=msg.chat_id,
+                    sender_id=msg.sender_id,
+                    timestamp=msg.timestamp,
+                    is_read=read_states[msg.chat_id].is_read(
+                        sender_id=msg.sender_id, message_id=msg.id
+                    ),
+                    is_edited=msg.is_edited,
+                    edited_at=msg.edited_at,
+                    sender=UserInChat(
+                        id=msg.sender.id,
+                        username=msg.sender.username,
+                        full_name=msg.sender.full_name or "",
+                        is_active=msg.sender.is_active,
+                    ),
+                )
+            elif kind == kinds.MESSAGE_DELETED:
+                change.message_id = entry.entity_id
+            elif kind == kinds.READ:
+                change.user_id = entry.entity_id
+                change.last_read_message_id = entry.value
+            elif kind in (kinds.MEMBER_ADDED, kinds.MEMBER_REMOVED):
+                change.user_id = entry.entity_id
+            changes.append(change)
+        return changes
+
+    @staticmethod
+    def _decode_sync_cursor(cursor: str) -> int:
+        """
+        Decode a sync cursor into the id of the last change seen.
+        """
+        try:
+            (change_id,) = decode_cursor(cursor, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return change_id
@@ -0,0 +1,287 @@
+"""
+WebSocket (and Server-Sent Events) wire protocols.
+
+Clients pick an encoding with the ``Sec-WebSocket-Protocol`` header:
+
+* ``pz.v1.json`` - one JSON object per text frame
+* ``pz.v1.msgpack`` - the same objects as MessagePack, one per binary frame
+* none - the legacy text protocol (``<user_id>_<chat_id>_<to>_<content>``
+  in, ``<username>: <content>`` out), which only carries chat messages
+
+A v1 frame is either one event, ``{"v": 1, "type": "message", ...}``, or a
+batch, ``{"v": 1, "type": "batch", "events": [{"type": ...}, ...]}``.
+Clients send ``message``, ``typing`` and ``read`` events; the server sends
+those plus ``ack``, ``notice``, ``catchup`` and ``error``. Either side may send ``ping``,
+which the other answers with ``pong``; the server drops connections that
+stay silent after its ping. When several events are
+waiting for a connection they go out as one batch frame.
+
+``GET /v1/chat/stream`` carries the same server events as Server-Sent
+Events: ``event: <type>`` with the v1 JSON object as its data. Message
+and catchup events carry the (highest) message id as their SSE id, which
+the client sends back as ``Last-Event-ID`` to resume after a reconnect.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Union
+
+import msgpack
+
+PROTOCOL_VERSION = 1
+
+Event = Dict[str, Any]
+Frame = Union[str, bytes]
+
+# Required fields (and their types) of each event type a client may send
+CLIENT_EVENTS = {
+    "message": {"chat_id": int, "content": str},
+    "typing": {"chat_id": int, "to": int},
+    "read": {"chat_id": int, "to": int},
+    "ping": {},
+    "pong": {},
+}
+# Fields a client event may leave out
+OPTIONAL_EVENT_FIELDS = {
+    # Messages go to every participant of the chat; "to" is not needed
+    "message": {"to": int, "message_type": str},
+    "read": {"message_id": int},
+}
+
+
+# Bounds on what a client's MessagePack frame may hold: a batch is its
+# only array, events have a handful of fields, and message content is at
+# most 4000 characters (4 bytes each in UTF-8)
+MSGPACK_LIMITS = {
+    "max_array_len": 1024,
+    "max_map_len": 32,
+    "max_str_len": 16000,
+    "max_bin_len": 16000,
+    "max_ext_len": 0,
+}
+
+
+class FrameError(ValueError):
+    """A frame that can't be decoded, or an event that isn't valid."""
+
+
+def validate_client_event(event: Any) -> Event:
+    if not isinstance(event, dict):
+        raise FrameError("Event must be an object")
+    event_type = event.get("type")
+    fields = CLIENT_EVENTS.get(event_type)
+    if fields is None:
+        raise FrameError(f"Unknown event type: {event_type!r}")
+    for name, expected in fields.items():
+        value = event.get(name)
+        # bool is an int subclass; reject it where an id is expected
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise FrameError(f"{event_type} event needs {expected.__name__} {name!r}")
+    for name, expected in OPTIONAL_EVENT_FIELDS.get(event_type, {}).items():
+        value = event.get(name)
+        if name in event and (
+            not isinstance(value, expected) or isinstance(value, bool)
+        ):
+            raise FrameError(f"{event_type} event needs {expected.__name__} {name!r}")
+    # Optional client-chosen id, echoed back in the ack
+    if not isinstance(event.get("id", ""), (str, int)):
+        raise FrameError("Event id must be a string or an integer")
+    return event
+
+
+def message_event(message: Any) -> Event:
+    """
+    A stored message as a ``message`` event. Takes a ``MessageWithSender``
+    or a ``Message`` with its sender loaded.
+    """
+    return {
+        "type": "message",
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "from": message.sender_id,
+        "username": message.sender.username,
+        "content": message.content,
+        "message_type": message.message_type,
+        "timestamp": message.timestamp.isoformat(),
+    }
+
+
+class WireProtocol(ABC):
+    """Turns queued events into frames and received frames into events."""
+
+    # Negotiated subprotocol name ("sse" for event streams); None for the
+    # legacy protocol
+    name: Optional[str] = None
+    # Whether clients answer ping events
+    heartbeats = False
+
+    @abstractmethod
+    def encode(self, events: List[Event]) -> List[Frame]:
+        """Frames carrying the events, in order."""
+
+    @abstractmethod
+    def decode(self, message: Dict[str, Any]) -> List[Event]:
+        """Events in an ASGI ``websocket.receive`` message."""
+
+
+class LegacyTextProtocol(WireProtocol):
+    def encode(self, events: List[Event]) -> List[Frame]:
+        frames = []
+        for event in events:
+            if event["type"] == "message":
+                frames.append(f"{event['username']}: {event['content']}")
+            elif event["type"] == "notice":
+                frames.append(event["text"])
+            elif event["type"] == "catchup":
+                frames.extend(
+                    f"{message['username']}: {message['content']}"
+                    for message in event["messages"]
+                )
+            # Other event types have no legacy form
+        return frames
+
+    def decode(self, message: Dict[str, Any]) -> List[Event]:
+        text = message.get("text")
+        if text is None:
+            raise FrameError("Expected a text frame")
+        # The content is the last field and may itself contain underscores
+        parts = text.split("_", 3)
+        if len(parts) != 4:
+            raise FrameError("Expected <user_id>_<chat_id>_<to>_<content>")
+        try:
+            sender_id, chat_id, to = (int(part) for part in parts[:3])
+        except ValueError:
+            raise FrameError("user_id, chat_id and to must be integers")
+        return [
+            {
+                "type": "message",
+                "from": sender_id,
+                "chat_id": chat_id,
+                "to": to,
+                "content": parts[3],
+            }
+        ]
+
+
+class _VersionedProtocol(WireProtocol):
+    heartbeats = True
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> Frame:
+        """One object as a frame."""
+
+    @abstractmethod
+    def loads(self, message: Dict[str, Any]) -> Any:
+        """The object in an ASGI ``websocket.receive`` message."""
+
+    def encode(self, events: List[Event]) -> List[Frame]:
+        if not events:
+            return []
+        if len(events) == 1:
+            return [self.dumps({"v": PROTOCOL_VERSION, **events[0]})]
+        return [self.dumps({"v": PROTOCOL_VERSION, "type": "batch", "events": events})]
+
+    def decode(self, message: Dict[str, Any]) -> List[Event]:
+        frame = self.loads(message)
+        if not isinstance(frame, dict):
+            raise FrameError("Frame must be an object")
+        if frame.get("v") != PROTOCOL_VERSION:
+            raise FrameError(f"Unsupported protocol version: {frame.get('v')!r}")
+        if frame.get("type") == "batch":
+            events = frame.get("events")
+            if not isinstance(events, list):
+                raise FrameError("batch frame needs a list of 'events'")
+            return [validate_client_event(event) for event in events]
+        return [validate_client_event(frame)]
+
+
+class JSONProtocol(_VersionedProtocol):
+    name = "pz.v1.json"
+
+    def dumps(self, obj: Any) -> Frame:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(self, message: Dict[str, Any]) -> Any:
+        data = message.get("text")
+        if data is None:
+            data = message.get("bytes") or b""
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FrameError(f"Invalid JSON: {e}")
+        except RecursionError:
+            raise FrameError("Invalid JSON: nested too deeply")
+
+
+class MsgpackProtocol(_VersionedProtocol):
+    name = "pz.v1.msgpack"
+
+    def dumps(self, obj: Any) -> Frame:
+        return msgpack.packb(obj)
+
+    def loads(self, message: Dict[str, Any]) -> Any:
+        data = message.get("bytes")
+        if data is None:
+            raise FrameError("Expected a binary frame")
+        try:
+            # Every unpacking error, including nesting deeper than the
+            # unpacker's stack and non-string map keys, is a ValueError
+            return msgpack.unpackb(
+                data, raw=False, strict_map_key=True, **MSGPACK_LIMITS
+            )
+        except ValueError as e:
+            raise FrameError(f"Invalid MessagePack: {e or type(e).__name__}")
+
+
+class SSEProtocol(WireProtocol):
+    """Server-Sent Events; all queued events go out in one chunk."""
+
+    name = "sse"
+
+    def encode(self, events: List[Event]) -> List[Frame]:
+        chunks = []
+        for event in events:
+            lines = []
+            event_id = sse_event_id(event)
+            if event_id is not None:
+                lines.append(f"id: {event_id}")
+            lines.append(f"event: {event['type']}")
+            # Compact JSON never contains a newline, so one data line will do
+            data = json.dumps(
+                {"v": PROTOCOL_VERSION, **event},
+                separators=(",", ":"),
+                ensure_ascii=False,
+            )
+            lines.append(f"data: {data}")
+            chunks.append("\n".join(lines) + "\n\n")
+        return ["".join(chunks)] if chunks else []
+
+    def decode(self, message: Dict[str, Any]) -> List[Event]:
+        raise FrameError("Event streams are send-only")
+
+
+def sse_event_id(event: Event) -> Optional[int]:
+    """
+    The SSE id of an event: the id of the newest message it carries.
+    Events without messages leave the client's last event id as it is.
+    """
+    if event["type"] == "message":
+        return event["id"]
+    if event["type"] == "catchup" and event["messages"]:
+        return event["messages"][-1]["id"]
+    return None
+
+
+SUBPROTOCOLS = {
+    protocol.name: protocol for protocol in (JSONProtocol(), MsgpackProtocol())
+}
+LEGACY_PROTOCOL = LegacyTextProtocol()
+SSE_PROTOCOL = SSEProtocol()
+
+
+def negotiate_protocol(offered: List[str]) -> WireProtocol:
+    """The first subprotocol the client offered that we speak, else legacy."""
+    for name in offered:
+        if name in SUBPROTOCOLS:
+            return SUBPROTOCOLS[name]
+    return LEGACY_PROTOCOL
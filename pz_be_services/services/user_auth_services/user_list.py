@@ -1,19 +1,132 @@
+import json
+import threading
+import uuid
+from bisect import bisect_right
+from typing import Iterator, List, NamedTuple, Optional
 from sqlalchemy.orm import Session
 from db.crud import user
-from schemas.user import UsernamesListResponse
+from db.table_versions import USERS, get_table_version
+from db.user_changes import users_version
+from schemas.user import UsernamesListResponse, UserInChat, UserSearchResponse
+from services.user_auth_services.user_search import user_search_index
+from core.cursor import encode_cursor, decode_cursor
 from core.logger import get_logger
+from fastapi import HTTPException, status
 
 logger = get_logger("user_list")
 
+# Usernames per chunk of a streamed full list
+USERNAMES_STREAM_CHUNK = 1000
+
+# Where the database keeps no table versions, each process counts user
+# changes on its own; this keeps those counts distinct between processes
+_ETAG_EPOCH = uuid.uuid4().hex[:12]
+
+
+class UsernamesSnapshot(NamedTuple):
+    version: str
+    etag: str
+    # Active usernames, sorted
+    usernames: List[str]
+
+
+_snapshot: Optional[UsernamesSnapshot] = None
+_snapshot_lock = threading.Lock()
+
 
 class UserListService:
     def __init__(self, db: Session):
         self.db = db
 
+    def users_version(self) -> str:
+        """
+        Version of the users table: the one stored in the database, which
+        every worker sees change, or else this process's own count.
+        """
+        stored = get_table_version(self.db, USERS)
+        if stored is not None:
+            return str(stored)
+        return f"{_ETAG_EPOCH}-{users_version()}"
+
+    def get_usernames_snapshot(self) -> UsernamesSnapshot:
+        """
+        The sorted active usernames, loaded once per change to the users
+        table and shared between requests.
+        """
+        global _snapshot
+        # Read in the same transaction as a reload below, so the version
+        # and the usernames match
+        version = self.users_version()
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with _snapshot_lock:
+            if _snapshot is not None and _snapshot.version == version:
+                return _snapshot
+            usernames = sorted(user.get_all_usernames(self.db))
+            _snapshot = UsernamesSnapshot(
+                version=version,
+                etag=f'W/"usernames-{version}"',
+                usernames=usernames,
+            )
+            logger.info(f"Loaded {len(usernames)} usernames (version {version})")
+            return _snapshot
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison)"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in tags
+
+    @staticmethod
+    def stream_usernames(snapshot: UsernamesSnapshot) -> Iterator[bytes]:
+        """Encode the whole snapshot as a ``UsernamesListResponse``, chunk by chunk"""
+        usernames = snapshot.usernames
+        yield b'{"usernames":['
+        for start in range(0, len(usernames), USERNAMES_STREAM_CHUNK):
+            chunk = json.dumps(
+                usernames[start : start + USERNAMES_STREAM_CHUNK],
+                separators=(",", ":"),
+            )[1:-1]
+            yield (chunk if start == 0 else "," + chunk).encode("utf-8")
+        yield (
+            f'],"total_count":{len(usernames)},'
+            f'"has_more":false,"next_cursor":null}}'
+        ).encode("utf-8")
+
+    @staticmethod
+    def get_usernames_page(
+        snapshot: UsernamesSnapshot, limit: int, cursor: Optional[str] = None
+    ) -> UsernamesListResponse:
+        """Usernames after ``cursor`` in alphabetical order"""
+        start = 0
+        if cursor:
+            try:
+                (after,) = decode_cursor(cursor, str)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+                )
+            start = bisect_right(snapshot.usernames, after)
+
+        page = snapshot.usernames[start : start + limit]
+        has_more = start + limit < len(snapshot.usernames)
+        return UsernamesListResponse(
+            usernames=page,
+            total_count=len(snapshot.usernames),
+            has_more=has_more,
+            next_cursor=encode_cursor(page[-1]) if has_more and page else None,
+        )
+
     def get_all_usernames(self) -> UsernamesListResponse:
         """Get all usernames from active users"""
         try:
-            usernames = user.get_all_usernames(self.db)
+            usernames = self.get_usernames_snapshot().usernames
             logger.info(f"Retrieved {len(usernames)} usernames")
 
             response = UsernamesListResponse(
@@ -23,3 +136,28 @@ class UserListService:
         except Exception as e:
             logger.error(f"Error retrieving usernames: {str(e)}")
             raise e
+
+    def search_users(self, query: str, limit: int = 10) -> UserSearchResponse:
+        """Autocomplete active users by username, full name or email prefix"""
+        if not query.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search query must contain at least one character",
+            )
+        # Built at startup (or here, if this process skipped that), then
+        # brought up to date with changes other workers committed
+        user_search_index.refresh_from_db(self.db)
+
+        hits = user_search_index.search(query, limit=limit)
+        logger.info(f"User search returned {len(hits)} results")
+        return UserSearchResponse(
+            users=[
+                UserInChat(
+                    id=user_id,
+                    username=username,
+                    full_name=full_name or "",
+                    is_active=True,
+                )
+                for user_id, username, full_name in hits
+            ]
+        )
@@ -0,0 +1,433 @@
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.models import User
+from db.table_versions import USERS, get_changed_rows, get_table_version
+from db.user_changes import UserChange, on_users_changed
+from core.logger import get_logger
+
+logger = get_logger("user_search")
+
+# Match tiers, best first
+EXACT_USERNAME, USERNAME, FULL_NAME, EMAIL = 0, 1, 2, 3
+
+_TIER_SHIFT = 8 + 48
+_WORD = re.compile(r"\w+")
+
+# Entries per storage block; blocks split at twice this size
+BLOCK_SIZE = 1024
+
+
+def _query_terms(query: str) -> List[str]:
+    return query.lower().split()
+
+
+def _score(tier: int, username: str) -> int:
+    """
+    Pack a match's rank into one integer so a range can be ranked with
+    ``heapq`` alone: tier, then username length, then the first eight
+    characters of the username.
+    """
+    score = (tier << 8) | min(len(username), 255)
+    for char in username.lower()[:8].ljust(8):
+        score = (score << 6) | (ord(char) & 63)
+    return score
+
+
+def _entry(key: str, user_id: int) -> str:
+    # "\x00" sorts before every character, so a key's own entries come
+    # first in its prefix range and equal keys are ordered by user id
+    return f"{key}\x00{user_id:012d}"
+
+
+def _after(prefix: str) -> str:
+    """The smallest string greater than every string starting with ``prefix``"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class _Block:
+    __slots__ = ("entries", "ids", "scores")
+
+    def __init__(self, entries: List[str], ids: array, scores: array):
+        self.entries = entries
+        self.ids = ids
+        self.scores = scores
+
+
+class UserSearchIndex:
+    """
+    In-memory prefix index for user autocomplete.
+
+    Every active user is indexed under their lowercased username, each word
+    of their full name and the local part of their email. Keys are kept
+    sorted, with each match's rank in a parallel array, so a prefix lookup
+    is a binary search plus a top-k over the matching range. Storage is
+    split into blocks of about ``BLOCK_SIZE`` entries so that an update
+    shifts one small block instead of the whole index.
+
+    Short prefixes match too much of the index to rank on every keystroke,
+    so their top results are kept and updated in place as users change.
+
+    Commits through this process's ORM are applied as they happen; those
+    made elsewhere are picked up by ``refresh_from_db`` from the stored
+    users version (see ``db.table_versions``).
+    """
+
+    def __init__(self, memo_threshold: int = 512, max_results: int = 50):
+        self.memo_threshold = memo_threshold
+        self.max_results = max_results
+        self._lock = threading.RLock()
+        self._blocks: List[_Block] = []
+        # First entry of each block, for locating the block of a key
+        self._firsts: List[str] = []
+        # user_id -> (username, full_name) of indexed (active) users
+        self._users: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._user_keys: Dict[int, List[Tuple[str, int]]] = {}
+        # prefix -> best (score, user_id) pairs, best first
+        self._memo: Dict[str, List[Tuple[int, int]]] = {}
+        self.ready = False
+        # Stored users version the index reflects; None where none is kept
+        self.version: Optional[int] = None
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @staticmethod
+    def _index_keys(
+        username: str, full_name: Optional[str], email: Optional[str]
+    ) -> List[Tuple[str, int]]:
+        keys = {username.lower(): USERNAME}
+        name = (full_name or "").lower()
+        for word in name.split() + _WORD.findall(name):
+            keys.setdefault(word, FULL_NAME)
+        if email:
+            keys.setdefault(email.split("@", 1)[0].lower(), EMAIL)
+        return sorted(keys.items())
+
+    def rebuild(
+        self, users: Iterable[Tuple[int, str, Optional[str], Optional[str]]]
+    ) -> None:
+        """Replace the index with ``(id, username, full_name, email)`` rows"""
+        entries = []
+        user_rows = {}
+        user_keys = {}
+        for user_id, username, full_name, email in users:
+            keys = self._index_keys(username, full_name, email)
+            user_rows[user_id] = (username, full_name)
+            user_keys[user_id] = keys
+            entries.extend(
+                (_entry(key, user_id), user_id, _score(tier, username))
+                for key, tier in keys
+            )
+        entries.sort()
+
+        blocks = []
+        for start in range(0, len(entries), BLOCK_SIZE):
+            chunk = entries[start : start + BLOCK_SIZE]
+            blocks.append(
+                _Block(
+                    [entry for entry, _, _ in chunk],
+                    array("q", [user_id for _, user_id, _ in chunk]),
+                    array("q", [score for _, _, score in chunk]),
+                )
+            )
+
+        with self._lock:
+            self._blocks = blocks
+            self._firsts = [block.entries[0] for block in blocks]
+            self._users = user_rows
+            self._user_keys = user_keys
+            self._memo = {}
+            # The first keystrokes match the largest ranges; rank them now
+            # rather than on the first searches
+            short = {entry[:n] for entry, _, _ in entries for n in (1, 2)}
+            for prefix in sorted(short):
+                if "\x00" not in prefix:
+                    self._ranked(prefix, [])
+            self.ready = True
+
+    def rebuild_from_db(self, db: Session) -> int:
+        """Build the index from the active users in the database"""
+        started = time.perf_counter()
+        # Read first: a change committed while loading moves the version on,
+        # so the next refresh applies it again
+        version = get_table_version(db, USERS)
+        rows = db.execute(
+            select(User.id, User.username, User.full_name, User.email)
+            .where(User.is_active)
+            .execution_options(yield_per=10000)
+        )
+        self.rebuild(tuple(row) for row in rows)
+        self.version = version
+        logger.info(
+            f"Indexed {len(self)} users for search in {time.perf_counter() - started:.2f}s"
+        )
+        return len(self)
+
+    def refresh_from_db(self, db: Session) -> None:
+        """
+        Bring the index up to the stored users version: reload the users
+        changed since the version it reflects, or rebuild it if those
+        changes are no longer all recorded.
+        """
+        version = get_table_version(db, USERS)
+        if self.ready and (version is None or version == self.version):
+            return
+        with self._refresh_lock:
+            if not self.ready:
+                self.rebuild_from_db(db)
+                return
+            # Another search may have refreshed while this one waited
+            version = get_table_version(db, USERS)
+            if version is None or version == self.version:
+                return
+            user_ids = (
+                None
+                if self.version is None
+                else get_changed_rows(db, USERS, after=self.version, up_to=version)
+            )
+            if user_ids is None:
+                self.rebuild_from_db(db)
+                return
+
+            rows = {
+                row.id: row
+                for row in db.execute(
+                    select(User.id, User.username, User.full_name, User.email).where(
+                        User.id.in_(user_ids), User.is_active
+                    )
+                )
+            }
+            for user_id in user_ids:
+                row = rows.get(user_id)
+                if row is None:
+                    self.remove(user_id)
+                else:
+                    self.upsert(user_id, row.username, row.full_name, row.email)
+            self.version = version
+            logger.info(
+                f"Refreshed {len(user_ids)} users in the search index (version {version})"
+            )
+
+    # Block storage
+
+    def _locate(self, entry: str) -> Tuple[int, int]:
+        """(block, offset) of the first stored entry not less than ``entry``"""
+        b = max(bisect_right(self._firsts, entry) - 1, 0)
+        if b >= len(self._blocks):
+            return b, 0
+        i = bisect_left(self._blocks[b].entries, entry)
+        if i == len(self._blocks[b].entries):
+            return b + 1, 0
+        return b, i
+
+    def _insert(self, entry: str, user_id: int, score: int) -> None:
+        if not self._blocks:
+            self._blocks.append(_Block([], array("q"), array("q")))
+            self._firsts.append(entry)
+        b, i = self._locate(entry)
+        if b == len(self._blocks):
+            b -= 1
+            i = len(self._blocks[b].entries)
+        block = self._blocks[b]
+        block.entries.insert(i, entry)
+        block.ids.insert(i, user_id)
+        block.scores.insert(i, score)
+        if i == 0:
+            self._firsts[b] = entry
+        if len(block.entries) >= 2 * BLOCK_SIZE:
+            tail = _Block(
+                block.entries[BLOCK_SIZE:],
+                block.ids[BLOCK_SIZE:],
+                block.scores[BLOCK_SIZE:],
+            )
+            del block.entries[BLOCK_SIZE:]
+            del block.ids[BLOCK_SIZE:]
+            del block.scores[BLOCK_SIZE:]
+            self._blocks.insert(b + 1, tail)
+            self._firsts.insert(b + 1, tail.entries[0])
+
+    def _delete(self, entry: str) -> None:
+        b, i = self._locate(entry)
+        if b == len(self._blocks) or self._blocks[b].entries[i] != entry:
+            return
+        block = self._blocks[b]
+        del block.entries[i]
+        del block.ids[i]
+        del block.scores[i]
+        if not block.entries:
+            del self._blocks[b]
+            del self._firsts[b]
+        elif i == 0:
+            self._firsts[b] = block.entries[0]
+
+    def _range(self, low: str, high: str) -> Iterator[Tuple[array, array]]:
+        """(scores, ids) slices of the entries in [low, high)"""
+        b, i = self._locate(low)
+        end_b, end_i = self._locate(high)
+        while b < end_b or (b == end_b and i < end_i):
+            block = self._blocks[b]
+            stop = end_i if b == end_b else len(block.entries)
+            yield block.scores[i:stop], block.ids[i:stop]
+            b, i = b + 1, 0
+
+    def _range_size(self, low: str, high: str) -> int:
+        b, i = self._locate(low)
+        end_b, end_i = self._locate(high)
+        if b == end_b:
+            return end_i - i
+        return sum(len(block.entries) for block in self._blocks[b:end_b]) - i + end_i
+
+    # Updates
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            for key, _ in self._user_keys.pop(user_id, []):
+                self._delete(_entry(key, user_id))
+                # A kept top list that loses a member can't be refilled in
+                # place; drop it and rank the range again on the next search
+                for end in range(1, len(key) + 1):
+                    kept = self._memo.get(key[:end])
+                    if kept is not None and any(uid == user_id for _, uid in kept):
+                        del self._memo[key[:end]]
+            self._users.pop(user_id, None)
+
+    def upsert(
+        self,
+        user_id: int,
+        username: str,
+        full_name: Optional[str],
+        email: Optional[str],
+    ) -> None:
+        with self._lock:
+            self.remove(user_id)
+            keys = self._index_keys(username, full_name, email)
+            best: Dict[str, int] = {}
+            for key, tier in keys:
+                score = _score(tier, username)
+                self._insert(_entry(key, user_id), user_id, score)
+                for end in range(1, len(key) + 1):
+                    prefix = key[:end]
+                    if prefix in self._memo:
+                        if tier == USERNAME and end == len(key):
+                            score = _score(EXACT_USERNAME, username)
+                        best[prefix] = min(score, best.get(prefix, score))
+            self._users[user_id] = (username, full_name)
+            self._user_keys[user_id] = keys
+
+            # Merge the user into the kept top lists their keys fall under
+            for prefix, score in best.items():
+                kept = self._memo[prefix]
+                insort(kept, (score, user_id))
+                del kept[self.max_results :]
+
+    def apply_changes(self, changes: List[UserChange]) -> None:
+        """Apply committed user changes (see ``db.user_changes``)"""
+        for change in changes:
+            if change.deleted or not change.is_active or not change.username:
+                self.remove(change.user_id)
+            else:
+                self.upsert(
+                    change.user_id, change.username, change.full_name, change.email
+                )
+
+    # Lookups
+
+    def _candidates(self, prefix: str) -> List[Tuple[int, int]]:
+        """(score, user_id) of every entry whose key starts with ``prefix``"""
+        candidates = []
+        # Keys equal to the prefix rank as exact username matches
+        for scores, ids in self._range(prefix + "\x00", prefix + "\x01"):
+            for score, user_id in zip(scores, ids):
+                if score >> _TIER_SHIFT == USERNAME:
+                    score -= (USERNAME - EXACT_USERNAME) << _TIER_SHIFT
+                candidates.append((score, user_id))
+        for scores, ids in self._range(prefix + "\x01", _after(prefix)):
+            candidates.extend(zip(scores, ids))
+        return candidates
+
+    def _matches_all(self, user_id: int, terms: List[str]) -> bool:
+        keys = self._user_keys[user_id]
+        return all(any(key.startswith(term) for key, _ in keys) for term in terms)
+
+    def _ranked(self, prefix: str, also: List[str]) -> List[Tuple[int, int]]:
+        """
+        Best (score, user_id) pairs of users with a key starting with
+        ``prefix`` (and keys starting with each of ``also``), best first.
+        """
+        if not also and prefix in self._memo:
+            return self._memo[prefix]
+
+        candidates = self._candidates(prefix)
+        matched = len(candidates)
+        # Narrow by the users under each other word whose range is small
+        # enough to collect; the rest are checked per user below
+        unchecked = []
+        for term in also:
+            if self._range_size(term, _after(term)) > 4 * len(candidates):
+                unchecked.append(term)
+                continue
+            users = set()
+            for _, ids in self._range(term, _after(term)):
+                users.update(ids)
+            candidates = [c for c in candidates if c[1] in users]
+
+        if unchecked:
+            # Pop in rank order until enough users match the other words
+            heapq.heapify(candidates)
+            pool = (heapq.heappop(candidates) for _ in range(len(candidates)))
+        else:
+            # A user has a handful of keys at most, so this many entries
+            # nearly always cover max_results distinct users
+            pool = heapq.nsmallest(self.max_results * 4, candidates)
+
+        ranked = []
+        seen = set()
+        for score, user_id in pool:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            if unchecked and not self._matches_all(user_id, unchecked):
+                continue
+            ranked.append((score, user_id))
+            if len(ranked) >= self.max_results:
+                break
+
+        if not also and matched >= self.memo_threshold:
+            self._memo[prefix] = ranked
+        return ranked
+
+    def search(
+        self, query: str, limit: int = 10
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """
+        Top ``limit`` active users matching every word of ``query`` as a
+        prefix, as (id, username, full_name). Exact username matches come
+        first, then username, full name and email prefix matches; shorter
+        usernames rank higher within a tier.
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        # Rank on the longest word (the narrowest range), filter on the rest
+        terms.sort(key=len, reverse=True)
+        first, rest = terms[0], terms[1:]
+
+        with self._lock:
+            return [
+                (user_id, *self._users[user_id])
+                for _, user_id in self._ranked(first, rest)[:limit]
+            ]
+
+
+user_search_index = UserSearchIndex()
+on_users_changed(user_search_index.apply_changes)
@@ -0,0 +1,59 @@
+"""
+Shared test setup. Imports are rooted at pz_be_services, as in the app,
+and the application's module-level engines point at a scratch database.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before anything imports core.config, so tests never touch ProjectX.db
+_scratch_dir = tempfile.mkdtemp(prefix="pz_test_")
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{_scratch_dir}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+# Placeholders so the routers package (and its AI client) imports
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test-key")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.invalid")
+
+import db.models  # noqa: E402,F401  (creates the tables)
+from db.crud import chat, user  # noqa: E402
+from db.database import SessionLocal  # noqa: E402
+from schemas.chat import ChatCreateModel  # noqa: E402
+from schemas.user import UserCreate  # noqa: E402
+
+_usernames = (f"user{n}" for n in itertools.count(1))
+
+
+@pytest.fixture
+def session():
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def make_user(session):
+    """Create a user with a fresh username."""
+
+    def make():
+        username = next(_usernames)
+        return user.create(
+            session, obj_in=UserCreate(username=username, full_name=username.title())
+        )
+
+    return make
+
+
+@pytest.fixture
+def private_chat(session, make_user):
+    """A private chat between two new users: (chat, user1, user2)."""
+    user1, user2 = make_user(), make_user()
+    new_chat, _ = chat.get_or_create_private_chat(
+        session, obj_in=ChatCreateModel(), user1_id=user1.id, user2_id=user2.id
+    )
+    return new_chat, user1, user2
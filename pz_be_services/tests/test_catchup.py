@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+from db.models import Message
+from services.chat_services.connection_manager import ConnectionManager
+from services.chat_services.pubsub import InProcessPubSub
+from services.chat_services.ws_protocol import SUBPROTOCOLS, message_event
+
+JSON_PROTOCOL = SUBPROTOCOLS["pz.v1.json"]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        self.frames.append(json.loads(data))
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+class MultiWorkerPubSub(InProcessPubSub):
+    """As a transport shared with other workers looks to this one."""
+
+    single_process = False
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def send(session, chat_id, sender_id, count=1):
+    messages = [
+        Message(chat_id=chat_id, sender_id=sender_id, content=f"m{i}")
+        for i in range(count)
+    ]
+    session.add_all(messages)
+    session.commit()
+    for message in messages:
+        session.refresh(message)
+    return messages
+
+
+async def publish(manager, message, user_id):
+    await manager.send_event(user_id, message_event(message))
+
+
+async def received(websocket):
+    # Let the connection's writer task run
+    await asyncio.sleep(0.05)
+    return websocket.frames
+
+
+@pytest.mark.anyio
+async def test_catchup_stops_at_messages_published_after_connecting(
+    session, private_chat
+):
+    chat, user1, user2 = private_chat
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    await manager.start()
+    try:
+        first, second = send(session, chat.id, user1.id, count=2)
+        # The second is committed, but not yet published when user2 connects
+        manager.last_message_id = first.id
+        websocket = FakeWebSocket()
+        await manager.connect(
+            websocket, user2.id, user2.username, JSON_PROTOCOL, last_event_id=0
+        )
+        await publish(manager, second, user2.id)
+
+        frames = await received(websocket)
+        events = frames[0]["events"] if frames[0]["type"] == "batch" else frames
+        assert [event["type"] for event in events] == ["catchup", "message"]
+        assert [m["id"] for m in events[0]["messages"]] == [first.id]
+        assert events[1]["id"] == second.id
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.anyio
+async def test_offline_cursors_are_kept_for_a_single_process(session, private_chat):
+    chat, user1, user2 = private_chat
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    await manager.start()
+    try:
+        (missed,) = send(session, chat.id, user1.id)
+        await publish(manager, missed, user2.id)
+        assert len(manager.offline) == 1
+
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, user2.id, user2.username, JSON_PROTOCOL)
+        (catchup,) = await received(websocket)
+        assert [m["id"] for m in catchup["messages"]] == [missed.id]
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.anyio
+async def test_no_offline_cursors_with_other_workers(session, private_chat):
+    chat, user1, user2 = private_chat
+    manager = ConnectionManager(MultiWorkerPubSub(), ping_interval=0)
+    await manager.start()
+    try:
+        (missed,) = send(session, chat.id, user1.id)
+        # user2 may well be connected to another worker
+        await publish(manager, missed, user2.id)
+        assert len(manager.offline) == 0
+        assert manager.last_message_id == missed.id
+
+        # ... and resumes from the last message it saw there
+        websocket = FakeWebSocket()
+        await manager.connect(
+            websocket,
+            user2.id,
+            user2.username,
+            JSON_PROTOCOL,
+            last_event_id=missed.id - 1,
+        )
+        (catchup,) = await received(websocket)
+        assert [m["id"] for m in catchup["messages"]] == [missed.id]
+    finally:
+        await manager.stop()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pytest
+
+from services.chat_services.connection_manager import (
+    ClientConnection,
+    ConnectionManager,
+)
+from services.chat_services.pubsub import InProcessPubSub
+from services.chat_services.ws_protocol import LEGACY_PROTOCOL, SUBPROTOCOLS
+
+JSON_PROTOCOL = SUBPROTOCOLS["pz.v1.json"]
+QUEUE_SIZE = 3
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        self.frames.append(json.loads(data))
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+    @property
+    def events(self):
+        events = []
+        for frame in self.frames:
+            events.extend(frame["events"] if frame["type"] == "batch" else [frame])
+        return events
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def connect(manager, overflow_policy="drop_oldest", user_id=1, protocol=JSON_PROTOCOL):
+    websocket = FakeWebSocket()
+    connection = manager.register(
+        ClientConnection(
+            websocket,
+            user_id,
+            f"user{user_id}",
+            protocol,
+            max_queue_size=QUEUE_SIZE,
+            overflow_policy=overflow_policy,
+            totals=manager.totals,
+        )
+    )
+    return connection, websocket
+
+
+def notice(n):
+    return {"type": "notice", "text": str(n)}
+
+
+async def flushed():
+    # Let the writer task and any close run
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.anyio
+async def test_drop_oldest_keeps_the_newest_events():
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    connection, websocket = connect(manager, "drop_oldest")
+
+    # Queued without yielding, so the writer can't drain any of them yet
+    for n in range(QUEUE_SIZE + 2):
+        connection.enqueue(notice(n))
+    stats = manager.get_connection_stats()
+    assert stats["dropped_messages"] == 2
+    assert stats["queued_messages"] == QUEUE_SIZE
+
+    await flushed()
+    assert [event["text"] for event in websocket.events] == ["2", "3", "4"]
+    assert manager.get_connection_stats()["queued_messages"] == 0
+    assert manager.connections_of(1) == [connection]
+
+
+@pytest.mark.anyio
+async def test_coalesce_replaces_the_queued_event_with_the_same_key():
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    connection, websocket = connect(manager, "coalesce")
+
+    connection.enqueue(notice("typing 1"), coalesce_key="typing")
+    connection.enqueue(notice("a"))
+    connection.enqueue(notice("typing 2"), coalesce_key="typing")
+    # Full, with no event to coalesce with: the oldest goes instead
+    connection.enqueue(notice("b"))
+    connection.enqueue(notice("c"))
+    stats = manager.get_connection_stats()
+    assert stats["coalesced_messages"] == 1
+    assert stats["dropped_messages"] == 1
+    assert connection.stats()["coalesced"] == 1
+
+    await flushed()
+    assert [event["text"] for event in websocket.events] == ["typing 2", "b", "c"]
+
+
+@pytest.mark.anyio
+async def test_disconnect_evicts_the_slow_consumer():
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    connection, websocket = connect(manager, "disconnect")
+
+    for n in range(QUEUE_SIZE):
+        assert connection.enqueue(notice(n))
+    assert not connection.enqueue(notice(QUEUE_SIZE))
+    stats = manager.get_connection_stats()
+    assert stats["evicted_connections"] == 1
+    # Whatever was still queued is lost with the connection
+    assert stats["dropped_messages"] == QUEUE_SIZE
+    assert stats["queued_messages"] == 0
+    assert stats["total_connections"] == 0
+
+    await flushed()
+    assert websocket.frames == []
+    assert websocket.close_code == 1013
+    assert manager.connections_of(1) == []
+
+
+@pytest.mark.anyio
+async def test_reaper_pings_quiet_connections_and_evicts_unresponsive_ones():
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=10, ping_timeout=5)
+    silent, silent_socket = connect(manager, user_id=1)
+    answering, answering_socket = connect(manager, user_id=2)
+    now = silent.last_seen = answering.last_seen
+
+    # Quiet for a ping interval: both are pinged, neither dropped
+    assert manager.reap(now=now + 10) == 0
+    await flushed()
+    assert [event["type"] for event in silent_socket.events] == ["ping"]
+    assert [event["type"] for event in answering_socket.events] == ["ping"]
+
+    # Only one answers (any frame from the client counts)
+    answering.last_seen = now + 11
+    assert manager.reap(now=now + 16) == 1
+    stats = manager.get_connection_stats()
+    assert stats["reaped_connections"] == 1
+    assert stats["evicted_connections"] == 1
+
+    await flushed()
+    assert silent_socket.close_code == 1001
+    assert manager.connections_of(1) == []
+    assert manager.connections_of(2) == [answering]
+    assert answering_socket.close_code is None
+
+
+@pytest.mark.anyio
+async def test_reaper_leaves_legacy_sockets_to_transport_pings():
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=10, ping_timeout=5)
+    connection, websocket = connect(manager, protocol=LEGACY_PROTOCOL)
+
+    assert manager.reap(now=connection.last_seen + 60) == 0
+    await flushed()
+    assert websocket.frames == []
+    assert manager.connections_of(1) == [connection]
+
+
+@pytest.mark.anyio
+async def test_connections_over_the_per_user_limit_close_the_oldest():
+    manager = ConnectionManager(
+        InProcessPubSub(), ping_interval=0, max_connections_per_user=2
+    )
+    oldest, oldest_socket = connect(manager)
+    second, _ = connect(manager)
+    newest, _ = connect(manager)
+
+    assert manager.connections_of(1) == [second, newest]
+    stats = manager.get_connection_stats()
+    assert stats["over_limit_connections"] == 1
+    assert stats["total_connections"] == 2
+    assert stats["total_users"] == 1
+
+    await flushed()
+    assert oldest_socket.close_code == 1008
+    # Other users are unaffected
+    other, _ = connect(manager, user_id=2)
+    assert manager.connections_of(2) == [other]
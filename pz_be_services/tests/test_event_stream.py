@@ -0,0 +1,110 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from db.models import Message
+from services.chat_services.connection_manager import ConnectionManager
+from services.chat_services.pubsub import InProcessPubSub
+from services.chat_services.ws_protocol import message_event
+
+# The package re-exports the router object under the module's name
+chat_router = importlib.import_module("routers.v1.chat_router")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    manager = ConnectionManager(InProcessPubSub(), ping_interval=0)
+    await manager.start()
+    monkeypatch.setattr(chat_router, "connection_manager", manager)
+    yield manager
+    await manager.stop()
+
+
+def send(session, chat_id, sender_id, count=1):
+    messages = [
+        Message(chat_id=chat_id, sender_id=sender_id, content=f"m{i}")
+        for i in range(count)
+    ]
+    session.add_all(messages)
+    session.commit()
+    for message in messages:
+        session.refresh(message)
+    return messages
+
+
+async def open_stream(user_row, last_event_id=None):
+    response = await chat_router.stream_events(
+        last_event_id=last_event_id,
+        current_user={"sub": str(user_row.id), "username": user_row.username},
+    )
+    return response.body_iterator
+
+
+async def next_event(body):
+    """The next SSE event on the stream, as a dict of its fields."""
+    chunk = await asyncio.wait_for(anext(body), 1)
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+@pytest.mark.anyio
+async def test_resume_with_last_event_id_catches_up_then_streams_live(
+    session, private_chat, manager
+):
+    chat, user1, user2 = private_chat
+    first, second, third = send(session, chat.id, user1.id, count=3)
+    # Published while the client was connected, before it dropped
+    manager.last_message_id = third.id
+
+    body = await open_stream(user2, last_event_id=str(first.id))
+    try:
+        catchup = await next_event(body)
+        assert catchup["event"] == "catchup"
+        assert [m["id"] for m in catchup["data"]["messages"]] == [second.id, third.id]
+        assert catchup["data"]["complete"] is True
+        # Reconnecting again would resume after the newest message it carried
+        assert catchup["id"] == str(third.id)
+
+        (live,) = send(session, chat.id, user1.id)
+        await manager.send_event(user2.id, message_event(live))
+        event = await next_event(body)
+        assert (event["event"], event["id"]) == ("message", str(live.id))
+    finally:
+        await body.aclose()
+    # Closing the response drops the stream from the registry
+    assert manager.connections_of(user2.id) == []
+
+
+@pytest.mark.anyio
+async def test_stream_without_last_event_id_has_no_catchup(
+    session, private_chat, manager
+):
+    chat, user1, user2 = private_chat
+    send(session, chat.id, user1.id, count=2)
+
+    body = await open_stream(user2)
+    try:
+        (live,) = send(session, chat.id, user1.id)
+        await manager.send_event(user2.id, message_event(live))
+        event = await next_event(body)
+        assert (event["event"], event["id"]) == ("message", str(live.id))
+    finally:
+        await body.aclose()
+
+
+@pytest.mark.anyio
+async def test_last_event_id_must_be_a_message_id(private_chat, manager):
+    _, _, user2 = private_chat
+    with pytest.raises(HTTPException) as rejected:
+        await open_stream(user2, last_event_id="not-an-id")
+    assert rejected.value.status_code == 400
+    assert manager.connections_of(user2.id) == []
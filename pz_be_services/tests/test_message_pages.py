@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from db.database import engine
+from db.models import Message
+from services.chat_services.message_service import MessageService
+
+
+@contextmanager
+def count_statements():
+    """Count the statements the engine executes inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", record)
+
+
+def add_messages(session, chat_id, sender_id, count):
+    start = datetime.now(timezone.utc)
+    session.add_all(
+        Message(
+            chat_id=chat_id,
+            sender_id=sender_id,
+            content=f"message {i}",
+            timestamp=start + timedelta(milliseconds=i),
+        )
+        for i in range(count)
+    )
+    session.commit()
+
+
+def test_page_query_count_does_not_grow_with_page_size(session, private_chat):
+    chat, user1, user2 = private_chat
+    add_messages(session, chat.id, user1.id, 250)
+    service = MessageService(session)
+
+    counts = {}
+    for limit in (1, 100):
+        first = service.get_chat_messages(chat.id, user2.id, limit=limit)
+        assert len(first.messages) == limit
+        with count_statements() as statements:
+            page = service.get_chat_messages(
+                chat.id, user2.id, limit=limit, after=first.next_cursor
+            )
+        assert len(page.messages) == limit
+        counts[limit] = len(statements)
+
+    assert counts[1] == counts[100]
+
+
+def test_first_page_query_count_does_not_grow_with_page_size(session, private_chat):
+    chat, user1, user2 = private_chat
+    add_messages(session, chat.id, user1.id, 100)
+    service = MessageService(session)
+    # Warm the membership cache, so both pages see it in the same state
+    service.get_chat_messages(chat.id, user2.id, limit=1)
+
+    counts = {}
+    for limit in (1, 100):
+        with count_statements() as statements:
+            page = service.get_chat_messages(chat.id, user2.id, limit=limit)
+        assert len(page.messages) == limit
+        counts[limit] = len(statements)
+
+    assert counts[1] == counts[100]
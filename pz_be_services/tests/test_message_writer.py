@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from db.crud import unread_counter
+from db.database import AsyncSessionLocal
+from db.models import Message
+from schemas.message import MessageCreate
+from services.chat_services.message_writer import MessageWriter
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class CountingSessions:
+    """A session factory that counts the transactions the writer opens."""
+
+    def __init__(self):
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return AsyncSessionLocal()
+
+
+def new_message(chat, sender, n):
+    return MessageCreate(chat_id=chat.id, sender_id=sender.id, content=f"m{n}")
+
+
+async def submit_all(writer, objs_in):
+    return await asyncio.gather(
+        *(writer.submit(obj_in) for obj_in in objs_in), return_exceptions=True
+    )
+
+
+@pytest.mark.anyio
+async def test_concurrent_sends_share_one_commit(session, private_chat):
+    chat, user1, user2 = private_chat
+    sessions = CountingSessions()
+    writer = MessageWriter(session_factory=sessions, flush_interval_ms=50)
+    try:
+        messages = await submit_all(
+            writer, [new_message(chat, user1, n) for n in range(10)]
+        )
+    finally:
+        await writer.stop()
+
+    assert sessions.opened == 1
+    # Each caller gets its own message back, in submission order
+    assert [m.content for m in messages] == [f"m{n}" for n in range(10)]
+    assert [m.id for m in messages] == sorted(m.id for m in messages)
+
+    session.refresh(chat)
+    assert chat.last_message_at is not None
+    assert session.query(Message).filter(Message.chat_id == chat.id).count() == 10
+    assert unread_counter.get_count(session, chat_id=chat.id, user_id=user2.id) == 10
+    assert unread_counter.get_count(session, chat_id=chat.id, user_id=user1.id) == 0
+
+
+@pytest.mark.anyio
+async def test_batches_are_capped_at_max_batch_size(session, private_chat):
+    chat, user1, _ = private_chat
+    sessions = CountingSessions()
+    writer = MessageWriter(
+        session_factory=sessions, max_batch_size=2, flush_interval_ms=50
+    )
+    try:
+        messages = await submit_all(
+            writer, [new_message(chat, user1, n) for n in range(5)]
+        )
+    finally:
+        await writer.stop()
+
+    assert sessions.opened == 3
+    assert all(isinstance(m, Message) for m in messages)
+
+
+@pytest.mark.anyio
+async def test_a_bad_row_only_fails_its_own_send(session, private_chat):
+    chat, user1, user2 = private_chat
+    # Skips validation, so the insert itself fails (content is NOT NULL)
+    bad = MessageCreate.model_construct(
+        chat_id=chat.id, sender_id=user1.id, content=None, message_type="text"
+    )
+    writer = MessageWriter(flush_interval_ms=50)
+    try:
+        first, failed, last = await submit_all(
+            writer, [new_message(chat, user1, 0), bad, new_message(chat, user1, 1)]
+        )
+    finally:
+        await writer.stop()
+
+    assert isinstance(failed, IntegrityError)
+    assert [first.content, last.content] == ["m0", "m1"]
+    assert session.query(Message).filter(Message.chat_id == chat.id).count() == 2
+    assert unread_counter.get_count(session, chat_id=chat.id, user_id=user2.id) == 2
@@ -0,0 +1,53 @@
+from sqlalchemy import false
+
+from db.crud import chat
+from schemas.chat import ChatCreateModel
+
+
+def deactivate(session, chat_row):
+    chat_row.is_active = False
+    session.commit()
+
+
+def test_deactivated_private_chat_is_reactivated(session, private_chat):
+    existing, user1, user2 = private_chat
+    deactivate(session, existing)
+    # Cache the inactive state, as a failed send would
+    assert not chat.get_access(session, chat_id=existing.id, user_id=user1.id).is_active
+
+    again, created = chat.get_or_create_private_chat(
+        session, obj_in=ChatCreateModel(), user1_id=user2.id, user2_id=user1.id
+    )
+
+    assert not created
+    assert again.id == existing.id
+    assert again.is_active
+    assert chat.get_access(session, chat_id=existing.id, user_id=user1.id).is_active
+
+
+def test_concurrently_created_inactive_chat_is_reactivated(
+    session, private_chat, monkeypatch
+):
+    existing, user1, user2 = private_chat
+    deactivate(session, existing)
+
+    # Miss the first lookup, as a request racing the pair's creation would,
+    # so the insert hits the pair's primary key
+    lookup = chat._private_chat_query
+    calls = []
+
+    def racing_lookup(user1_id, user2_id):
+        calls.append(user1_id)
+        query = lookup(user1_id, user2_id)
+        return query.where(false()) if len(calls) == 1 else query
+
+    monkeypatch.setattr(chat, "_private_chat_query", racing_lookup)
+
+    again, created = chat.get_or_create_private_chat(
+        session, obj_in=ChatCreateModel(), user1_id=user1.id, user2_id=user2.id
+    )
+
+    assert len(calls) == 2
+    assert not created
+    assert again.id == existing.id
+    assert again.is_active
@@ -0,0 +1,73 @@
+import pytest
+
+from core.cursor import decode_cursor
+from db.crud import change_log, chat
+from db.models import Message
+from schemas.chat import ChatCreateModel
+from services.chat_services.sync_service import SyncService
+
+
+def send(session, chat_id, sender_id):
+    session.add(Message(chat_id=chat_id, sender_id=sender_id, content="hi"))
+    session.commit()
+
+
+@pytest.fixture
+def other_chat(session, make_user):
+    """A chat the synced user isn't in."""
+    user1, user2 = make_user(), make_user()
+    new_chat, _ = chat.get_or_create_private_chat(
+        session, obj_in=ChatCreateModel(), user1_id=user1.id, user2_id=user2.id
+    )
+    return new_chat, user1
+
+
+def cursor_id(cursor):
+    (change_id,) = decode_cursor(cursor, int)
+    return change_id
+
+
+def test_empty_page_moves_the_cursor_to_the_head(session, private_chat, other_chat):
+    _, user1, _ = private_chat
+    elsewhere, sender = other_chat
+    service = SyncService(session)
+    since = service.get_changes(user1.id).next_cursor
+
+    send(session, elsewhere.id, sender.id)
+    page = service.get_changes(user1.id, since=since)
+
+    assert page.changes == []
+    assert cursor_id(page.next_cursor) == change_log.get_head(session)
+    assert cursor_id(page.next_cursor) > cursor_id(since)
+
+
+def test_last_page_moves_the_cursor_to_the_head(session, private_chat, other_chat):
+    mine, user1, user2 = private_chat
+    elsewhere, sender = other_chat
+    service = SyncService(session)
+    since = service.get_changes(user1.id).next_cursor
+
+    send(session, mine.id, user2.id)
+    send(session, elsewhere.id, sender.id)
+    page = service.get_changes(user1.id, since=since)
+
+    assert [change.kind for change in page.changes] == ["message"]
+    assert not page.has_more
+    assert cursor_id(page.next_cursor) == change_log.get_head(session)
+
+
+def test_full_page_stops_at_its_last_change(session, private_chat, other_chat):
+    mine, user1, user2 = private_chat
+    elsewhere, sender = other_chat
+    service = SyncService(session)
+    since = service.get_changes(user1.id).next_cursor
+
+    send(session, mine.id, user2.id)
+    send(session, mine.id, user2.id)
+    send(session, elsewhere.id, sender.id)
+    first = service.get_changes(user1.id, since=since, limit=1)
+    assert first.has_more
+    rest = service.get_changes(user1.id, since=first.next_cursor, limit=1)
+
+    assert len(first.changes) == len(rest.changes) == 1
+    assert first.changes[0].message_id != rest.changes[0].message_id
@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import update
+
+from db.crud import chat, chat_read, message, unread_counter
+from db.database import AsyncSessionLocal
+from db.models import ChatUnreadCounter
+from schemas.chat import ChatCreateModel
+from schemas.message import MessageCreate
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def group_chat(session, make_user):
+    """A group chat of three new users: (chat, [user1, user2, user3])."""
+    users = [make_user(), make_user(), make_user()]
+    new_chat = chat.create_with_participants(
+        session,
+        obj_in=ChatCreateModel(title="group", chat_type="group"),
+        participant_ids=[u.id for u in users],
+    )
+    return new_chat, users
+
+
+async def send(chat_id, *senders):
+    async with AsyncSessionLocal() as db:
+        return await message.create_many_with_chat_update_async(
+            db,
+            objs_in=[
+                MessageCreate(chat_id=chat_id, sender_id=sender.id, content="hi")
+                for sender in senders
+            ],
+        )
+
+
+def counters(session, chat_id, users):
+    return {
+        u.id: unread_counter.get_count(session, chat_id=chat_id, user_id=u.id)
+        for u in users
+    }
+
+
+def recount(session, chat_id, users):
+    """Unread counts counted from the messages past each read watermark."""
+    return {
+        u.id: chat_read.get_unread_count(session, chat_id=chat_id, user_id=u.id)
+        for u in users
+    }
+
+
+@pytest.mark.anyio
+async def test_counters_match_a_recount_as_messages_are_sent_read_and_deleted(
+    session, group_chat
+):
+    group, (alice, bob, carol) = group_chat
+
+    first, second, third = await send(group.id, alice, alice, bob)
+    assert counters(session, group.id, [alice, bob, carol]) == {
+        alice.id: 1,
+        bob.id: 2,
+        carol.id: 3,
+    }
+
+    # Part way, then all the way
+    chat_read.mark_read(
+        session, chat_id=group.id, user_id=carol.id, message_id=first.id
+    )
+    chat_read.mark_read(session, chat_id=group.id, user_id=bob.id)
+    assert counters(session, group.id, [alice, bob, carol]) == recount(
+        session, group.id, [alice, bob, carol]
+    )
+
+    await send(group.id, carol)
+    # Bob has read it already (but not carol's), carol hasn't
+    message.delete_message(session, message_id=second.id, user_id=alice.id)
+    expected = recount(session, group.id, [alice, bob, carol])
+    assert expected == {alice.id: 2, bob.id: 1, carol.id: 1}
+    assert counters(session, group.id, [alice, bob, carol]) == expected
+
+    unread_counter.rebuild(session)
+    assert counters(session, group.id, [alice, bob, carol]) == expected
+
+
+@pytest.mark.anyio
+async def test_rebuild_repairs_drifted_counters(session, private_chat):
+    private, user1, user2 = private_chat
+    await send(private.id, user1, user1, user2)
+    session.execute(
+        update(ChatUnreadCounter)
+        .where(ChatUnreadCounter.chat_id == private.id)
+        .values(unread_count=99)
+    )
+    session.commit()
+
+    unread_counter.rebuild(session)
+    assert counters(session, private.id, [user1, user2]) == {user1.id: 1, user2.id: 2}
+    assert counters(session, private.id, [user1, user2]) == recount(
+        session, private.id, [user1, user2]
+    )
@@ -0,0 +1,66 @@
+from sqlalchemy import text
+
+from services.user_auth_services.user_list import UserListService
+from services.user_auth_services.user_search import user_search_index
+
+
+def usernames(session, query):
+    return [u.username for u in UserListService(session).search_users(query).users]
+
+
+def execute(session, sql, **params):
+    # As another worker or a bulk update would: no ORM event reaches
+    # this process's index
+    session.execute(text(sql), params)
+    session.commit()
+
+
+def test_search_sees_users_added_outside_the_orm(session, make_user):
+    make_user()
+    usernames(session, "user")  # build the index
+
+    execute(
+        session,
+        "INSERT INTO users (username, full_name, is_active)"
+        " VALUES ('zanzibar', 'Zan Zibar', 1)",
+    )
+
+    assert usernames(session, "zanz") == ["zanzibar"]
+    assert usernames(session, "zibar") == ["zanzibar"]
+
+
+def test_search_sees_renames_and_deactivations_outside_the_orm(session, make_user):
+    renamed, deactivated = make_user(), make_user()
+    old_name, deactivated_name = renamed.username, deactivated.username
+    usernames(session, "user")
+
+    execute(
+        session,
+        "UPDATE users SET username = 'quokka' WHERE id = :id",
+        id=renamed.id,
+    )
+    execute(
+        session, "UPDATE users SET is_active = 0 WHERE id = :id", id=deactivated.id
+    )
+
+    assert usernames(session, "quok") == ["quokka"]
+    assert old_name not in usernames(session, old_name)
+    assert deactivated_name not in usernames(session, deactivated_name)
+
+
+def test_search_rebuilds_when_the_changed_rows_are_gone(session, make_user):
+    make_user()
+    usernames(session, "user")
+
+    execute(
+        session,
+        "INSERT INTO users (username, full_name, is_active)"
+        " VALUES ('wombat', 'Wom Bat', 1)",
+    )
+    # As if more changes had happened than are kept
+    execute(session, "DELETE FROM table_version_rows")
+
+    assert usernames(session, "womb") == ["wombat"]
+    assert user_search_index.version == session.execute(
+        text("SELECT version FROM table_versions WHERE name = 'users'")
+    ).scalar()
@@ -0,0 +1,29 @@
+from sqlalchemy import text
+
+from services.user_auth_services.user_list import UserListService
+
+
+def test_snapshot_reloads_after_a_write_it_did_not_see(session, make_user):
+    make_user()
+    before = UserListService(session).get_usernames_snapshot()
+
+    # As another worker would: no ORM event reaches this process
+    session.execute(
+        text(
+            "INSERT INTO users (username, full_name, is_active)"
+            " VALUES ('elsewhere', 'Elsewhere', 1)"
+        )
+    )
+    session.commit()
+
+    after = UserListService(session).get_usernames_snapshot()
+    assert after.etag != before.etag
+    assert "elsewhere" in after.usernames
+
+
+def test_snapshot_etag_is_stable_without_changes(session, make_user):
+    make_user()
+    first = UserListService(session).get_usernames_snapshot()
+    # Compared between processes, so built from the stored version alone
+    assert UserListService(session).get_usernames_snapshot().etag == first.etag
+    assert first.etag == f'W/"usernames-{first.version}"'
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from core.auth import create_access_token
+from routers.v1.chat_router import router
+
+app = FastAPI()
+app.include_router(router, prefix="/v1/chat")
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def token_for(user_row):
+    return create_access_token({"sub": str(user_row.id), "username": user_row.username})
+
+
+def assert_rejected(client, url, reason, **kwargs):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(url, **kwargs):
+            pass
+    assert closed.value.code == 1008
+    assert reason in closed.value.reason
+
+
+def test_socket_without_a_token_is_closed(client, make_user):
+    user_row = make_user()
+    assert_rejected(client, f"/v1/chat/ws/{user_row.id}", "Missing token")
+
+
+def test_socket_with_an_invalid_token_is_closed(client, make_user):
+    user_row = make_user()
+    assert_rejected(client, f"/v1/chat/ws/{user_row.id}?token=nope", "Invalid token")
+
+
+def test_socket_for_another_user_is_closed(client, make_user):
+    user_row, other = make_user(), make_user()
+    assert_rejected(
+        client,
+        f"/v1/chat/ws/{other.id}?token={token_for(user_row)}",
+        "does not match",
+    )
+
+
+def test_token_in_the_query_string(client, make_user):
+    user_row = make_user()
+    url = f"/v1/chat/ws/{user_row.id}?token={token_for(user_row)}"
+    with client.websocket_connect(url, subprotocols=["pz.v1.json"]) as ws:
+        ws.send_text('{"v": 1, "type": "ping"}')
+        assert ws.receive_json() == {"v": 1, "type": "pong"}
+
+
+def test_token_as_a_subprotocol(client, make_user):
+    user_row = make_user()
+    with client.websocket_connect(
+        f"/v1/chat/ws/{user_row.id}",
+        subprotocols=["pz.v1.json", f"bearer.{token_for(user_row)}"],
+    ) as ws:
+        # The token is never echoed back as the chosen subprotocol
+        assert ws.accepted_subprotocol == "pz.v1.json"
+        ws.send_text('{"v": 1, "type": "ping"}')
+        assert ws.receive_json() == {"v": 1, "type": "pong"}
@@ -0,0 +1,77 @@
+import pytest
+
+import msgpack
+
+from services.chat_services.ws_protocol import (
+    FrameError,
+    JSONProtocol,
+    MsgpackProtocol,
+)
+
+def receive(frame):
+    """A frame as the ASGI message that carries it."""
+    return {"bytes": frame} if isinstance(frame, bytes) else {"text": frame}
+
+
+@pytest.mark.parametrize("protocol", [JSONProtocol(), MsgpackProtocol()])
+def test_protocol_round_trips_an_event(protocol):
+    event = {"type": "message", "chat_id": 1, "content": "hi", "id": "c1"}
+    (frame,) = protocol.encode([event])
+    assert protocol.decode(receive(frame)) == [{"v": 1, **event}]
+
+
+@pytest.mark.parametrize("protocol", [JSONProtocol(), MsgpackProtocol()])
+def test_protocol_round_trips_a_batch(protocol):
+    events = [
+        {"type": "message", "chat_id": 1, "content": "hi"},
+        {"type": "read", "chat_id": 1, "to": 2, "message_id": 7},
+    ]
+    (frame,) = protocol.encode(events)
+    assert protocol.decode(receive(frame)) == events
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"text": "not json"},
+        {"text": "[" * 100000},
+        {"text": "[]"},
+        {"text": '{"v": 2, "type": "ping"}'},
+        {"text": '{"v": 1, "type": "batch", "events": {}}'},
+        {"text": '{"v": 1, "type": "message", "chat_id": true, "content": ""}'},
+        {"bytes": b"\xff"},
+    ],
+)
+def test_json_protocol_rejects_malformed_frames(message):
+    with pytest.raises(FrameError):
+        JSONProtocol().decode(message)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"text": "text frame"},
+        {"bytes": b""},
+        {"bytes": b"\xc1"},  # never used
+        {"bytes": b"\x92\x01"},  # array missing an item
+        {"bytes": b"\xa5abc"},  # truncated str
+        {"bytes": b"\xa2\xff\xfe"},  # invalid UTF-8
+        {"bytes": b"\x80\x01"},  # trailing bytes
+        {"bytes": b"\x81\x80\x01"},  # map key is a map
+        {"bytes": b"\x81\x91\x01\x01"},  # map key is an array
+        {"bytes": b"\x91" * 50000},  # nested too deeply
+        {"bytes": b"\xdd\xff\xff\xff\xff"},  # over-long array
+        {"bytes": b"\xd4\x01\x00"},  # extension type
+        {"bytes": msgpack.packb({"v": 1, "type": "typing", "chat_id": 1})},
+        {"bytes": msgpack.packb([1])},
+    ],
+)
+def test_msgpack_protocol_rejects_malformed_frames(message):
+    with pytest.raises(FrameError):
+        MsgpackProtocol().decode(message)
+
+
+def test_msgpack_protocol_encodes_standard_messagepack():
+    event = {"type": "notice", "text": "é" * 40, "n": 2**40}
+    (frame,) = MsgpackProtocol().encode([event])
+    assert msgpack.unpackb(frame) == {"v": 1, **event}
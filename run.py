@@ -1,4 +1,18 @@
+import os
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("pz_be_services.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "pz_be_services.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        # Compress websocket frames for clients that offer permessage-deflate
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower()
+        == "true",
+        # Transport-level pings keep legacy sockets, which don't answer
+        # heartbeat events, from lingering half-open
+        ws_ping_interval=float(os.getenv("WS_PING_INTERVAL_SECONDS", 25)),
+        ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT_SECONDS", 20)),
+    )